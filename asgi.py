@@ -0,0 +1,262 @@
+"""ASGI variant of the app for high-concurrency, I/O-bound API traffic.
+
+The JSON API routes run natively on the event loop through the async
+handlers; every other path (landing page, assets, catalog, search) is
+delegated to the Flask app through a small WSGI adapter that runs each
+request on its own pool of WSGI_THREADS threads. Serve it with `python serve.py --asgi` (gunicorn +
+uvicorn workers).
+
+Blocking work never uses the loop's default executor: the WSGI fallback,
+the storage and payment backends (services.AsyncServices) and the
+Idempotency-Key table each have a bounded pool of their own, so slow
+clients of the landing page can't hold up payments, and a slow gateway
+can't hold up signups.
+"""
+import asyncio
+import functools
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+
+import fastjson
+import handlers
+import idempotency
+import ratelimit
+import schemas
+import startup
+from app import app as flask_app, get_idempotency_cache, get_services
+from services import AsyncServices
+from storage import StorageBusy
+
+ROUTES = {
+    '/api/signup': handlers.signup_async,
+    '/api/subscribe': handlers.subscribe_async,
+    '/api/newsletter': handlers.newsletter_async,
+    '/api/newsletter/unsubscribe': handlers.unsubscribe_async,
+    '/api/batch': handlers.batch_async,
+}
+# Routes honouring the Idempotency-Key header
+IDEMPOTENT = {'/api/subscribe', '/api/batch'}
+BODY_LIMITS = {'/api/batch': schemas.MAX_BATCH_BODY_SIZE}
+METHOD_NOT_ALLOWED = {'status': 'error', 'message': 'Method not allowed'}
+WSGI_THREADS = int(os.environ.get('LEARNHUB_ASGI_WSGI_THREADS', 32))
+fastjson.preencode(METHOD_NOT_ALLOWED)
+
+
+def wsgi_environ(scope, body, length):
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_PROTOCOL': 'HTTP/%s' % scope['http_version'],
+        'SERVER_NAME': scope['server'][0] if scope.get('server') else 'localhost',
+        'SERVER_PORT': str(scope['server'][1]) if scope.get('server') else '80',
+        'CONTENT_LENGTH': str(length),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        # The whole body has been read, so chunked requests can be read to the end
+        'wsgi.input_terminated': True,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        if name == 'CONTENT_LENGTH':
+            # The length of the body as read, chunked requests included
+            continue
+        if name != 'CONTENT_TYPE':
+            name = 'HTTP_' + name
+        value = value.decode('latin-1')
+        environ[name] = environ[name] + ',' + value if name in environ else value
+    return environ
+
+
+class ThreadPoolWsgiToAsgi:
+    """A WSGI app served over ASGI, each request on a thread of its own pool.
+
+    asgiref's adapter runs every request on one shared thread per process,
+    and on keep-alive connections its deadlock guard leaks into the next
+    request and fails it (500s under load). The Flask app is thread-safe
+    (gthread serves it the same way), so requests run side by side; the
+    body is read into a spooled file first, and the response is sent from
+    the worker thread chunk by chunk, waiting for each send. A thread is
+    held until the client has taken the whole response, so the pool is
+    bounded (max_threads) and separate from the other subsystems'.
+    """
+
+    def __init__(self, wsgi_application, max_threads=WSGI_THREADS):
+        self.wsgi_application = wsgi_application
+        # Threads start on first use, so a pool built before fork works in the worker
+        self.executor = ThreadPoolExecutor(max_threads, thread_name_prefix='wsgi')
+
+    async def __call__(self, scope, receive, send):
+        loop = asyncio.get_running_loop()
+        with SpooledTemporaryFile(max_size=65536) as body:
+            while True:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    return
+                body.write(message.get('body', b''))
+                if not message.get('more_body'):
+                    break
+            length = body.tell()
+            body.seek(0)
+            environ = wsgi_environ(scope, body, length)
+            await loop.run_in_executor(self.executor, self._run, loop, environ, send)
+
+    def _run(self, loop, environ, send):
+        def send_sync(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info is not None and response.get('sent'):
+                raise exc_info[1].with_traceback(exc_info[2])
+            response['start'] = {
+                'type': 'http.response.start',
+                'status': int(status.split(' ', 1)[0]),
+                'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+            }
+
+        def send_start():
+            if not response.get('sent'):
+                response['sent'] = True
+                send_sync(response['start'])
+
+        chunks = self.wsgi_application(environ, start_response)
+        try:
+            for chunk in chunks:
+                if chunk:
+                    send_start()
+                    send_sync({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            send_start()
+            send_sync({'type': 'http.response.body'})
+        finally:
+            # Runs the response's call_on_close callbacks (e.g. metrics of streamed bodies)
+            close = getattr(chunks, 'close', None)
+            if close is not None:
+                close()
+
+
+@startup.lazy('async services')
+def get_async_services(app):
+    return AsyncServices(get_services(app))
+
+
+wsgi_fallback = ThreadPoolWsgiToAsgi(flask_app)
+
+
+async def send_json(send, status, body, replayed=False, retry_after=1):
+    payload = fastjson.encode(body)
+    headers = [
+        (b'content-type', b'application/json'),
+        (b'content-length', str(len(payload)).encode('ascii')),
+    ]
+    if status in (429, 503):
+        headers.append((b'retry-after', str(retry_after).encode('ascii')))
+    if replayed:
+        headers.append((b'idempotent-replayed', b'true'))
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': payload})
+
+
+async def read_body(receive, limit):
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > limit:
+            raise ValueError('body too large')
+        chunks.append(chunk)
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    handler = ROUTES.get(scope['path']) if scope['type'] == 'http' else None
+    if handler is None:
+        # Flask's own hooks record these
+        return await wsgi_fallback(scope, receive, send)
+    registry = flask_app.extensions.get('learnhub.metrics')
+    if registry is None:
+        return await api(scope, receive, send, handler)
+    token = registry.start(scope['path'])
+    response = {'status': 500, 'size': 0}
+
+    async def observed_send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+        else:
+            response['size'] += len(message.get('body', b''))
+        await send(message)
+    try:
+        await api(scope, receive, observed_send, handler)
+    finally:
+        registry.finish(token, response['status'], response['size'])
+
+
+async def api(scope, receive, send, handler):
+    if scope['method'] != 'POST':
+        return await send_json(send, 405, METHOD_NOT_ALLOWED)
+    client = scope.get('client')
+    client = client[0] if client else None
+    limiter = flask_app.extensions['learnhub.ratelimit']
+    retry_after = limiter.retry_after(scope['path'], client)
+    if retry_after is not None:
+        return await send_json(send, 429, ratelimit.THROTTLED, retry_after=retry_after)
+    if handler is handlers.batch_async:
+        handler = functools.partial(handler, admit=ratelimit.admitter(limiter, client))
+    headers = dict(scope['headers'])
+    limit = BODY_LIMITS.get(scope['path'], schemas.MAX_BODY_SIZE)
+    length = headers.get(b'content-length')
+    if length is not None and length.isdigit() and int(length) > limit:
+        return await send_json(send, 413, schemas.too_large(limit))
+    if not headers.get(b'content-type', b'').startswith(b'application/json'):
+        return await send_json(send, 415, schemas.NOT_JSON)
+    try:
+        body = await read_body(receive, limit)
+    except ValueError:
+        return await send_json(send, 413, schemas.too_large(limit))
+    if body is None:
+        return
+    try:
+        data = fastjson.loads(body)
+    except ValueError:
+        return await send_json(send, 400, schemas.INVALID_JSON)
+    key = headers.get(b'idempotency-key') if scope['path'] in IDEMPOTENT else None
+    services = get_async_services(flask_app)
+    if key is None:
+        status, response = await handler(data, services)
+        return await send_json(send, status, response)
+    key = key.decode('latin-1')
+    if not idempotency.valid_key(key):
+        return await send_json(send, 400, idempotency.INVALID_KEY)
+    try:
+        status, response, replayed = await get_idempotency_cache(flask_app).run_async(
+            key, data, lambda: handler(data, services, key=key))
+    except StorageBusy:
+        status, response, replayed = 503, handlers.BUSY, False
+    await send_json(send, status, response, replayed)
@@ -0,0 +1,91 @@
+"""Static asset pipeline: content-hashed CSS/JS bundles held in memory."""
+import gzip
+import hashlib
+import os
+import threading
+
+try:
+    import brotli
+except ImportError:  # optional, gzip is always available
+    brotli = None
+
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets')
+
+# Bundle kind -> source files (relative to ASSETS_DIR), concatenated in order
+BUNDLES = {
+    'css': ['app.css'],
+    'js': ['app.js'],
+}
+
+MIMETYPES = {
+    'css': 'text/css',
+    'js': 'text/javascript',
+}
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def compress_variants(body):
+    variants = {'identity': body}
+    variants['gzip'] = gzip.compress(body, compresslevel=9, mtime=0)
+    if brotli is not None:
+        variants['br'] = brotli.compress(body, quality=11)
+    return variants
+
+
+def negotiate_encoding(request, variants):
+    # Highest client q-value wins; ties go to the smaller encoding
+    best, best_q = 'identity', 0
+    for encoding in ('br', 'gzip'):
+        if encoding not in variants:
+            continue
+        q = request.accept_encodings[encoding]
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def build_bundle(kind):
+    parts = []
+    for name in BUNDLES[kind]:
+        with open(os.path.join(ASSETS_DIR, name), 'rb') as f:
+            parts.append(f.read())
+    body = b'\n'.join(parts)
+    digest = hashlib.sha256(body).hexdigest()
+    return {
+        'kind': kind,
+        'filename': 'app.%s.%s' % (digest[:12], kind),
+        'etag': digest[:32],
+        'mimetype': MIMETYPES[kind],
+        'variants': compress_variants(body),
+    }
+
+
+class AssetRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (by_kind, by_filename), swapped atomically so readers never see half a build
+        self._state = None
+
+    def _load(self):
+        state = self._state
+        if state is None:
+            with self._lock:
+                state = self._state
+                if state is None:
+                    by_kind = {kind: build_bundle(kind) for kind in BUNDLES}
+                    by_filename = {b['filename']: b for b in by_kind.values()}
+                    state = self._state = (by_kind, by_filename)
+        return state
+
+    def url(self, kind):
+        return '/static/' + self._load()[0][kind]['filename']
+
+    def get(self, filename):
+        return self._load()[1].get(filename)
+
+    def invalidate(self):
+        self._state = None
+
+
+registry = AssetRegistry()
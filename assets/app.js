@@ -0,0 +1,202 @@
+// Mobile menu toggle
+const mobileMenuBtn = document.querySelector('.mobile-menu-btn');
+const mainNav = document.getElementById('main-nav');
+
+mobileMenuBtn.addEventListener('click', () => {
+    mainNav.classList.toggle('active');
+});
+
+// Smooth scrolling for anchor links
+document.querySelectorAll('a[href^="#"]').forEach(anchor => {
+    anchor.addEventListener('click', function(e) {
+        e.preventDefault();
+
+        const targetId = this.getAttribute('href');
+        if (targetId === '#') return;
+
+        const targetElement = document.querySelector(targetId);
+        if (targetElement) {
+            // Jumping to a lazy section: fill it first so the scroll lands correctly
+            const ready = targetElement.dataset.fragment ? loadSection(targetElement) : Promise.resolve();
+            ready.then(() => targetElement.scrollIntoView({
+                behavior: 'smooth'
+            }));
+
+            // Close mobile menu if open
+            mainNav.classList.remove('active');
+        }
+    });
+});
+
+// Modal functions
+function openModal(modalId) {
+    document.getElementById(modalId).style.display = 'flex';
+    document.body.style.overflow = 'hidden';
+}
+
+function closeModal(modalId) {
+    document.getElementById(modalId).style.display = 'none';
+    document.body.style.overflow = 'auto';
+}
+
+// Close modal when clicking outside content
+window.addEventListener('click', (e) => {
+    if (e.target.classList.contains('modal')) {
+        e.target.style.display = 'none';
+        document.body.style.overflow = 'auto';
+    }
+});
+
+// Signup button handlers
+const signupBtn = document.getElementById('signup-btn');
+const finalCta = document.getElementById('final-cta');
+
+signupBtn.addEventListener('click', () => openModal('signup-modal'));
+finalCta.addEventListener('click', () => openModal('signup-modal'));
+
+// Lazily loaded fragments: course modal bodies and below-the-fold sections
+const fragmentRequests = {};
+
+function loadFragment(url) {
+    if (!fragmentRequests[url]) {
+        fragmentRequests[url] = fetch(url).then(response => {
+            if (!response.ok) throw new Error(response.statusText);
+            return response.text();
+        }).catch(error => {
+            delete fragmentRequests[url];
+            throw error;
+        });
+    }
+    return fragmentRequests[url];
+}
+
+function loadSection(section) {
+    if (section.dataset.loaded) return Promise.resolve();
+    section.dataset.loaded = 'true';
+    return loadFragment(section.dataset.fragment)
+        .then(html => { section.innerHTML = html; })
+        .catch(() => { delete section.dataset.loaded; });
+}
+
+const lazySections = document.querySelectorAll('section[data-fragment]');
+if ('IntersectionObserver' in window) {
+    const sectionObserver = new IntersectionObserver(entries => {
+        entries.forEach(entry => {
+            if (entry.isIntersecting) {
+                sectionObserver.unobserve(entry.target);
+                loadSection(entry.target);
+            }
+        });
+    }, { rootMargin: '400px 0px' });
+    lazySections.forEach(section => sectionObserver.observe(section));
+} else {
+    lazySections.forEach(loadSection);
+}
+
+function showCourseModal(slug) {
+    const courseModalContent = document.getElementById('course-modal-content');
+
+    courseModalContent.innerHTML = '<p>Loading...</p>';
+    openModal('course-modal');
+
+    loadFragment(`/fragments/course/${encodeURIComponent(slug)}`)
+        .then(html => { courseModalContent.innerHTML = html; })
+        .catch(() => {
+            courseModalContent.innerHTML = '<p>Course details are unavailable right now.</p>';
+        });
+}
+
+function enrollInCourse() {
+    closeModal('course-modal');
+    showToast('Course enrollment successful!');
+}
+
+// Plan selection
+function selectPlan(planName) {
+    document.getElementById('selected-plan').value = planName;
+    paymentKey = null;
+    document.getElementById('plan-modal-title').textContent = `Subscribe to ${planName} Plan`;
+    openModal('plan-modal');
+}
+
+// Form submissions
+function postJson(url, data, headers) {
+    return fetch(url, {
+        method: 'POST',
+        headers: Object.assign({ 'Content-Type': 'application/json' }, headers),
+        body: JSON.stringify(data)
+    }).then(response => response.json().then(body => {
+        if (!response.ok) {
+            const error = new Error(body.message || response.statusText);
+            error.status = response.status;
+            throw error;
+        }
+        return body;
+    }));
+}
+
+function submitSignupForm(e) {
+    e.preventDefault();
+    postJson('/api/signup', {
+        name: document.getElementById('name').value,
+        email: document.getElementById('email').value,
+        password: document.getElementById('password').value,
+        expertise: document.getElementById('expertise').value
+    }).then(() => {
+        closeModal('signup-modal');
+        document.getElementById('signup-form').reset();
+        showToast('Account created successfully! Welcome to LearnHub.');
+    }).catch(error => showToast(error.message));
+}
+
+// One key per payment attempt: resubmitting the same form can't charge twice
+let paymentKey = null;
+
+// crypto.randomUUID() only exists in secure contexts (HTTPS, localhost)
+function newIdempotencyKey() {
+    return Array.from(crypto.getRandomValues(new Uint8Array(16)),
+        byte => byte.toString(16).padStart(2, '0')).join('');
+}
+
+function submitPaymentForm(e) {
+    e.preventDefault();
+    const plan = document.getElementById('selected-plan').value;
+    const payment = document.querySelector('#payment-form input[name="payment"]:checked').value;
+    paymentKey = paymentKey || newIdempotencyKey();
+    postJson('/api/subscribe', { plan: plan, payment_method: payment }, { 'Idempotency-Key': paymentKey })
+        .then(() => {
+            paymentKey = null;
+            closeModal('plan-modal');
+            showToast(`Thank you for subscribing to our ${plan} plan!`);
+        })
+        .catch(error => {
+            // A 4xx (declined, invalid) is final: the next try is a new attempt.
+            // Network errors and 5xx keep the key, so a retry can't charge twice.
+            if (error.status >= 400 && error.status < 500) {
+                paymentKey = null;
+            }
+            showToast(error.message);
+        });
+}
+
+function subscribeNewsletter(e) {
+    e.preventDefault();
+    const input = document.getElementById('newsletter-email');
+    postJson('/api/newsletter', { email: input.value })
+        .then(() => {
+            showToast('Thanks for subscribing to our newsletter!');
+            input.value = '';
+        })
+        .catch(error => showToast(error.message));
+}
+
+// Toast notification
+function showToast(message) {
+    const toast = document.getElementById('toast-message');
+    toast.textContent = message;
+    toast.classList.add('show');
+
+    setTimeout(() => {
+        toast.classList.remove('show');
+    }, 3000);
+}
@@ -0,0 +1,130 @@
+"""Compare the sync (gthread) and ASGI (uvicorn) servers on I/O-bound API calls.
+
+Starts each server with the same number of worker processes and a simulated
+backend latency, then drives POST /api/signup at a fixed concurrency over
+keep-alive connections:
+
+    python bench/async_load.py --workers 2 --concurrency 500 --latency-ms 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BODY = json.dumps({'name': 'Load Test', 'email': 'load@example.com',
+                   'password': 'secret123', 'expertise': 'other'}).encode('utf-8')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('server on port %d did not start' % port)
+
+
+def start_server(port, workers, latency_ms, asgi):
+    # No access log, worker recycling or rate limits, so none of them skews the numbers
+    env = dict(os.environ, LEARNHUB_IO_LATENCY_MS=str(latency_ms), GUNICORN_ACCESSLOG='',
+               GUNICORN_MAX_REQUESTS='0', LEARNHUB_RATE_LIMITS='off')
+    cmd = [sys.executable, os.path.join(ROOT, 'serve.py'), '--bind', '127.0.0.1:%d' % port,
+           '--workers', str(workers)]
+    if asgi:
+        cmd.append('--asgi')
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_for_port(port)
+    return proc
+
+
+async def post(reader, writer, path):
+    writer.write(b'POST %s HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n'
+                 b'Content-Length: %d\r\n\r\n%s' % (path.encode('ascii'), len(BODY), BODY))
+    await writer.drain()
+    head = await reader.readuntil(b'\r\n\r\n')
+    status = int(head.split(b' ', 2)[1])
+    length = 0
+    for line in head.split(b'\r\n'):
+        if line.lower().startswith(b'content-length:'):
+            length = int(line.split(b':', 1)[1])
+    await reader.readexactly(length)
+    return status
+
+
+async def client(port, path, deadline, latencies, errors):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                status = await post(reader, writer, path)
+            except (OSError, asyncio.IncompleteReadError):
+                errors.append(repr(sys.exc_info()[1]))
+                writer.close()
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+                continue
+            if status != 200:
+                errors.append(status)
+            latencies.append(time.perf_counter() - start)
+    finally:
+        writer.close()
+
+
+async def drive(port, concurrency, duration, path='/api/signup'):
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*(client(port, path, deadline, latencies, errors) for _ in range(concurrency)))
+    latencies.sort()
+    count = len(latencies)
+
+    def pct(p):
+        return latencies[min(count - 1, int(count * p))] * 1000 if count else 0.0
+    return {
+        'requests': count,
+        'errors': len(errors),
+        'rps': count / duration,
+        'p50_ms': pct(0.50),
+        'p99_ms': pct(0.99),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--latency-ms', type=float, default=50)
+    parser.add_argument('--duration', type=float, default=10)
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name, asgi in (('sync', False), ('asgi', True)):
+        port = free_port()
+        proc = start_server(port, args.workers, args.latency_ms, asgi)
+        try:
+            results[name] = asyncio.run(drive(port, args.concurrency, args.duration))
+        finally:
+            proc.terminate()
+            proc.wait()
+        print('%-5s %8.1f req/s  p50 %7.1f ms  p99 %7.1f ms  errors %d' % (
+            name, results[name]['rps'], results[name]['p50_ms'], results[name]['p99_ms'],
+            results[name]['errors']))
+    if results['sync']['rps']:
+        print('asgi/sync throughput: %.1fx' % (results['asgi']['rps'] / results['sync']['rps']))
+    return results
+
+
+if __name__ == '__main__':
+    main()
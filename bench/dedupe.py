@@ -0,0 +1,99 @@
+"""Measure the duplicate-email filter: memory, lookup latency, and its effect
+on duplicate-heavy newsletter traffic.
+
+    python bench/dedupe.py --entries 1000000 --requests 20000 --duplicates 0.9
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dedupe import EmailIndex  # noqa: E402
+from services import Services  # noqa: E402
+from storage import SignupStore  # noqa: E402
+from subscriptions import NewsletterLog  # noqa: E402
+
+
+def measure_index(entries):
+    emails = ['user%d@example.com' % i for i in range(entries)]
+    tracemalloc.start()
+    index = EmailIndex(capacity=entries)
+    index.add_many(emails)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    probes = 100000
+    hits = random.sample(emails, min(probes, entries))
+    misses = ['new%d@example.com' % i for i in range(probes)]
+    results = {'entries': entries, 'bytes_per_entry': current / entries,
+               'compact_bytes_per_entry': index.memory_bytes() / entries}
+    for name, sample in (('hit', hits), ('miss', misses)):
+        start = time.perf_counter()
+        for email in sample:
+            email in index
+        results['%s_us' % name] = (time.perf_counter() - start) / len(sample) * 1e6
+    return results
+
+
+def drive(services, emails, threads):
+    chunks = [emails[i::threads] for i in range(threads)]
+
+    def run(chunk):
+        for email in chunk:
+            services.add_subscriber({'email': email})
+    workers = [threading.Thread(target=run, args=(chunk,)) for chunk in chunks]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return len(emails) / (time.perf_counter() - start)
+
+
+class UnfilteredServices(Services):
+    def add_subscriber(self, data):
+        self.newsletter.subscribe(data['email'])
+
+
+def measure_traffic(requests, duplicate_ratio, threads):
+    known = ['known%d@example.com' % i for i in range(1000)]
+    emails = [random.choice(known) if random.random() < duplicate_ratio else 'fresh%d@example.com' % i
+              for i in range(requests)]
+    results = {}
+    for name, cls in (('unfiltered', UnfilteredServices), ('filtered', Services)):
+        with tempfile.TemporaryDirectory() as tmp:
+            services = cls(signups=SignupStore(os.path.join(tmp, 'db')),
+                           newsletter=NewsletterLog(os.path.join(tmp, 'newsletter.log')))
+            services.load_indexes()
+            for email in known:
+                services.add_subscriber({'email': email})
+            results[name] = drive(services, emails, threads)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--entries', type=int, default=1000000)
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--duplicates', type=float, default=0.9)
+    parser.add_argument('--threads', type=int, default=16)
+    args = parser.parse_args(argv)
+
+    index = measure_index(args.entries)
+    print('index: %(entries)d entries, %(bytes_per_entry).1f B/entry traced '
+          '(%(compact_bytes_per_entry).1f B/entry bloom+array), '
+          'lookup hit %(hit_us).2f us, miss %(miss_us).2f us' % index)
+    traffic = measure_traffic(args.requests, args.duplicates, args.threads)
+    print('newsletter, %d%% duplicates: unfiltered %.0f req/s, filtered %.0f req/s (%.1fx)' % (
+        args.duplicates * 100, traffic['unfiltered'], traffic['filtered'],
+        traffic['filtered'] / traffic['unfiltered']))
+
+
+if __name__ == '__main__':
+    main()
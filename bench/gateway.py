@@ -0,0 +1,218 @@
+"""Local stand-in payment gateway with latency and failure injection.
+
+Serve it for manual testing (point LEARNHUB_PAYMENT_URL at it):
+
+    python bench/gateway.py serve --port 9090 --latency-ms 40 --error-rate 0.1
+
+or run the client scenarios against an in-process instance, which report
+outcomes, latency, connections opened and the breaker state for a healthy,
+slow, flaky, still-processing (409), misconfigured (401) and failing
+gateway, and for recovery afterwards:
+
+    python bench/gateway.py scenarios --charges 200 --threads 8
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import payments  # noqa: E402
+
+
+class Faults:
+    """Knobs shared by every request; change them while the server runs."""
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, decline_rate=0.0,
+                 hang_rate=0.0, hang_seconds=10.0, drop_rate=0.0, conflict_rate=0.0,
+                 unauthorized_rate=0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.decline_rate = decline_rate
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.drop_rate = drop_rate
+        # 409: a request with this Idempotency-Key is still being processed
+        self.conflict_rate = conflict_rate
+        # 401: the gateway doesn't accept our API key
+        self.unauthorized_rate = unauthorized_rate
+
+    def update(self, **changes):
+        for name, value in changes.items():
+            setattr(self, name, value)
+
+
+class GatewayServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, faults):
+        super().__init__(address, GatewayHandler)
+        self.faults = faults
+        self.lock = threading.Lock()
+        self.receipts = {}
+        self.connections = 0
+        self.requests = 0
+
+    def handle_error(self, request, client_address):
+        # Clients that timed out hang up before the reply; that's expected here
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+    @property
+    def url(self):
+        return 'http://%s:%d' % self.server_address[:2]
+
+
+class GatewayHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; don't let Nagle hold the body
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        payment = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        faults = self.server.faults
+        with self.server.lock:
+            self.server.requests += 1
+        delay = faults.latency_ms + random.uniform(0, faults.jitter_ms)
+        if random.random() < faults.hang_rate:
+            delay = faults.hang_seconds * 1000
+        time.sleep(delay / 1000)
+        if random.random() < faults.drop_rate:
+            self.close_connection = True
+            return
+        if random.random() < faults.unauthorized_rate:
+            return self.send_json(401, {'message': 'invalid API key'})
+        if random.random() < faults.error_rate:
+            return self.send_json(503, {'message': 'injected failure'})
+        if random.random() < faults.conflict_rate:
+            return self.send_json(409, {'message': 'a request with this Idempotency-Key is in progress'})
+        key = self.headers.get('Idempotency-Key')
+        with self.server.lock:
+            receipt = self.server.receipts.get(key)
+        if receipt is None:
+            if random.random() < faults.decline_rate:
+                return self.send_json(402, {'message': 'card declined'})
+            receipt = {'id': 'ch_%016x' % random.getrandbits(64), 'status': 'succeeded',
+                       'plan': payment.get('plan')}
+            with self.server.lock:
+                self.server.receipts[key] = receipt
+        self.send_json(200, receipt)
+
+
+def start(faults, port=0):
+    server = GatewayServer(('127.0.0.1', port), faults)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else 0.0
+
+
+def drive(gateway, charges, threads):
+    outcomes, latencies, lock = {}, [], threading.Lock()
+
+    def run(count):
+        for _ in range(count):
+            start = time.perf_counter()
+            try:
+                gateway.charge({'plan': 'Starter', 'payment_method': 'credit'})
+                outcome = 'ok'
+            except payments.PaymentError as exc:
+                outcome = type(exc).__name__
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                outcomes[outcome] = outcomes.get(outcome, 0) + 1
+                latencies.append(elapsed)
+    workers = [threading.Thread(target=run, args=(charges // threads,)) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return outcomes, latencies
+
+
+SCENARIOS = (
+    ('healthy', {}),
+    ('slow', {'latency_ms': 20, 'jitter_ms': 20, 'hang_rate': 0.05, 'hang_seconds': 3}),
+    ('flaky', {'error_rate': 0.3, 'drop_rate': 0.05, 'decline_rate': 0.05}),
+    ('conflicted', {'conflict_rate': 0.3}),
+    ('unauthorized', {'unauthorized_rate': 1.0}),
+    ('down', {'error_rate': 1.0}),
+    ('recovered', {}),
+)
+
+
+def scenarios(charges, threads, read_timeout, reset_timeout):
+    faults = Faults()
+    server = start(faults)
+    gateway = payments.PaymentGateway(
+        server.url, read_timeout=read_timeout,
+        breaker=payments.CircuitBreaker(reset_timeout=reset_timeout))
+    for name, changes in SCENARIOS:
+        faults.update(**dict(vars(Faults()), **changes))
+        if name == 'recovered':
+            time.sleep(reset_timeout)
+        connections, requests = server.connections, server.requests
+        start_time = time.perf_counter()
+        outcomes, latencies = drive(gateway, charges, threads)
+        elapsed = time.perf_counter() - start_time
+        print('%-12s %-55s p50 %6.1f ms  p99 %7.1f ms  %5.0f charges/s  %3d conns  %4d gateway reqs  breaker %s' % (
+            name, ' '.join('%s=%d' % item for item in sorted(outcomes.items())),
+            percentile(latencies, 50), percentile(latencies, 99), len(latencies) / elapsed,
+            server.connections - connections, server.requests - requests, gateway.breaker.state))
+    server.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest='command', required=True)
+    serve = sub.add_parser('serve', help='run the stand-in gateway')
+    serve.add_argument('--port', type=int, default=9090)
+    for name in ('latency-ms', 'jitter-ms', 'error-rate', 'decline-rate', 'hang-rate', 'drop-rate',
+                 'conflict-rate', 'unauthorized-rate'):
+        serve.add_argument('--' + name, type=float, default=0.0)
+    serve.add_argument('--hang-seconds', type=float, default=10.0)
+    run = sub.add_parser('scenarios', help='drive the client through injected failures')
+    run.add_argument('--charges', type=int, default=200)
+    run.add_argument('--threads', type=int, default=8)
+    run.add_argument('--read-timeout', type=float, default=0.5)
+    run.add_argument('--reset-timeout', type=float, default=1.0)
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        faults = Faults(args.latency_ms, args.jitter_ms, args.error_rate, args.decline_rate,
+                        args.hang_rate, args.hang_seconds, args.drop_rate, args.conflict_rate,
+                        args.unauthorized_rate)
+        server = GatewayServer(('127.0.0.1', args.port), faults)
+        print('stand-in gateway on %s' % server.url)
+        server.serve_forever()
+    else:
+        scenarios(args.charges, args.threads, args.read_timeout, args.reset_timeout)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Compare JSON encoding/decoding: Flask's default provider vs fastjson.
+
+Times encode and decode of a small constant body (pre-encoded on the
+fastjson side), a signup request body, a catalog page and a 1000-course
+body (~570 KB), then GET /api/courses?per_page=100
+and POST /api/newsletter (invalid body, so nothing is stored) through the
+Flask test client with each provider installed:
+
+    python bench/json_codec.py --iterations 20000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('LEARNHUB_RATE_LIMITS', 'off')
+
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+
+import fastjson  # noqa: E402
+import handlers  # noqa: E402
+from app import FastJSONProvider, app  # noqa: E402
+from catalog import catalog  # noqa: E402
+
+
+def payloads():
+    courses, total = catalog.page(0, 100, None)
+    # The bundled catalog is small; repeat it for a search-dump-sized body
+    large = [dict(course, slug='%s-%d' % (course['slug'], n))
+             for n in range(1000 // max(1, total) + 1) for course in courses][:1000]
+    return {
+        'constant': handlers.SIGNUP_OK,
+        'signup': {'name': 'Ada Lovelace', 'email': 'ada@example.com', 'password': 'correct horse',
+                   'expertise': 'development'},
+        'page': {'status': 'success', 'courses': list(courses), 'page': 1, 'per_page': 100,
+                 'total': total},
+        'large': {'status': 'success', 'courses': large, 'total': len(large)},
+    }
+
+
+def per_call_us(func, arg, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func(arg)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def per_request_us(send, requests):
+    for _ in range(50):
+        send()
+    start = time.perf_counter()
+    for _ in range(requests):
+        send()
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=20000)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    default = DefaultJSONProvider(app)
+    print('backend: %s' % fastjson.BACKEND)
+    with app.app_context():
+        for name, body in payloads().items():
+            raw = fastjson.dumps(body)
+            # Large bodies need fewer rounds for a stable figure
+            iterations = max(50, args.iterations * 200 // max(200, len(raw)))
+            stdlib_out = per_call_us(lambda obj: default.dumps(obj).encode('utf-8'), body, iterations)
+            fast_out = per_call_us(fastjson.encode, body, iterations)
+            stdlib_in = per_call_us(json.loads, raw, iterations)
+            fast_in = per_call_us(fastjson.loads, raw, iterations)
+            print('%-8s %8d bytes  encode %9.2f -> %8.2f us (%4.1fx)  decode %9.2f -> %8.2f us (%4.1fx)' % (
+                name, len(raw), stdlib_out, fast_out, stdlib_out / fast_out,
+                stdlib_in, fast_in, stdlib_in / fast_in))
+
+    client = app.test_client()
+    routes = (
+        ('GET /api/courses?per_page=100', lambda: client.get('/api/courses?per_page=100')),
+        ('POST /api/newsletter (400)', lambda: client.post('/api/newsletter', json={'email': 42})),
+    )
+    for label, send in routes:
+        timings = []
+        for provider in (default, FastJSONProvider(app)):
+            app.json = provider
+            timings.append(per_request_us(send, args.requests))
+        print('%-30s %8.1f -> %8.1f us per request (%.0f%% less)' % (
+            label, timings[0], timings[1], (1 - timings[1] / timings[0]) * 100))
+
+
+if __name__ == '__main__':
+    main()
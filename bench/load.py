@@ -0,0 +1,322 @@
+"""Load test the production server and compare the run against a baseline.
+
+Starts serve.py (gunicorn with gunicorn.conf.py; --asgi for uvicorn) on a
+scratch LEARNHUB_VAR_DIR with rate limits and access logging off, then
+drives a weighted mix of operations at a fixed concurrency over keep-alive
+connections. Each connection draws its operations from its own seeded
+random stream, so a given --seed and --mix replay the same sequence;
+signups and newsletter subscriptions use unique emails, so they never
+collide with earlier runs. The first --warmup seconds are not recorded.
+
+Operations: home (GET /), signup, subscribe, newsletter (POST /api/...).
+
+    python bench/load.py --mix home=60,signup=10,subscribe=10,newsletter=20 \\
+        --concurrency 32 --duration 20 --output results.json
+
+Results (throughput, status counts and p50/p95/p99 latency, overall and
+per operation) are printed and optionally written as JSON. With
+--baseline the run is compared against a stored result and the command
+exits non-zero if throughput dropped, or p50/p95/p99 latency grew, by more
+than --threshold percent, or if requests fail where the baseline had none.
+--save-baseline stores the run as the new baseline. Baselines only compare
+runs on the same machine and settings.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+from async_load import ROOT, free_port, start_server
+
+DEFAULT_MIX = 'home=60,signup=10,subscribe=10,newsletter=20'
+PERCENTILES = (50, 95, 99)
+
+
+def signup_request(n, run):
+    return 'POST', '/api/signup', {
+        'name': 'Load Test %d' % n, 'email': 'load-%s-%d@example.com' % (run, n),
+        'password': 'load-test-password', 'expertise': 'other'}, ()
+
+
+def subscribe_request(n, run):
+    return 'POST', '/api/subscribe', {'plan': 'Professional', 'payment_method': 'credit'}, (
+        ('Idempotency-Key', '%s-%d' % (run, n)),)
+
+
+def newsletter_request(n, run):
+    return 'POST', '/api/newsletter', {'email': 'news-%s-%d@example.com' % (run, n)}, ()
+
+
+def home_request(n, run):
+    return 'GET', '/', None, (('Accept-Encoding', 'gzip'),)
+
+
+OPERATIONS = {
+    'home': home_request,
+    'signup': signup_request,
+    'subscribe': subscribe_request,
+    'newsletter': newsletter_request,
+}
+
+
+def parse_mix(spec):
+    """"name=weight,..." -> {name: weight}."""
+    mix = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        name, _, weight = item.partition('=')
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError('unknown operation %r (expected one of: %s)' % (
+                name, ', '.join(OPERATIONS)))
+        mix[name] = float(weight or 1)
+    if not mix or not sum(mix.values()) > 0:
+        raise argparse.ArgumentTypeError('the mix needs at least one operation with a positive weight')
+    return mix
+
+
+def encode_request(method, path, body, headers):
+    lines = ['%s %s HTTP/1.1' % (method, path), 'Host: localhost']
+    lines.extend('%s: %s' % header for header in headers)
+    payload = b''
+    if body is not None:
+        payload = json.dumps(body).encode('utf-8')
+        lines.append('Content-Type: application/json')
+        lines.append('Content-Length: %d' % len(payload))
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + payload
+
+
+async def read_response(reader):
+    """Read one response; returns (status, body bytes received)."""
+    head = await reader.readuntil(b'\r\n\r\n')
+    status = int(head.split(b' ', 2)[1])
+    length, chunked = 0, False
+    for line in head.split(b'\r\n')[1:]:
+        name, _, value = line.partition(b':')
+        name = name.strip().lower()
+        if name == b'content-length':
+            length = int(value)
+        elif name == b'transfer-encoding' and b'chunked' in value.lower():
+            chunked = True
+    if not chunked:
+        await reader.readexactly(length)
+        return status, length
+    received = 0
+    while True:
+        size = int((await reader.readuntil(b'\r\n')).split(b';', 1)[0], 16)
+        await reader.readexactly(size + 2)
+        received += size
+        if not size:
+            return status, received
+
+
+class Recorder:
+    def __init__(self, names):
+        self.latencies = {name: [] for name in names}
+        self.statuses = {name: {} for name in names}
+        self.failures = {name: 0 for name in names}
+        self.recording = False
+
+    def record(self, name, status, elapsed):
+        if not self.recording:
+            return
+        self.latencies[name].append(elapsed)
+        statuses = self.statuses[name]
+        statuses[status] = statuses.get(status, 0) + 1
+        if not 200 <= status < 300:
+            self.failures[name] += 1
+
+    def connection_error(self, name):
+        if self.recording:
+            self.failures[name] += 1
+            self.statuses[name]['connection'] = self.statuses[name].get('connection', 0) + 1
+
+
+async def connection(port, mix, seed, run, stop, recorder, counter):
+    rng = random.Random(seed)
+    names, weights = list(mix), list(mix.values())
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        while not stop.is_set():
+            name = rng.choices(names, weights)[0]
+            counter[0] += 1
+            request = encode_request(*OPERATIONS[name](counter[0], run))
+            start = time.perf_counter()
+            try:
+                writer.write(request)
+                await writer.drain()
+                status, _ = await read_response(reader)
+            except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                recorder.connection_error(name)
+                writer.close()
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+                continue
+            recorder.record(name, status, time.perf_counter() - start)
+    finally:
+        writer.close()
+
+
+def summarise(latencies, statuses, failures, duration):
+    latencies = sorted(latencies)
+    count = len(latencies)
+    summary = {
+        'requests': count,
+        'failures': failures,
+        'statuses': {str(status): n for status, n in sorted(statuses.items(), key=str)},
+        'rps': round(count / duration, 1),
+    }
+    for pct in PERCENTILES:
+        value = latencies[min(count - 1, int(count * pct / 100))] * 1000 if count else 0.0
+        summary['p%d_ms' % pct] = round(value, 3)
+    return summary
+
+
+async def drive(port, mix, concurrency, duration, warmup, seed):
+    recorder = Recorder(mix)
+    stop, counter, run = asyncio.Event(), [0], uuid.uuid4().hex[:8]
+    tasks = [asyncio.ensure_future(connection(port, mix, seed * 100003 + index, run, stop, recorder, counter))
+             for index in range(concurrency)]
+    await asyncio.sleep(warmup)
+    recorder.recording = True
+    await asyncio.sleep(duration)
+    recorder.recording = False
+    stop.set()
+    await asyncio.gather(*tasks)
+
+    operations = {name: summarise(recorder.latencies[name], recorder.statuses[name],
+                                  recorder.failures[name], duration) for name in mix}
+    statuses = {}
+    for name in mix:
+        for status, n in recorder.statuses[name].items():
+            statuses[status] = statuses.get(status, 0) + n
+    overall = summarise([value for name in mix for value in recorder.latencies[name]], statuses,
+                        sum(recorder.failures.values()), duration)
+    return overall, operations
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    var_dir = tempfile.mkdtemp(prefix='learnhub-load-')
+    os.environ['LEARNHUB_VAR_DIR'] = var_dir
+    port = free_port()
+    proc = start_server(port, args.workers, args.latency_ms, args.asgi)
+    try:
+        overall, operations = asyncio.run(drive(port, args.mix, args.concurrency, args.duration,
+                                                args.warmup, args.seed))
+    finally:
+        proc.terminate()
+        proc.wait()
+        shutil.rmtree(var_dir, ignore_errors=True)
+    return {
+        'config': {
+            'mix': args.mix,
+            'concurrency': args.concurrency,
+            'duration': args.duration,
+            'warmup': args.warmup,
+            'seed': args.seed,
+            'workers': args.workers,
+            'server': 'asgi' if args.asgi else 'sync',
+            'latency_ms': args.latency_ms,
+        },
+        'environment': {
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'overall': overall,
+        'operations': operations,
+    }
+
+
+def compare(result, baseline, threshold):
+    """Print the change against baseline; returns the list of regressions."""
+    regressions = []
+    if result['config'] != baseline['config']:
+        print('warning: baseline was recorded with different settings: %s' % json.dumps(baseline['config']))
+    rows = [('overall', result['overall'], baseline['overall'])]
+    rows.extend((name, stats, baseline['operations'][name]) for name, stats in result['operations'].items()
+                if name in baseline['operations'])
+    for name, current, previous in rows:
+        changes = []
+        for metric, higher_is_worse in [('rps', False)] + [('p%d_ms' % pct, True) for pct in PERCENTILES]:
+            before, after = previous[metric], current[metric]
+            if not before:
+                continue
+            change = (after - before) / before * 100
+            worse = change > threshold if higher_is_worse else -change > threshold
+            changes.append('%s %+.1f%%%s' % (metric, change, ' REGRESSED' if worse else ''))
+            if worse:
+                regressions.append('%s %s: %s -> %s (%+.1f%%)' % (name, metric, before, after, change))
+        if current['failures'] and not previous['failures']:
+            changes.append('%d failures REGRESSED' % current['failures'])
+            regressions.append('%s: %d failed requests, none in the baseline' % (name, current['failures']))
+        print('  %-10s vs baseline: %s' % (name, ', '.join(changes)))
+    return regressions
+
+
+def report(result):
+    print('%s server, %d workers, concurrency %d, %gs (revision %s)' % (
+        result['config']['server'], result['config']['workers'], result['config']['concurrency'],
+        result['config']['duration'], result['environment']['revision']))
+    for name, stats in [('overall', result['overall'])] + list(result['operations'].items()):
+        print('  %-10s %8.1f req/s  p50 %7.2f ms  p95 %7.2f ms  p99 %7.2f ms  failures %d  %s' % (
+            name, stats['rps'], stats['p50_ms'], stats['p95_ms'], stats['p99_ms'], stats['failures'],
+            ' '.join('%s:%d' % item for item in stats['statuses'].items())))
+
+
+def write_json(path, data):
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help='operation weights (default: %s)' % DEFAULT_MIX)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--warmup', type=float, default=3)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--asgi', action='store_true', help='serve asgi.py with uvicorn workers')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='compare against this stored result')
+    parser.add_argument('--save-baseline', metavar='PATH', help='store this run as a baseline')
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help='percent change that counts as a regression (default: 10)')
+    args = parser.parse_args(argv)
+
+    result = run(args)
+    report(result)
+    if args.output:
+        write_json(args.output, result)
+    if args.save_baseline:
+        write_json(args.save_baseline, result)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(result, json.load(f), args.threshold)
+        if regressions:
+            print('regressed beyond %g%%:\n  %s' % (args.threshold, '\n  '.join(regressions)))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""Measure what request metrics cost per request.
+
+Times the registry's start/finish on their own and the two Flask hooks as
+Flask calls them (in a request context, through ensure_sync), and compares
+that with a whole GET /api/courses/<slug> through the test client:
+
+    python bench/metrics_overhead.py --iterations 200000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import request  # noqa: E402
+
+from app import app  # noqa: E402
+from catalog import catalog  # noqa: E402
+
+
+def record_us(iterations):
+    registry = app.extensions['learnhub.metrics']
+    start = time.perf_counter()
+    for _ in range(iterations):
+        token = registry.start('/api/courses/<slug>')
+        registry.finish(token, 200, 512)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def hooks_us(path, iterations):
+    before = [app.ensure_sync(func) for func in app.before_request_funcs[None] if func.__module__ == 'metrics']
+    after = [app.ensure_sync(func) for func in app.after_request_funcs[None] if func.__module__ == 'metrics']
+    with app.test_request_context(path):
+        request.url_rule = app.url_map.bind('localhost').match(path, return_rule=True)[0]
+        response = app.response_class(b'{}', mimetype='application/json')
+        start = time.perf_counter()
+        for _ in range(iterations):
+            for func in before:
+                func()
+            for func in after:
+                func(response)
+        return (time.perf_counter() - start) / iterations * 1e6
+
+
+def request_us(client, path, requests):
+    for _ in range(200):
+        client.get(path)
+    start = time.perf_counter()
+    for _ in range(requests):
+        client.get(path)
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=200000)
+    parser.add_argument('--requests', type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    client = app.test_client()
+    path = '/api/courses/%s' % next(iter(catalog.page(0, 1, None)[0]))['slug']
+    # Claims this process's slab and binds the routes
+    client.get(path)
+    record = record_us(args.iterations)
+    hooks = hooks_us(path, args.iterations)
+    whole = request_us(client, path, args.requests)
+    print('registry start/finish %.2f us; both hooks as Flask runs them %.2f us per request' % (record, hooks))
+    print('GET %s end to end %.1f us; metrics are %.1f%% of it' % (path, whole, hooks / whole * 100))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""Measure /api/search ranking on a synthetic catalog of --courses courses.
+
+Courses recombine the words of data/courses.json (titles, categories,
+instructors, descriptions and bullets), so category words and words like
+"learn" match a large share of the catalog as they do in the real one;
+topic words with Zipf frequencies add a long tail of rare terms. Every
+query is ranked uncached (the per-query result cache is emptied first) with
+the per-term ranking state warm, except on the "first use" line, which
+ranks each term once straight after an index change:
+
+    python bench/search.py --courses 100000 --queries 2000 --p99-ms 5
+
+Reports p50/p99 per query shape, and exits non-zero when --p99-ms is given
+and any shape's p99 is over it. --check compares every ranking against
+exhaustive BM25 scoring of all postings: those that ran to completion must
+match it exactly; for those cut short at search.MAX_SCORED it reports how
+much of the exact first page they found and how close their scores came.
+"""
+import argparse
+import heapq
+import itertools
+import json
+import math
+import os
+import random
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import search  # noqa: E402
+
+
+def synthetic_catalog(count, seed, vocabulary=50000):
+    with open(os.path.join(ROOT, 'data', 'courses.json')) as f:
+        real = json.load(f)
+    rng = random.Random(seed)
+    titles = [word for course in real for word in course['title'].split()]
+    descriptions = [word for course in real for word in course['description'].split()]
+    bullets = [item for course in real for item in course['learn']]
+    categories = sorted({course['category'] for course in real})
+    instructors = sorted({course['instructor'] for course in real})
+    # Topic words with Zipf-like frequencies, for a long tail of rare terms
+    topics = ['topic%d' % rank for rank in range(vocabulary)]
+    weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(vocabulary)))
+    courses = []
+    for i in range(count):
+        courses.append({
+            'slug': 'course-%d' % i,
+            'title': ' '.join(rng.sample(titles, 3) + rng.choices(topics, cum_weights=weights, k=2)),
+            'category': rng.choice(categories),
+            'instructor': rng.choice(instructors),
+            'description': ' '.join(rng.sample(descriptions, 10) + rng.choices(topics, cum_weights=weights, k=10)),
+            'learn': rng.sample(bullets, 4),
+        })
+    return courses
+
+
+def queries(index, count, seed):
+    """{shape: [query, ...]}; broad terms match at least 1% of the catalog."""
+    rng = random.Random(seed)
+    terms = sorted(index._postings)
+    broad = [term for term in terms if len(index._postings[term]) * 100 >= len(index)]
+    rare = [term for term in terms if len(index._postings[term]) * 100 < len(index)]
+    return {
+        'one broad term': [rng.choice(broad) for _ in range(count)],
+        'one rare term': [rng.choice(rare) for _ in range(count)],
+        'broad + rare': ['%s %s' % (rng.choice(broad), rng.choice(rare)) for _ in range(count)],
+        'two broad terms': [' '.join(rng.sample(broad, 2)) for _ in range(count)],
+        'three broad terms': [' '.join(rng.sample(broad, 3)) for _ in range(count)],
+    }
+
+
+def exhaustive(index, query, depth):
+    """Score every posting of every term: the ranking search() must reproduce."""
+    terms = sorted(set(search.tokenize(query)))
+    n = len(index._docs)
+    avg_length = index._total_length / n
+    scores = {}
+    for term in terms:
+        posting = index._postings.get(term)
+        if not posting:
+            continue
+        idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+        for slug, tf in posting.items():
+            norm = search.K1 * (1 - search.B + search.B * index._lengths[slug] / avg_length)
+            scores[slug] = scores.get(slug, 0.0) + idf * tf * (search.K1 + 1) / (tf + norm)
+    top = heapq.nlargest(max(depth, search.RANK_DEPTH), scores.items(), key=lambda item: (item[1], item[0]))
+    return top, len(scores)
+
+
+def time_queries(index, batch, limit, check):
+    """Milliseconds per query, and per capped query (share of the exact first page found,
+    its lowest score relative to the exact page's)."""
+    times, capped = [], []
+    for query in batch:
+        index._results.clear()
+        start = time.perf_counter()
+        hits, total = index.search(query, 0, limit)
+        times.append((time.perf_counter() - start) * 1000)
+        if check:
+            expected, expected_total = exhaustive(index, query, limit)
+            ranked = index._results[' '.join(sorted(set(search.tokenize(query))))]
+            if total != expected_total or (ranked.exact and list(ranked) != expected):
+                raise SystemExit('ranking differs from exhaustive scoring for %r' % query)
+            if not ranked.exact:
+                found = {slug for slug, _ in hits}
+                page = expected[:limit]
+                capped.append((sum(slug in found for slug, _ in page) / len(page), hits[-1][1] / page[-1][1]))
+    return times, capped
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--courses', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=2000, help='per query shape (default: 2000)')
+    parser.add_argument('--limit', type=int, default=20, help='results per page (default: 20)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--check', action='store_true', help='verify rankings against exhaustive scoring')
+    parser.add_argument('--p99-ms', type=float, help='fail when a query shape has a p99 over this')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    courses = synthetic_catalog(args.courses, args.seed)
+    index = search.build_index(courses)
+    postings = sorted(len(posting) for posting in index._postings.values())
+    broad = sum(length * 100 >= len(index) for length in postings)
+    print('%d courses, %d terms (%d broad), longest postings %s, built in %.1f s' % (
+        len(index), len(postings), broad, postings[-3:][::-1], time.perf_counter() - start))
+
+    shapes = queries(index, args.queries, args.seed)
+    # Every term once, straight after an index change (a course edit)
+    index.add(courses[0])
+    terms = sorted({term for batch in shapes.values() for query in batch for term in query.split()})
+    first_use, _ = time_queries(index, terms, args.limit, False)
+    print('  %-20s p50 %7.2f ms  p99 %7.2f ms  max %7.2f ms' % (
+        'first use of a term', statistics.median(first_use), percentile(first_use, 0.99), max(first_use)))
+    over = []
+    for shape, batch in shapes.items():
+        times, capped = time_queries(index, batch, args.limit, args.check)
+        p99 = percentile(times, 0.99)
+        line = '  %-20s p50 %7.2f ms  p99 %7.2f ms  max %7.2f ms' % (
+            shape, statistics.median(times), p99, max(times))
+        if capped:
+            line += '\n  %-20s %d capped at MAX_SCORED: %.0f%% of the exact first page, last score %.1f%% lower' % (
+                '', len(capped), statistics.mean(share for share, _ in capped) * 100,
+                (1 - statistics.mean(ratio for _, ratio in capped)) * 100)
+        print(line)
+        if args.p99_ms is not None and p99 > args.p99_ms:
+            over.append(shape)
+    if args.check:
+        print('rankings that ran to completion match exhaustive scoring')
+    if over:
+        print('over %.1f ms at p99: %s' % (args.p99_ms, ', '.join(over)))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
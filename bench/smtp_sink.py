@@ -0,0 +1,181 @@
+"""Local SMTP sink for exercising the mail queue, with failure injection.
+
+Accepts mail and throws it away, counting messages and connections:
+
+    python bench/smtp_sink.py serve --port 1025 --tempfail-rate 0.1
+
+or queue a burst of emails, run the worker processes against an in-process
+sink and report send throughput and connections used:
+
+    python bench/smtp_sink.py throughput --messages 5000 --processes 2
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Sink:
+    def __init__(self, latency_ms=0.0, tempfail_rate=0.0, reject_rate=0.0, greeting='220 sink ready',
+                 auth_reply=None, idle_timeout=None):
+        self.latency_ms = latency_ms
+        self.tempfail_rate = tempfail_rate
+        self.reject_rate = reject_rate
+        # A 4xx/5xx greeting refuses the connection; auth_reply (e.g. '535 bad
+        # credentials') makes EHLO offer AUTH and answers every attempt with it
+        self.greeting = greeting
+        self.auth_reply = auth_reply
+        # Like a real server, answer 421 and hang up on a connection idle this long
+        self.idle_timeout = idle_timeout
+        self.messages = 0
+        self.connections = 0
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+
+        async def reply(line):
+            writer.write(line.encode('ascii') + b'\r\n')
+            await writer.drain()
+        await reply(self.greeting)
+        try:
+            if not self.greeting.startswith('2'):
+                return
+            while True:
+                try:
+                    line = await asyncio.wait_for(reader.readline(), self.idle_timeout)
+                except asyncio.TimeoutError:
+                    await reply('421 idle timeout')
+                    return
+                if not line:
+                    return
+                command = line[:4].upper()
+                if command == b'EHLO' and self.auth_reply:
+                    await reply('250-sink')
+                    await reply('250 AUTH PLAIN LOGIN')
+                elif command in (b'EHLO', b'HELO'):
+                    await reply('250 sink')
+                elif command == b'AUTH' and self.auth_reply:
+                    await reply(self.auth_reply)
+                elif command == b'MAIL':
+                    await reply('250 ok')
+                elif command == b'RCPT':
+                    if random.random() < self.reject_rate:
+                        await reply('550 no such user')
+                    else:
+                        await reply('250 ok')
+                elif command == b'DATA':
+                    await reply('354 end with <CRLF>.<CRLF>')
+                    while await reader.readline() not in (b'.\r\n', b''):
+                        pass
+                    if self.latency_ms:
+                        await asyncio.sleep(self.latency_ms / 1000)
+                    if random.random() < self.tempfail_rate:
+                        await reply('451 try again later')
+                    else:
+                        self.messages += 1
+                        await reply('250 queued')
+                elif command in (b'RSET', b'NOOP'):
+                    await reply('250 ok')
+                elif command == b'QUIT':
+                    await reply('221 bye')
+                    return
+                else:
+                    await reply('502 not implemented')
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+def start(sink, port=0):
+    """Run the sink on a background event loop; returns the bound port."""
+    ready = threading.Event()
+    bound = []
+
+    def run():
+        loop = asyncio.new_event_loop()
+        server = loop.run_until_complete(asyncio.start_server(sink.handle, '127.0.0.1', port))
+        bound.append(server.sockets[0].getsockname()[1])
+        ready.set()
+        loop.run_forever()
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait()
+    return bound[0]
+
+
+def throughput(messages, processes, batch_size, latency_ms, tempfail_rate):
+    sink = Sink(latency_ms, tempfail_rate)
+    port = start(sink)
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, LEARNHUB_VAR_DIR=tmp, LEARNHUB_SMTP_HOST='127.0.0.1',
+                   LEARNHUB_SMTP_PORT=str(port))
+        sys.path.insert(0, ROOT)
+        os.environ.update(env)
+        import mailer
+        queue = mailer.MailQueue(os.path.join(tmp, 'mail.db'))
+        start_time = time.perf_counter()
+        for i in range(0, messages, 500):
+            queue.enqueue_many([('welcome', 'user%d@example.com' % n, {'name': 'User %d' % n})
+                                for n in range(i, min(messages, i + 500))])
+        enqueue_time = time.perf_counter() - start_time
+        worker = subprocess.Popen(
+            [sys.executable, '-m', 'flask', '--app', 'app', 'mail-worker', '--processes', str(processes),
+             '--batch-size', str(batch_size)], cwd=ROOT, env=env)
+        start_time = time.perf_counter()
+        # Done once every job was tried; temp-failed ones wait out their backoff
+        while time.perf_counter() - start_time < 120:
+            stats = queue.stats()
+            if not stats['due'] and not stats['in_flight']:
+                break
+            time.sleep(0.05)
+        elapsed = time.perf_counter() - start_time
+        worker.terminate()
+        worker.wait()
+        stats = queue.stats()
+    print('enqueued %d in %.2fs (%.0f/s); sent %d in %.2fs (%.0f msg/s) over %d SMTP connections; '
+          'queue %s' % (messages, enqueue_time, messages / enqueue_time, sink.messages, elapsed,
+                        sink.messages / elapsed, sink.connections, stats))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest='command', required=True)
+    serve = sub.add_parser('serve', help='run the sink')
+    serve.add_argument('--port', type=int, default=1025)
+    serve.add_argument('--latency-ms', type=float, default=0.0)
+    serve.add_argument('--tempfail-rate', type=float, default=0.0)
+    serve.add_argument('--reject-rate', type=float, default=0.0)
+    serve.add_argument('--greeting', default='220 sink ready', help="e.g. '421 too busy' to refuse connections")
+    serve.add_argument('--auth-reply', help="offer AUTH and answer it with this, e.g. '535 bad credentials'")
+    serve.add_argument('--idle-timeout', type=float, help='close connections idle this many seconds')
+    run = sub.add_parser('throughput', help='drive the mail workers against the sink')
+    run.add_argument('--messages', type=int, default=5000)
+    run.add_argument('--processes', type=int, default=2)
+    run.add_argument('--batch-size', type=int, default=50)
+    run.add_argument('--latency-ms', type=float, default=0.0)
+    run.add_argument('--tempfail-rate', type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        sink = Sink(args.latency_ms, args.tempfail_rate, args.reject_rate, args.greeting, args.auth_reply,
+                    args.idle_timeout)
+        print('SMTP sink on 127.0.0.1:%d' % start(sink, args.port))
+        try:
+            while True:
+                time.sleep(10)
+                print('%d messages over %d connections' % (sink.messages, sink.connections))
+        except KeyboardInterrupt:
+            pass
+    else:
+        throughput(args.messages, args.processes, args.batch_size, args.latency_ms, args.tempfail_rate)
+
+
+if __name__ == '__main__':
+    main()
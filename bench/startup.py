@@ -0,0 +1,98 @@
+"""Measure cold starts: import, build and warm the app in fresh processes.
+
+Each run starts a new interpreter on a scratch LEARNHUB_VAR_DIR that
+imports app with LEARNHUB_ENV=--profile, finishes its startup the way the
+gunicorn master does (warm_caches when the profile asks for it, then
+ready), serves one request through the test client and hands back its
+startup report. An untimed first run writes missing bytecode. Prints the
+median time to ready and to the first response, the median of each phase
+and the modules with the most import self time:
+
+    python bench/startup.py --runs 5 --profile production --budget-ms 1500
+
+With --budget-ms the command exits non-zero when the median time to ready
+is over the budget, e.g. as a CI check that cold starts stay predictable.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = '''
+import json, sys
+import startup
+startup.time_imports()
+import app
+app.finish_startup(app.app)
+app.app.test_client().get(sys.argv[1])
+print(json.dumps(startup.report(top=1000)))
+'''
+
+
+def cold_start(profile, path):
+    var_dir = tempfile.mkdtemp(prefix='learnhub-startup-')
+    try:
+        env = dict(os.environ, LEARNHUB_ENV=profile, LEARNHUB_VAR_DIR=var_dir)
+        # A deployed instance has its bytecode; without it edited modules
+        # would be recompiled on every run
+        env.pop('PYTHONDONTWRITEBYTECODE', None)
+        out = subprocess.run([sys.executable, '-c', CHILD, path], cwd=ROOT, env=env, capture_output=True,
+                             text=True, check=True).stdout
+    finally:
+        shutil.rmtree(var_dir, ignore_errors=True)
+    return json.loads(out.splitlines()[-1])
+
+
+def median_by(reports, key, field):
+    """{name: median of field} over every report's key list (missing counts as 0)."""
+    names = {item[field[0]] for report in reports for item in report[key]}
+    values = {}
+    for name in names:
+        values[name] = statistics.median(
+            next((item[field[1]] for item in report[key] if item[field[0]] == name), 0.0)
+            for report in reports)
+    return values
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--profile', default='production')
+    parser.add_argument('--path', default='/', help='the first request (default: /)')
+    parser.add_argument('--top', type=int, default=10, help='modules to list (default: 10)')
+    parser.add_argument('--budget-ms', type=float, help='fail when the median time to ready is over this')
+    args = parser.parse_args(argv)
+
+    # The first run writes any missing bytecode and warms the OS file cache
+    cold_start(args.profile, args.path)
+    reports = [cold_start(args.profile, args.path) for _ in range(args.runs)]
+    ready = [report['ready_ms'] for report in reports]
+    served = [report['first_request']['at_ms'] for report in reports]
+    print('%s profile, %d runs (ms since %s): ready %.0f (min %.0f, max %.0f), first response %.0f' % (
+        args.profile, args.runs, reports[0]['clock'], statistics.median(ready), min(ready), max(ready),
+        statistics.median(served)))
+    print('  interpreter boot %.0f, imports %.0f, first request took %.1f' % (
+        statistics.median(report['boot_ms'] for report in reports),
+        statistics.median(report['imports_ms'] for report in reports),
+        statistics.median(report['first_request']['ms'] for report in reports)))
+    for name, ms in median_by(reports, 'phases', ('name', 'ms')).items():
+        print('  phase  %-36s %7.1f' % (name, ms))
+    for name, ms in median_by(reports, 'lazy', ('name', 'ms')).items():
+        print('  lazy   %-36s %7.1f' % (name, ms))
+    imports = median_by(reports, 'imports', ('module', 'self_ms'))
+    for name, ms in sorted(imports.items(), key=lambda item: -item[1])[:args.top]:
+        print('  import %-36s %7.1f self' % (name, ms))
+    if args.budget_ms is not None and statistics.median(ready) > args.budget_ms:
+        print('over budget: median time to ready %.0f ms > %.0f ms' % (statistics.median(ready), args.budget_ms))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
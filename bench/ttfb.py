@@ -0,0 +1,64 @@
+"""Measure time-to-first-byte for the personalised landing page.
+
+Runs the production server twice, buffered (LEARNHUB_STREAM_PAGES=0) and
+streamed, and requests / with the personalisation cookie set:
+
+    python bench/ttfb.py --requests 500
+"""
+import argparse
+import os
+import socket
+import time
+
+from async_load import free_port, start_server
+
+REQUEST = (b'GET / HTTP/1.1\r\nHost: localhost\r\nCookie: learnhub_user=Bench\r\n'
+           b'Accept-Encoding: gzip\r\nConnection: close\r\n\r\n')
+
+
+def fetch(port):
+    start = time.perf_counter()
+    with socket.create_connection(('127.0.0.1', port)) as sock:
+        sock.sendall(REQUEST)
+        sock.recv(65536)
+        first = time.perf_counter()
+        while sock.recv(65536):
+            pass
+    return first - start, time.perf_counter() - start
+
+
+def measure(stream, requests):
+    os.environ['LEARNHUB_STREAM_PAGES'] = '1' if stream else '0'
+    port = free_port()
+    proc = start_server(port, 1, 0, asgi=False)
+    try:
+        for _ in range(20):
+            fetch(port)
+        samples = [fetch(port) for _ in range(requests)]
+    finally:
+        proc.terminate()
+        proc.wait()
+    ttfb = sorted(s[0] for s in samples)
+    total = sorted(s[1] for s in samples)
+    return {
+        'ttfb_p50_ms': ttfb[len(ttfb) // 2] * 1000,
+        'ttfb_p99_ms': ttfb[int(len(ttfb) * 0.99)] * 1000,
+        'total_p50_ms': total[len(total) // 2] * 1000,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=500)
+    args = parser.parse_args(argv)
+    results = {}
+    for name, stream in (('buffered', False), ('streamed', True)):
+        results[name] = measure(stream, args.requests)
+        print('%-8s  ttfb p50 %6.2f ms  p99 %6.2f ms  total p50 %6.2f ms' % (
+            name, results[name]['ttfb_p50_ms'], results[name]['ttfb_p99_ms'],
+            results[name]['total_p50_ms']))
+    return results
+
+
+if __name__ == '__main__':
+    main()
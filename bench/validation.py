@@ -0,0 +1,72 @@
+"""Measure request-schema validation against the rest of a request's cost.
+
+Times each compiled schema on valid and invalid bodies, json.loads of the
+same bodies, and a full POST /api/subscribe through the Flask test client
+(stand-in payment backend, no latency) for scale:
+
+    python bench/validation.py --iterations 200000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('LEARNHUB_RATE_LIMITS', 'off')
+
+import schemas  # noqa: E402
+
+CASES = {
+    'signup': (schemas.SIGNUP,
+               {'name': 'Ada Lovelace', 'email': 'ada@example.com', 'password': 'correct horse',
+                'expertise': 'development'},
+               {'name': '', 'email': 'not-an-email', 'password': 'short', 'expertise': 'juggling'}),
+    'subscribe': (schemas.SUBSCRIBE,
+                  {'plan': 'Professional', 'payment_method': 'credit'},
+                  {'plan': 'Gold', 'payment_method': 'cash'}),
+    'newsletter': (schemas.NEWSLETTER,
+                   {'email': 'ada@example.com'},
+                   {'email': 42}),
+}
+
+
+def per_call_us(func, arg, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func(arg)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def measure_request(iterations):
+    from app import app
+    client = app.test_client()
+    body = CASES['subscribe'][1]
+    for _ in range(100):
+        client.post('/api/subscribe', json=body)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        client.post('/api/subscribe', json=body)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=200000)
+    parser.add_argument('--requests', type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    for name, (schema, valid, invalid) in CASES.items():
+        raw = json.dumps(valid)
+        print('%-10s  valid %.2f us  invalid %.2f us  (json.loads %.2f us)' % (
+            name, per_call_us(schema, valid, args.iterations),
+            per_call_us(schema, invalid, args.iterations),
+            per_call_us(json.loads, raw, args.iterations)))
+    request_us = measure_request(args.requests)
+    validate_us = per_call_us(schemas.SUBSCRIBE, CASES['subscribe'][1], args.iterations)
+    print('POST /api/subscribe end to end %.1f us; validation is %.1f%% of it' % (
+        request_us, validate_us / request_us * 100))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Streaming NDJSON bulk import.
+
+The request body is read one line at a time and written in batches; each
+batch is committed before the next one is read, so memory stays constant
+and a slow store pushes back on the client through TCP flow control.
+"""
+import io
+
+import fastjson
+from storage import StorageError
+
+BATCH_SIZE = 1000
+MAX_LINE = 64 * 1024
+READ_BUFFER = 256 * 1024
+
+
+def iter_lines(stream):
+    """Yield (line number, bytes); overlong lines are skipped and yield None."""
+    line_no = 0
+    # Raw WSGI input streams readline() a byte at a time; buffer them
+    if isinstance(stream, io.RawIOBase):
+        stream = io.BufferedReader(stream, READ_BUFFER)
+    while True:
+        line = stream.readline(MAX_LINE + 1)
+        if not line:
+            return
+        line_no += 1
+        if len(line) > MAX_LINE and not line.endswith(b'\n'):
+            # Discard the rest of the line without buffering it
+            while line and not line.endswith(b'\n'):
+                line = stream.readline(MAX_LINE)
+            yield line_no, None
+            continue
+        yield line_no, line
+
+
+def import_ndjson(stream, schema, write_many, batch_size=BATCH_SIZE):
+    """Yield one result dict per input line, then a summary dict."""
+    summary = {'lines': 0, 'imported': 0, 'duplicates': 0, 'rejected': 0, 'failed': 0}
+    batch, batch_lines = [], []
+
+    def flush():
+        try:
+            # write_many returns the records it refused as duplicates
+            duplicates = {id(record) for record in write_many(batch) or ()}
+        except StorageError as exc:
+            summary['failed'] += len(batch)
+            results = [{'line': n, 'ok': False, 'error': str(exc)} for n in batch_lines]
+        else:
+            summary['duplicates'] += len(duplicates)
+            summary['imported'] += len(batch) - len(duplicates)
+            results = [{'line': n, 'ok': False, 'error': 'duplicate email'} if id(record) in duplicates
+                       else {'line': n, 'ok': True} for n, record in zip(batch_lines, batch)]
+        del batch[:], batch_lines[:]
+        return results
+
+    for line_no, line in iter_lines(stream):
+        if line is not None and not line.strip():
+            continue
+        summary['lines'] += 1
+        if line is None:
+            error = 'line too long'
+        else:
+            try:
+                record = fastjson.loads(line)
+            except ValueError:
+                error = 'invalid JSON'
+            else:
+                record, problem = schema(record)
+                error = problem['message'] if problem else None
+        if error:
+            summary['rejected'] += 1
+            yield {'line': line_no, 'ok': False, 'error': error}
+            continue
+        batch.append(record)
+        batch_lines.append(line_no)
+        if len(batch) >= batch_size:
+            yield from flush()
+    if batch:
+        yield from flush()
+    yield {'summary': summary}
@@ -0,0 +1,137 @@
+"""Course catalog loaded from data/courses.json and indexed in memory."""
+import hashlib
+import json
+import os
+import threading
+import weakref
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+COURSES_FILE = os.environ.get('LEARNHUB_COURSES', os.path.join(DATA_DIR, 'courses.json'))
+
+REQUIRED_FIELDS = ('slug', 'title', 'category', 'instructor', 'price')
+
+
+class CatalogError(ValueError):
+    pass
+
+
+def normalize_course(raw):
+    missing = [field for field in REQUIRED_FIELDS if not raw.get(field)]
+    if missing:
+        raise CatalogError('course is missing %s' % ', '.join(missing))
+    return {
+        'slug': str(raw['slug']),
+        'title': str(raw['title']),
+        'category': str(raw['category']),
+        'instructor': str(raw['instructor']),
+        'price': float(raw['price']),
+        'rating': float(raw.get('rating', 0)),
+        'reviews': int(raw.get('reviews', 0)),
+        'image': raw.get('image', ''),
+        'description': raw.get('description', ''),
+        'learn': list(raw.get('learn', [])),
+        'featured': bool(raw.get('featured', False)),
+    }
+
+
+class Catalog:
+    def __init__(self, courses=()):
+        self._lock = threading.Lock()
+        self._by_slug = {}
+        self._listeners = []
+        # Bumped on every change; cached views key off it. It starts at 0 in
+        # every process, so ETags also carry digest, a hash of the content
+        self.version = 0
+        self._views = None
+        for raw in courses:
+            course = normalize_course(raw)
+            self._by_slug[course['slug']] = course
+        self.digest = self._digest()
+
+    @classmethod
+    def from_file(cls, path=None):
+        with open(path or COURSES_FILE, encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def subscribe(self, listener):
+        """Call listener(event, course), event in ('upsert', 'remove'), on changes.
+
+        A bound method is held weakly: the catalog is module-global, and it
+        mustn't keep alive the per-app objects (search indexes) that follow it.
+        """
+        self._listeners.append(weakref.WeakMethod(listener) if hasattr(listener, '__self__')
+                               else lambda: listener)
+
+    def unsubscribe(self, listener):
+        self._listeners = [ref for ref in self._listeners if ref() not in (listener, None)]
+
+    def _digest(self):
+        # Order matters too: pages list courses in catalog order
+        content = json.dumps(list(self._by_slug.values()), sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    def _changed(self, event, course):
+        self.version += 1
+        self.digest = self._digest()
+        self._views = None
+        for ref in self._listeners:
+            listener = ref()
+            if listener is not None:
+                listener(event, course)
+        self._listeners = [ref for ref in self._listeners if ref() is not None]
+
+    def upsert(self, raw):
+        course = normalize_course(raw)
+        with self._lock:
+            self._by_slug[course['slug']] = course
+            self._changed('upsert', course)
+        return course
+
+    def remove(self, slug):
+        with self._lock:
+            course = self._by_slug.pop(slug, None)
+            if course is not None:
+                self._changed('remove', course)
+        return course
+
+    def _build_views(self):
+        views = self._views
+        if views is None:
+            with self._lock:
+                ordered = tuple(self._by_slug.values())
+                by_category = {}
+                for course in ordered:
+                    by_category.setdefault(course['category'], []).append(course)
+                views = {
+                    'all': ordered,
+                    'by_category': {k: tuple(v) for k, v in by_category.items()},
+                    'featured': tuple(c for c in ordered if c['featured']),
+                }
+                self._views = views
+        return views
+
+    def __len__(self):
+        return len(self._by_slug)
+
+    def __iter__(self):
+        return iter(self._build_views()['all'])
+
+    def get(self, slug):
+        return self._by_slug.get(slug)
+
+    def categories(self):
+        return sorted(self._build_views()['by_category'])
+
+    def featured(self, limit=6):
+        return self._build_views()['featured'][:limit]
+
+    def page(self, offset=0, limit=20, category=None):
+        views = self._build_views()
+        if category is None:
+            courses = views['all']
+        else:
+            courses = views['by_category'].get(category, ())
+        return courses[offset:offset + limit], len(courses)
+
+
+catalog = Catalog.from_file()
@@ -0,0 +1,163 @@
+"""In-memory duplicate-email detection for signup and newsletter.
+
+Each email is reduced to a 64-bit key (blake2b of the normalised address).
+A Bloom filter answers "definitely new" for most fresh addresses; anything
+it flags is confirmed against an exact index of keys, kept as a sorted
+array('Q') plus a small set of recent additions that is merged in
+periodically.
+
+Sizing (1% target false-positive rate, see bench/dedupe.py):
+    Bloom filter    ~1.2 bytes/entry (9.6 bits, 7 probes)
+    exact index     8 bytes/entry once merged (~70 while still "recent")
+    lookup          ~4 us for a new address, ~8 us for a known one (CPython,
+                    1M entries; most of it is hashing and the bisect)
+Keys collide with probability ~n/2**64, i.e. never in practice.
+"""
+import hashlib
+import math
+import threading
+from array import array
+from bisect import bisect_left
+
+DEFAULT_CAPACITY = 100000
+FALSE_POSITIVE_RATE = 0.01
+MASK64 = (1 << 64) - 1
+
+
+class DuplicateEmail(Exception):
+    pass
+
+
+def normalize_email(email):
+    return email.strip().lower()
+
+
+def email_key(email):
+    digest = hashlib.blake2b(normalize_email(email).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+def _mix(key):
+    # splitmix64 finaliser: a second, independent-looking hash for double hashing
+    key = (key ^ (key >> 30)) * 0xbf58476d1ce4e5b9 & MASK64
+    key = (key ^ (key >> 27)) * 0x94d049bb133111eb & MASK64
+    return (key ^ (key >> 31)) | 1
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=FALSE_POSITIVE_RATE):
+        self.capacity = max(int(capacity), 1)
+        self.num_bits = max(64, int(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+
+    def _probe(self, key):
+        # Double hashing: position i is (key + i * h2) mod m
+        m = self.num_bits
+        pos, step = key % m, _mix(key) % m
+        for _ in range(self.num_hashes):
+            yield pos
+            pos += step
+            if pos >= m:
+                pos -= m
+
+    def add(self, key):
+        bits = self.bits
+        for pos in self._probe(key):
+            bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key):
+        bits = self.bits
+        m = self.num_bits
+        pos, step = key % m, _mix(key) % m
+        for _ in range(self.num_hashes):
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+            pos += step
+            if pos >= m:
+                pos -= m
+        return True
+
+
+class EmailIndex:
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self._lock = threading.Lock()
+        self._bloom = BloomFilter(capacity)
+        self._sorted = array('Q')
+        self._recent = set()
+        self._removed = set()
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def _contains_key(self, key):
+        if key not in self._bloom:
+            return False
+        if key in self._recent:
+            return True
+        if key in self._removed:
+            return False
+        keys = self._sorted
+        i = bisect_left(keys, key)
+        return i < len(keys) and keys[i] == key
+
+    def __contains__(self, email):
+        return self._contains_key(email_key(email))
+
+    def _add_key(self, key):
+        self._removed.discard(key)
+        self._recent.add(key)
+        self._bloom.add(key)
+        self._count += 1
+        if self._count > self._bloom.capacity:
+            self._rebuild_bloom(self._count * 2)
+        if len(self._recent) > max(1024, len(self._sorted) // 8):
+            self._merge()
+
+    def claim(self, email):
+        """Add email unless present; True if this call added it."""
+        key = email_key(email)
+        with self._lock:
+            if self._contains_key(key):
+                return False
+            self._add_key(key)
+            return True
+
+    def release(self, email):
+        key = email_key(email)
+        with self._lock:
+            if not self._contains_key(key):
+                return
+            # The Bloom filter can't forget; the exact index has the final say
+            self._recent.discard(key)
+            self._removed.add(key)
+            self._count -= 1
+
+    def add_many(self, emails):
+        with self._lock:
+            for email in emails:
+                key = email_key(email)
+                if not self._contains_key(key):
+                    self._add_key(key)
+            self._merge()
+
+    def _merge(self):
+        keys = set(self._sorted)
+        keys.difference_update(self._removed)
+        keys.update(self._recent)
+        self._sorted = array('Q', sorted(keys))
+        self._recent = set()
+        self._removed = set()
+
+    def _rebuild_bloom(self, capacity):
+        bloom = BloomFilter(capacity)
+        for key in self._sorted:
+            if key not in self._removed:
+                bloom.add(key)
+        for key in self._recent:
+            bloom.add(key)
+        self._bloom = bloom
+
+    def memory_bytes(self):
+        return len(self._bloom.bits) + self._sorted.itemsize * len(self._sorted)
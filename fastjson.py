@@ -0,0 +1,81 @@
+"""JSON encoding and decoding for the API, on orjson when it is installed.
+
+dumps() returns compact UTF-8 bytes and loads() takes bytes or str, so
+request bodies go straight from the socket to the parser and responses
+straight to it without a str round trip. Without orjson both fall back to
+the stdlib json module with the same output shape; LEARNHUB_JSON=stdlib
+forces the fallback (bench/json_codec.py compares the two).
+
+Constant response bodies (handlers.SIGNUP_OK and friends) are registered
+once with preencode() and encode() hands back their stored bytes instead
+of serialising the same dict on every request. The lookup is by identity,
+so copies like dict(THROTTLED, retry_after=3) are encoded normally.
+Registered bodies must not be mutated.
+
+app.FastJSONProvider plugs the same codec into Flask, so jsonify() and
+request.get_json() use it too.
+"""
+import dataclasses
+import decimal
+import json
+import os
+import uuid
+from datetime import date
+
+from werkzeug.http import http_date
+
+try:
+    import orjson
+except ImportError:  # optional, the stdlib json module is always available
+    orjson = None
+
+if os.environ.get('LEARNHUB_JSON') == 'stdlib':
+    orjson = None
+
+BACKEND = 'orjson' if orjson is not None else 'stdlib'
+
+
+def _default(obj):
+    # What Flask's default provider accepts beyond plain JSON types
+    if isinstance(obj, date):
+        return http_date(obj)
+    if isinstance(obj, (decimal.Decimal, uuid.UUID)):
+        return str(obj)
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    raise TypeError('Object of type %s is not JSON serializable' % type(obj).__name__)
+
+
+if orjson is not None:
+    # orjson.JSONDecodeError subclasses ValueError, like json's
+    loads = orjson.loads
+
+    def dumps(obj):
+        # orjson serialises dates itself (ISO 8601); keep Flask's HTTP dates
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+else:
+    _encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=_default)
+
+    def loads(data):
+        return json.loads(data)
+
+    def dumps(obj):
+        return _encoder.encode(obj).encode('utf-8')
+
+
+# id(body) -> (body, bytes); the body is kept so its id can't be reused
+_preencoded = {}
+
+
+def preencode(*bodies):
+    for body in bodies:
+        _preencoded[id(body)] = body, dumps(body)
+
+
+def encode(body):
+    cached = _preencoded.get(id(body))
+    if cached is not None and cached[0] is body:
+        return cached[1]
+    return dumps(body)
@@ -0,0 +1,38 @@
+"""Gunicorn settings for production; loaded by serve.py (or `gunicorn app:app`)."""
+import multiprocessing
+import os
+
+import startup
+
+# Time the imports of the app the master preloads (startup report, /debug/startup)
+startup.time_imports()
+
+bind = os.environ.get('BIND', '0.0.0.0:%s' % os.environ.get('PORT', '8000'))
+
+# Classic (2 x cores) + 1; threads let each worker overlap slow clients
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_class = 'gthread' if threads > 1 else 'sync'
+
+# Import the app (and warm its caches) once in the master, then fork, so the
+# rendered page, bundles, catalog and search index are shared copy-on-write
+preload_app = True
+
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+
+# Recycle workers periodically, staggered so they don't all restart at once
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 1000))
+
+# An empty GUNICORN_ACCESSLOG disables access logging (e.g. for benchmarks)
+accesslog = os.environ.get('GUNICORN_ACCESSLOG', '-') or None
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOGLEVEL', 'info')
+
+
+def on_starting(server):
+    # Runs in the master after preload and before the first fork
+    import app
+    app.finish_startup(app.app)
@@ -0,0 +1,236 @@
+"""API handlers shared by the Flask (WSGI) app and the ASGI app.
+
+Handlers take the decoded JSON body and a services object and return
+(status code, response body). The body is checked against the route's
+schema first; only declared fields reach the services. The async variants
+mirror the sync ones.
+"""
+import functools
+
+import fastjson
+import schemas
+from dedupe import DuplicateEmail
+from passwords import HasherBusy
+from payments import GatewayUnavailable, PaymentDeclined, gateway_key
+from storage import StorageBusy, StorageError
+
+SIGNUP_OK = {'status': 'success', 'message': 'Account created successfully'}
+SUBSCRIBE_OK = {'status': 'success', 'message': 'Subscription successful'}
+NEWSLETTER_OK = {'status': 'success', 'message': 'Newsletter subscription successful'}
+UNSUBSCRIBE_OK = {'status': 'success', 'message': 'You have been unsubscribed'}
+BUSY = {'status': 'error', 'message': 'Service busy, please retry shortly'}
+STORAGE_FAILED = {'status': 'error', 'message': 'Could not save your request'}
+DUPLICATE_SIGNUP = {'status': 'error', 'message': 'An account with this email already exists'}
+PAYMENT_DECLINED = {'status': 'error', 'message': 'Your payment was declined'}
+PAYMENT_UNAVAILABLE = {'status': 'error', 'message': 'Payments are temporarily unavailable, please retry shortly'}
+UNKNOWN_OPERATION = {'status': 'error', 'message': 'Each operation needs a type of: signup, subscribe, newsletter'}
+INVALID_BATCH = {'status': 'error',
+                 'message': 'Expected a JSON array of 1-%d operations' % schemas.MAX_BATCH_OPERATIONS}
+fastjson.preencode(SIGNUP_OK, SUBSCRIBE_OK, NEWSLETTER_OK, UNSUBSCRIBE_OK, BUSY, STORAGE_FAILED,
+                   DUPLICATE_SIGNUP, PAYMENT_DECLINED, PAYMENT_UNAVAILABLE, UNKNOWN_OPERATION, INVALID_BATCH)
+
+# Batch operation type -> (route whose rate limit it counts against, schema)
+BATCH_OPERATIONS = {
+    'signup': ('/api/signup', schemas.SIGNUP),
+    'subscribe': ('/api/subscribe', schemas.SUBSCRIBE),
+    'newsletter': ('/api/newsletter', schemas.NEWSLETTER),
+}
+
+
+def _store(write, data, schema, ok):
+    data, error = schema(data)
+    if error:
+        return 400, error
+    try:
+        write(data)
+    except DuplicateEmail:
+        return 409, DUPLICATE_SIGNUP
+    except (StorageBusy, HasherBusy):
+        return 503, BUSY
+    except StorageError:
+        return 500, STORAGE_FAILED
+    return 200, ok
+
+
+def _plan_batch(data, admit):
+    """Validate every operation up front; returns (results, groups) or None.
+
+    results holds (status, body) for operations already settled (invalid,
+    throttled); groups maps each operation type to its (index, clean data).
+    """
+    if type(data) is not list or not 0 < len(data) <= schemas.MAX_BATCH_OPERATIONS:
+        return None
+    results = [None] * len(data)
+    groups = {name: [] for name in BATCH_OPERATIONS}
+    for index, operation in enumerate(data):
+        kind = operation.get('type') if type(operation) is dict else None
+        if kind not in BATCH_OPERATIONS:
+            results[index] = 400, UNKNOWN_OPERATION
+            continue
+        route, schema = BATCH_OPERATIONS[kind]
+        record, error = schema(operation.get('data'))
+        if error:
+            results[index] = 400, error
+            continue
+        rejected = admit(route) if admit else None
+        if rejected:
+            results[index] = rejected
+            continue
+        groups[kind].append((index, record))
+    return results, groups
+
+
+def _settle_group(results, items, ok, duplicates=(), failure=None, duplicate=(409, DUPLICATE_SIGNUP)):
+    skipped = {id(record) for record in duplicates}
+    for index, record in items:
+        if failure:
+            results[index] = failure
+        elif id(record) in skipped:
+            results[index] = duplicate
+        else:
+            results[index] = 200, ok
+
+
+def _batch_writers(services):
+    # (kind, write, ok body, response to a duplicate): as with
+    # /api/newsletter, an address already on the list is a success
+    return (('signup', functools.partial(services.save_signups, with_passwords=True, notify=True), SIGNUP_OK,
+             (409, DUPLICATE_SIGNUP)),
+            ('newsletter', functools.partial(services.add_subscribers, notify=True), NEWSLETTER_OK,
+             (200, NEWSLETTER_OK)))
+
+
+def _batch_body(results):
+    return {'status': 'success', 'results': [{'code': code, 'body': body} for code, body in results]}
+
+
+def _charge_failure(exc):
+    if isinstance(exc, PaymentDeclined):
+        return 402, PAYMENT_DECLINED
+    return 503, PAYMENT_UNAVAILABLE
+
+
+def signup(data, services):
+    return _store(services.save_signup, data, schemas.SIGNUP, SIGNUP_OK)
+
+
+def _charge_key(key, item=None):
+    return gateway_key(key, item) if key is not None else None
+
+
+def subscribe(data, services, key=None):
+    """key is the request's Idempotency-Key, if it had one."""
+    data, error = schemas.SUBSCRIBE(data)
+    if error:
+        return 400, error
+    try:
+        services.charge(data, _charge_key(key))
+    except (PaymentDeclined, GatewayUnavailable) as exc:
+        return _charge_failure(exc)
+    return 200, SUBSCRIBE_OK
+
+
+def newsletter(data, services):
+    return _store(services.add_subscriber, data, schemas.NEWSLETTER, NEWSLETTER_OK)
+
+
+def unsubscribe(data, services):
+    return _store(services.remove_subscriber, data, schemas.NEWSLETTER, UNSUBSCRIBE_OK)
+
+
+def batch(data, services, admit=None, key=None):
+    """Run many operations in one request, one storage batch per type.
+
+    admit(route) may return a (status, body) to refuse an operation, e.g.
+    when the client is over that route's rate limit. key is the request's
+    Idempotency-Key, if it had one.
+    """
+    planned = _plan_batch(data, admit)
+    if planned is None:
+        return 400, INVALID_BATCH
+    results, groups = planned
+    for kind, write, ok, duplicate in _batch_writers(services):
+        items = groups[kind]
+        if not items:
+            continue
+        try:
+            duplicates = write([record for _, record in items])
+        except (StorageBusy, HasherBusy):
+            _settle_group(results, items, ok, failure=(503, BUSY))
+        except StorageError:
+            _settle_group(results, items, ok, failure=(500, STORAGE_FAILED))
+        else:
+            _settle_group(results, items, ok, duplicates, duplicate=duplicate)
+    for index, record in groups['subscribe']:
+        try:
+            services.charge(record, _charge_key(key, index))
+        except (PaymentDeclined, GatewayUnavailable) as exc:
+            results[index] = _charge_failure(exc)
+        else:
+            results[index] = 200, SUBSCRIBE_OK
+    return 200, _batch_body(results)
+
+
+async def _store_async(write, data, schema, ok):
+    data, error = schema(data)
+    if error:
+        return 400, error
+    try:
+        await write(data)
+    except DuplicateEmail:
+        return 409, DUPLICATE_SIGNUP
+    except (StorageBusy, HasherBusy):
+        return 503, BUSY
+    except StorageError:
+        return 500, STORAGE_FAILED
+    return 200, ok
+
+
+async def signup_async(data, services):
+    return await _store_async(services.save_signup, data, schemas.SIGNUP, SIGNUP_OK)
+
+
+async def subscribe_async(data, services, key=None):
+    data, error = schemas.SUBSCRIBE(data)
+    if error:
+        return 400, error
+    try:
+        await services.charge(data, _charge_key(key))
+    except (PaymentDeclined, GatewayUnavailable) as exc:
+        return _charge_failure(exc)
+    return 200, SUBSCRIBE_OK
+
+
+async def newsletter_async(data, services):
+    return await _store_async(services.add_subscriber, data, schemas.NEWSLETTER, NEWSLETTER_OK)
+
+
+async def unsubscribe_async(data, services):
+    return await _store_async(services.remove_subscriber, data, schemas.NEWSLETTER, UNSUBSCRIBE_OK)
+
+
+async def batch_async(data, services, admit=None, key=None):
+    planned = _plan_batch(data, admit)
+    if planned is None:
+        return 400, INVALID_BATCH
+    results, groups = planned
+    for kind, write, ok, duplicate in _batch_writers(services):
+        items = groups[kind]
+        if not items:
+            continue
+        try:
+            duplicates = await write([record for _, record in items])
+        except (StorageBusy, HasherBusy):
+            _settle_group(results, items, ok, failure=(503, BUSY))
+        except StorageError:
+            _settle_group(results, items, ok, failure=(500, STORAGE_FAILED))
+        else:
+            _settle_group(results, items, ok, duplicates, duplicate=duplicate)
+    for index, record in groups['subscribe']:
+        try:
+            await services.charge(record, _charge_key(key, index))
+        except (PaymentDeclined, GatewayUnavailable) as exc:
+            results[index] = _charge_failure(exc)
+        else:
+            results[index] = 200, SUBSCRIBE_OK
+    return 200, _batch_body(results)
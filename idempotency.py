@@ -0,0 +1,248 @@
+"""Idempotency-Key support for non-repeatable POSTs (payments).
+
+Keys live in a small SQLite table next to the other stores, so every
+gunicorn worker sees the same entries. The first request with a key
+inserts a "pending" row and runs the handler; its response is then stored
+against the key. A retry with the same key:
+
+    completed       gets the stored response back without running anything
+    still running   waits for the first request to finish (an in-process
+                    Event when both are in the same worker, polling the
+                    row otherwise; on the event loop, asyncio.sleep between
+                    polls) and then gets its response
+    different body  is refused (422); a key names exactly one request
+
+Entries expire after TTL seconds and the table is trimmed to MAX_ENTRIES
+by least-recent use. 5xx responses are not stored: nothing was done, so a
+retry should run again. A pending row whose owner died is taken over after
+PENDING_TIMEOUT.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import fastjson
+from storage import VAR_DIR, StorageBusy, connect
+
+DB_PATH = os.environ.get('LEARNHUB_IDEMPOTENCY_DB', os.path.join(VAR_DIR, 'idempotency.db'))
+
+TTL = float(os.environ.get('LEARNHUB_IDEMPOTENCY_TTL', 24 * 3600))
+MAX_ENTRIES = int(os.environ.get('LEARNHUB_IDEMPOTENCY_MAX_ENTRIES', 100000))
+PENDING_TIMEOUT = 30.0
+WAIT_TIMEOUT = 10.0
+# Threads for run_async()'s SQLite calls; waiting for a pending key takes none
+ASYNC_THREADS = 4
+EVICT_EVERY = 256
+MAX_KEY_LENGTH = 255
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS idempotency (
+    key TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    status INTEGER,
+    body TEXT,
+    created_at REAL NOT NULL,
+    used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idempotency_used_at ON idempotency (used_at);
+'''
+
+KEY_REUSED = {'status': 'error', 'message': 'Idempotency-Key was already used for a different request'}
+INVALID_KEY = {'status': 'error', 'message': 'Idempotency-Key must be 1-%d characters' % MAX_KEY_LENGTH}
+fastjson.preencode(KEY_REUSED, INVALID_KEY)
+
+# _try_claim(): another request holds the key
+PENDING = object()
+
+
+class KeyConflict(Exception):
+    """The key is bound to a request with a different body."""
+
+
+def fingerprint(data):
+    return hashlib.sha256(json.dumps(data, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+
+def valid_key(key):
+    return 0 < len(key) <= MAX_KEY_LENGTH
+
+
+class IdempotencyCache:
+    def __init__(self, path=DB_PATH, ttl=TTL, max_entries=MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._running = {}
+        self._inserts = 0
+        self._schema_pid = None
+        self._executor = None
+
+    def _conn(self):
+        # One connection per thread (and per process: connections don't survive fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = connect(self.path)
+            # Losing the last few keys on power loss only re-enables a retry
+            conn.execute('PRAGMA synchronous=NORMAL')
+            if self._schema_pid != os.getpid():
+                conn.executescript(SCHEMA)
+                self._schema_pid = os.getpid()
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _execute(self, sql, args=()):
+        try:
+            return self._conn().execute(sql, args)
+        except sqlite3.OperationalError as exc:
+            raise StorageBusy(str(exc))
+
+    def claim(self, key, fp, timeout=WAIT_TIMEOUT):
+        """Return a stored (status, body), or None if the caller now owns the key."""
+        deadline = time.monotonic() + timeout
+        delay = 0.005
+        while True:
+            stored = self._try_claim(key, fp)
+            if stored is not PENDING:
+                return stored
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise StorageBusy('timed out waiting for request %r' % key)
+            with self._lock:
+                running = self._running.get(key)
+            if running is not None:
+                running.wait(remaining)
+            else:
+                time.sleep(min(delay, remaining))
+                delay = min(delay * 2, 0.1)
+
+    def _try_claim(self, key, fp):
+        """claim() without waiting: PENDING while another request holds the key."""
+        while True:
+            now = time.time()
+            inserted = self._execute(
+                'INSERT OR IGNORE INTO idempotency (key, fingerprint, created_at, used_at) '
+                'VALUES (?, ?, ?, ?)', (key, fp, now, now)).rowcount
+            if inserted:
+                with self._lock:
+                    self._running[key] = threading.Event()
+                self._maybe_evict()
+                return None
+            row = self._execute('SELECT fingerprint, status, body, created_at FROM idempotency '
+                                'WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                continue
+            stored_fp, status, body, created_at = row
+            if stored_fp != fp:
+                raise KeyConflict(key)
+            if status is not None:
+                if created_at + self.ttl > now:
+                    self._execute('UPDATE idempotency SET used_at = ? WHERE key = ?', (now, key))
+                    return status, fastjson.loads(body)
+                self._forget(key, created_at)
+                continue
+            if created_at + PENDING_TIMEOUT < now:
+                # The owner died mid-request; let this one run it
+                self._forget(key, created_at)
+                continue
+            return PENDING
+
+    def complete(self, key, status, body):
+        if status >= 500:
+            self.release(key)
+            return
+        self._execute('UPDATE idempotency SET status = ?, body = ?, used_at = ? WHERE key = ?',
+                      (status, fastjson.dumps(body).decode('utf-8'), time.time(), key))
+        self._wake(key)
+
+    def release(self, key):
+        """Give up ownership without storing a response (retries run again)."""
+        try:
+            self._execute('DELETE FROM idempotency WHERE key = ? AND status IS NULL', (key,))
+        finally:
+            self._wake(key)
+
+    def _forget(self, key, created_at):
+        self._execute('DELETE FROM idempotency WHERE key = ? AND created_at = ?', (key, created_at))
+
+    def _wake(self, key):
+        with self._lock:
+            running = self._running.pop(key, None)
+        if running is not None:
+            running.set()
+
+    def _maybe_evict(self):
+        with self._lock:
+            self._inserts += 1
+            if self._inserts % EVICT_EVERY:
+                return
+        self.evict()
+
+    def evict(self):
+        """Drop expired entries, then the least recently used beyond max_entries."""
+        now = time.time()
+        self._execute('DELETE FROM idempotency WHERE status IS NOT NULL AND created_at < ?', (now - self.ttl,))
+        self._execute('DELETE FROM idempotency WHERE key IN (SELECT key FROM idempotency '
+                      'WHERE status IS NOT NULL ORDER BY used_at DESC LIMIT -1 OFFSET ?)',
+                      (self.max_entries,))
+
+    def run(self, key, data, handler):
+        """Run handler() at most once per key; returns (status, body, replayed)."""
+        try:
+            stored = self.claim(key, fingerprint(data))
+        except KeyConflict:
+            return 422, KEY_REUSED, False
+        if stored is not None:
+            return stored[0], stored[1], True
+        try:
+            status, body = handler()
+        except BaseException:
+            self.release(key)
+            raise
+        self.complete(key, status, body)
+        return status, body, False
+
+    def _async_executor(self):
+        with self._lock:
+            if self._executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                self._executor = ThreadPoolExecutor(ASYNC_THREADS, thread_name_prefix='idempotency')
+            return self._executor
+
+    async def claim_async(self, key, fp, timeout=WAIT_TIMEOUT):
+        """claim() for the event loop: waits with asyncio.sleep, not on a thread."""
+        import asyncio  # only the ASGI app needs it (see services.AsyncServices)
+        loop = asyncio.get_running_loop()
+        deadline = time.monotonic() + timeout
+        delay = 0.005
+        while True:
+            stored = await loop.run_in_executor(self._async_executor(), self._try_claim, key, fp)
+            if stored is not PENDING:
+                return stored
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise StorageBusy('timed out waiting for request %r' % key)
+            await asyncio.sleep(min(delay, remaining))
+            delay = min(delay * 2, 0.1)
+
+    async def run_async(self, key, data, handler):
+        """Async flavour of run(); the SQLite calls go to a small pool of their own."""
+        import asyncio
+        loop = asyncio.get_running_loop()
+        try:
+            stored = await self.claim_async(key, fingerprint(data))
+        except KeyConflict:
+            return 422, KEY_REUSED, False
+        if stored is not None:
+            return stored[0], stored[1], True
+        try:
+            status, body = await handler()
+        except BaseException:
+            await loop.run_in_executor(self._async_executor(), self.release, key)
+            raise
+        await loop.run_in_executor(self._async_executor(), self.complete, key, status, body)
+        return status, body, False
@@ -0,0 +1,351 @@
+"""Outgoing email: a durable SQLite job queue and SMTP worker processes.
+
+Request handlers only enqueue (mail.enqueue(kind, recipient, context)),
+through the same group-commit writer as the other stores, so a job is on
+disk before the request returns and costs a share of one fsync. Worker
+processes (`flask mail-worker`) claim due jobs in batches under a lease,
+send them over one reused SMTP connection, and then delete sent jobs or
+reschedule failed ones with jittered exponential backoff. Permanent SMTP
+rejections (5xx) of a recipient or message and jobs out of attempts are
+kept as dead for inspection. Failing to connect, be greeted, log in or
+have the sender accepted (a 421 greeting, a 535 for bad credentials) says
+nothing about the jobs: the rest of the batch goes back to the queue
+without using up an attempt, and the worker backs off instead. A pooled
+connection the server dropped while idle is reopened once before the job
+counts as failed. A worker that dies mid-batch only delays its jobs until
+the lease expires.
+
+Queue depth, dead jobs and send counters are in stats(); `flask mail-stats`
+prints them along with throughput. bench/smtp_sink.py is a local SMTP sink.
+"""
+import json
+import logging
+import os
+import random
+import signal
+import smtplib
+import threading
+import time
+from email.message import EmailMessage
+
+from storage import VAR_DIR, GroupCommitWriter, SAVE_TIMEOUT, connect
+
+DB_PATH = os.environ.get('LEARNHUB_MAIL_DB', os.path.join(VAR_DIR, 'mail.db'))
+
+SMTP_HOST = os.environ.get('LEARNHUB_SMTP_HOST', 'localhost')
+SMTP_PORT = int(os.environ.get('LEARNHUB_SMTP_PORT', 1025))
+SMTP_USER = os.environ.get('LEARNHUB_SMTP_USER')
+SMTP_PASSWORD = os.environ.get('LEARNHUB_SMTP_PASSWORD')
+SMTP_STARTTLS = os.environ.get('LEARNHUB_SMTP_STARTTLS', '0') == '1'
+SMTP_TIMEOUT = 10.0
+# Close a pooled SMTP connection idle longer than this (servers drop them anyway)
+SMTP_IDLE = 30.0
+MAIL_FROM = os.environ.get('LEARNHUB_MAIL_FROM', 'LearnHub <hello@learnhub.example>')
+
+BATCH_SIZE = 50
+LEASE = 60.0
+POLL_INTERVAL = 0.5
+MAX_ATTEMPTS = 8
+BACKOFF_BASE = 30.0
+BACKOFF_CAP = 3600.0
+# How long a worker waits after the SMTP session failed, doubling per failure
+SESSION_BACKOFF_BASE = 1.0
+SESSION_BACKOFF_CAP = 60.0
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS mail_jobs (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    recipient TEXT NOT NULL,
+    context TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    run_at REAL NOT NULL,
+    leased_until REAL NOT NULL DEFAULT 0,
+    dead INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS mail_jobs_due ON mail_jobs (dead, run_at);
+CREATE TABLE IF NOT EXISTS mail_stats (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+'''
+
+TEMPLATES = {
+    'welcome': ('Welcome to LearnHub, {name}!',
+                'Hi {name},\n\nYour LearnHub account is ready. Start building your first '
+                'course at any time.\n\nThe LearnHub team\n'),
+    'newsletter': ("You're subscribed to the LearnHub newsletter",
+                   'Thanks for subscribing! You will hear from us about new courses and '
+                   'instructor tips.\n\nNot you? Reply to this email and we will remove you.\n'),
+}
+
+log = logging.getLogger(__name__)
+
+
+def render(kind, recipient, context):
+    subject, body = TEMPLATES[kind]
+    message = EmailMessage()
+    message['From'] = MAIL_FROM
+    message['To'] = recipient
+    message['Subject'] = subject.format(**context)
+    message.set_content(body.format(**context))
+    return message
+
+
+def backoff(attempts, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    """Seconds before retry number `attempts`: exponential, capped, jittered."""
+    return min(cap, base * 2 ** (attempts - 1)) * random.uniform(0.5, 1.0)
+
+
+class MailQueue(GroupCommitWriter):
+    thread_name = 'mail-queue'
+
+    def __init__(self, path=DB_PATH, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+
+    def enqueue(self, kind, recipient, context=None, timeout=SAVE_TIMEOUT):
+        """Queue one email; returns once the job is durable."""
+        self.submit(self._row(kind, recipient, context), timeout)
+
+    def enqueue_many(self, jobs, timeout=SAVE_TIMEOUT):
+        self.submit_many([self._row(*job) for job in jobs], timeout)
+
+    @staticmethod
+    def _row(kind, recipient, context=None):
+        if kind not in TEMPLATES:
+            raise ValueError('unknown mail kind %r' % kind)
+        now = time.time()
+        return kind, recipient, json.dumps(context or {}), now, now
+
+    def _open(self):
+        conn = connect(self.path)
+        conn.executescript(SCHEMA)
+        return conn
+
+    def _write_batch(self, conn, rows):
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany('INSERT INTO mail_jobs (kind, recipient, context, run_at, created_at) '
+                             'VALUES (?, ?, ?, ?, ?)', rows)
+
+    # Worker side: these run in the worker processes on their own connection
+
+    def claim(self, conn, limit=BATCH_SIZE, lease=LEASE):
+        """Lease up to limit due jobs; returns [(id, kind, recipient, context, attempts)]."""
+        now = time.time()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            return conn.execute(
+                'UPDATE mail_jobs SET leased_until = ?, attempts = attempts + 1 WHERE id IN ('
+                'SELECT id FROM mail_jobs WHERE dead = 0 AND run_at <= ? AND leased_until < ? '
+                'ORDER BY run_at LIMIT ?) '
+                'RETURNING id, kind, recipient, context, attempts', (now + lease, now, now, limit)).fetchall()
+
+    def finish(self, conn, sent, retry, dead, deferred=()):
+        """sent: [id]; retry and dead: [(id, attempts, error)]; deferred: [(id, error)].
+
+        Deferred jobs weren't tried (the session failed): they are due again
+        at once, and claim()'s attempt is given back.
+        """
+        now = time.time()
+        retry_rows, dead_rows = [], [(error, job_id) for job_id, _, error in dead]
+        for job_id, attempts, error in retry:
+            if attempts >= MAX_ATTEMPTS:
+                dead_rows.append((error, job_id))
+            else:
+                retry_rows.append((now + backoff(attempts), error, job_id))
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany('DELETE FROM mail_jobs WHERE id = ?', [(job_id,) for job_id in sent])
+            conn.executemany('UPDATE mail_jobs SET run_at = ?, leased_until = 0, last_error = ? '
+                             'WHERE id = ?', retry_rows)
+            conn.executemany('UPDATE mail_jobs SET dead = 1, leased_until = 0, last_error = ? '
+                             'WHERE id = ?', dead_rows)
+            conn.executemany('UPDATE mail_jobs SET attempts = attempts - 1, leased_until = 0, last_error = ? '
+                             'WHERE id = ?', [(error, job_id) for job_id, error in deferred])
+            conn.executemany('INSERT INTO mail_stats (name, value) VALUES (?, ?) '
+                             'ON CONFLICT (name) DO UPDATE SET value = value + excluded.value',
+                             [('sent', len(sent)), ('retried', len(retry_rows)), ('dead', len(dead_rows)),
+                              ('deferred', len(deferred))])
+
+    def stats(self):
+        conn = self._open()
+        try:
+            now = time.time()
+            row = conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(run_at <= ? AND leased_until < ?), 0), '
+                'COALESCE(SUM(leased_until >= ?), 0) FROM mail_jobs WHERE dead = 0',
+                (now, now, now)).fetchone()
+            stats = {'queued': row[0], 'due': row[1], 'in_flight': row[2],
+                     'dead': conn.execute('SELECT COUNT(*) FROM mail_jobs WHERE dead = 1').fetchone()[0]}
+            oldest = conn.execute('SELECT MIN(created_at) FROM mail_jobs WHERE dead = 0').fetchone()[0]
+            stats['oldest_age'] = round(now - oldest, 3) if oldest else 0.0
+            for name, value in conn.execute('SELECT name, value FROM mail_stats'):
+                stats['total_' + name] = value
+            return stats
+        finally:
+            conn.close()
+
+
+class MailWorker:
+    """Sends queued mail over one SMTP connection, reused across batches."""
+
+    def __init__(self, queue, host=SMTP_HOST, port=SMTP_PORT, batch_size=BATCH_SIZE):
+        self.queue = queue
+        self.host = host
+        self.port = port
+        self.batch_size = batch_size
+        self._smtp = None
+        self._last_used = 0.0
+        self.connections = 0
+
+    def _connection(self):
+        if self._smtp is not None and time.monotonic() - self._last_used > SMTP_IDLE:
+            self._close()
+        if self._smtp is None:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=SMTP_TIMEOUT)
+            try:
+                if SMTP_STARTTLS:
+                    smtp.starttls()
+                if SMTP_USER:
+                    smtp.login(SMTP_USER, SMTP_PASSWORD)
+            except BaseException:
+                smtp.close()
+                raise
+            self._smtp = smtp
+            self.connections += 1
+        self._last_used = time.monotonic()
+        return self._smtp
+
+    def _close(self):
+        try:
+            self._smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            self._smtp.close()
+        self._smtp = None
+
+    def _drop(self):
+        """Forget a connection the server closed or broke, without QUIT."""
+        if self._smtp is not None:
+            self._smtp.close()
+            self._smtp = None
+
+    def send_batch(self, jobs):
+        """Returns (sent, retry, dead, deferred), the arguments of MailQueue.finish()."""
+        sent, retry, dead, deferred = [], [], [], []
+        position = 0
+        reconnected = False
+        while position < len(jobs):
+            job_id, kind, recipient, context, attempts = jobs[position]
+            try:
+                smtp = self._connection()
+            except (smtplib.SMTPException, OSError) as exc:
+                # Can't connect, be greeted or log in: not these jobs' fault
+                deferred.extend((job[0], str(exc)) for job in jobs[position:])
+                break
+            try:
+                smtp.send_message(render(kind, recipient, json.loads(context)))
+            except smtplib.SMTPServerDisconnected as exc:
+                # Most likely a pooled connection the server dropped while idle
+                self._drop()
+                if not reconnected:
+                    reconnected = True
+                    continue
+                retry.append((job_id, attempts, str(exc)))
+            except smtplib.SMTPRecipientsRefused as exc:
+                # 5xx is a permanent rejection; 4xx (e.g. greylisting) is worth retrying
+                codes = [code for code, _ in exc.recipients.values()]
+                (dead if min(codes) >= 500 else retry).append((job_id, attempts, str(exc)))
+                if 421 in codes:
+                    self._drop()
+            except smtplib.SMTPSenderRefused as exc:
+                if exc.smtp_code == 421:
+                    # Service closing the channel, e.g. an idle timeout
+                    self._drop()
+                    if not reconnected:
+                        reconnected = True
+                        continue
+                # MAIL FROM refused (e.g. 530 authentication required) fails every job alike
+                deferred.extend((job[0], str(exc)) for job in jobs[position:])
+                break
+            except smtplib.SMTPResponseException as exc:
+                (dead if exc.smtp_code >= 500 else retry).append((job_id, attempts, str(exc)))
+                if exc.smtp_code == 421:
+                    # Service closing the channel
+                    self._drop()
+            except (smtplib.SMTPException, OSError) as exc:
+                # Connection trouble: drop it and retry the job later
+                retry.append((job_id, attempts, str(exc)))
+                self._drop()
+            else:
+                sent.append(job_id)
+            position += 1
+            reconnected = False
+        return sent, retry, dead, deferred
+
+    def run(self, stop=None, report_every=60.0):
+        conn = self.queue._open()
+        sent_total, window_start = 0, time.monotonic()
+        session_failures = 0
+        while stop is None or not stop.is_set():
+            jobs = self.queue.claim(conn, self.batch_size)
+            if not jobs:
+                if self._smtp is not None and time.monotonic() - self._last_used > SMTP_IDLE:
+                    self._close()
+                time.sleep(POLL_INTERVAL)
+                continue
+            sent, retry, dead, deferred = self.send_batch(jobs)
+            self.queue.finish(conn, sent, retry, dead, deferred)
+            sent_total += len(sent)
+            if deferred:
+                # The session failed: back off this worker, not the jobs
+                session_failures += 1
+                delay = backoff(session_failures, SESSION_BACKOFF_BASE, SESSION_BACKOFF_CAP)
+                log.warning('mail worker %d: SMTP session failed (%s); retrying in %.1fs',
+                            os.getpid(), deferred[0][1], delay)
+                if stop is None:
+                    time.sleep(delay)
+                else:
+                    stop.wait(delay)
+            else:
+                session_failures = 0
+            elapsed = time.monotonic() - window_start
+            if elapsed >= report_every:
+                log.info('mail worker %d: %.1f msg/s', os.getpid(), sent_total / elapsed)
+                sent_total, window_start = 0, time.monotonic()
+        if self._smtp is not None:
+            self._close()
+        conn.close()
+
+
+def run_workers(queue, processes=1, batch_size=BATCH_SIZE):
+    """Run MailWorkers in forked processes until SIGINT/SIGTERM."""
+    children = []
+    for _ in range(processes):
+        pid = os.fork()
+        if pid == 0:
+            stop = threading.Event()
+            signal.signal(signal.SIGTERM, lambda *_: stop.set())
+            signal.signal(signal.SIGINT, lambda *_: stop.set())
+            try:
+                MailWorker(queue, batch_size=batch_size).run(stop)
+            finally:
+                os._exit(0)
+        children.append(pid)
+    # Without this a SIGTERM to the parent would orphan the children
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        for pid in children:
+            os.waitpid(pid, 0)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
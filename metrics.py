@@ -0,0 +1,288 @@
+"""Per-route request metrics shared by every worker, in Prometheus format.
+
+Like the rate limiter's buckets, the counters live in an anonymous shared
+mmap created by init_app, i.e. in the gunicorn master (preload_app), so a
+scrape of /metrics on any worker sees every worker's traffic. Each worker
+process claims its own slab of the map on its first request and is the
+only process writing to it, so recording a request takes no
+cross-process lock; a scrape sums all slabs. A slab whose worker has
+exited (max_requests recycling, crashes) keeps its counts and is handed to
+the next new worker, so totals never go backwards.
+
+Per route (the URL rule, e.g. /api/courses/<slug>) a slab holds requests
+by status class, requests in flight, and latency and response-size
+histograms with fixed buckets. Latency is measured up to the response
+being returned (for streamed bodies: until the headers); a streamed
+response stays in flight until its body is sent and is left out of the
+size histogram. The hooks cost a few microseconds per request, about 1%
+of a cheap API call (bench/metrics_overhead.py).
+
+Each app has its own Registry, in app.extensions['learnhub.metrics'].
+LEARNHUB_METRICS=0 (the app's METRICS setting) switches collection off.
+"""
+import bisect
+import logging
+import multiprocessing
+import mmap
+import os
+import threading
+import time
+import weakref
+
+from flask import request
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+STATUS_CLASSES = ('1xx', '2xx', '3xx', '4xx', '5xx')
+MAX_ROUTES = 127
+SLABS = int(os.environ.get('LEARNHUB_METRICS_SLABS', 64))
+UNMATCHED = '<unmatched>'
+
+ENABLED = os.environ.get('LEARNHUB_METRICS', '1') != '0'
+
+# Offsets (in 8-byte words) of one route's cells within a slab
+IN_FLIGHT = 0
+STATUS = 1
+LATENCY = STATUS + len(STATUS_CLASSES)
+LATENCY_SUM = LATENCY + len(LATENCY_BUCKETS) + 1
+SIZE = LATENCY_SUM + 1
+SIZE_SUM = SIZE + len(SIZE_BUCKETS) + 1
+ROUTE_WORDS = SIZE_SUM + 1
+# Status // 100 -> its class's word; anything outside 1xx-5xx counts as 5xx
+STATUS_WORD = tuple(STATUS + (n - 1 if 1 <= n <= 5 else 4) for n in range(10))
+
+log = logging.getLogger(__name__)
+
+# Inherited by forked workers, never pickled: a fork-context lock has no
+# named semaphore left behind for the resource tracker
+_FORK = multiprocessing.get_context('fork')
+_registries = weakref.WeakSet()
+
+
+def _forget_slabs():
+    for registry in list(_registries):
+        registry._forget_slab()
+
+
+# One hook for every Registry; a hook per instance would keep each alive
+os.register_at_fork(after_in_child=_forget_slabs)
+
+
+class Registry:
+    """Fixed-layout counters in a shared map: a pid table, then one slab per worker."""
+
+    def __init__(self, slabs=SLABS, max_routes=MAX_ROUTES):
+        self.slabs = slabs
+        self.slab_words = (max_routes + 1) * ROUTE_WORDS
+        self.max_routes = max_routes
+        self._buf = mmap.mmap(-1, (slabs + slabs * self.slab_words) * 8)
+        # The same memory seen as int64 counters and as float64 sums
+        self._ints = memoryview(self._buf).cast('q')
+        self._floats = memoryview(self._buf).cast('d')
+        self._claim_lock = _FORK.Lock()
+        self.app = None
+        self._routes = None
+        self._route_names = None
+        self._pid = None
+        self._base = None
+        self._lock = threading.Lock()
+        # Saves an os.getpid() per request: a forked worker claims its own slab
+        _registries.add(self)
+
+    def _forget_slab(self):
+        self._pid = self._base = None
+        self._lock = threading.Lock()
+
+    def bind(self, routes):
+        """Fix the route -> index layout; must list routes in the same order in every worker."""
+        routes = sorted(set(routes))[:self.max_routes]
+        self._route_names = [UNMATCHED] + routes
+        self._routes = {route: index for index, route in enumerate(self._route_names)}
+
+    def _claim(self):
+        """Take a free slab (or one whose worker exited) for this process."""
+        pid = os.getpid()
+        if self._routes is None:
+            # First request anywhere: every route is registered by now
+            self.bind(rule.rule for rule in self.app.url_map.iter_rules())
+        ints = self._ints
+        with self._claim_lock:
+            if self._pid == pid:
+                # Another thread of this worker got here first
+                return self._base
+            for slab in range(self.slabs):
+                owner = ints[slab]
+                if owner == 0 or not _alive(owner):
+                    base = self.slabs + slab * self.slab_words
+                    # A dead worker's requests are no longer in flight
+                    for word in range(base + IN_FLIGHT, base + self.slab_words, ROUTE_WORDS):
+                        ints[word] = 0
+                    ints[slab] = pid
+                    self._pid = pid
+                    self._base = base
+                    return base
+        log.warning('no free metrics slab for worker %d (LEARNHUB_METRICS_SLABS=%d)', pid, self.slabs)
+        self._pid, self._base = pid, None
+        return None
+
+    def start(self, route):
+        """Count a request in flight; returns a token for finish()."""
+        base = self._base
+        if base is None:
+            if self._pid is not None:
+                return None
+            base = self._claim()
+            if base is None:
+                return None
+        offset = base + self._routes.get(route, 0) * ROUTE_WORDS
+        with self._lock:
+            self._ints[offset + IN_FLIGHT] += 1
+        return offset, time.perf_counter()
+
+    def finish(self, token, status, size=None, elapsed=None):
+        """Record the response and take the request out of flight.
+
+        status None only ends the request (no response was produced).
+        """
+        if token is None:
+            return
+        offset, started = token
+        if elapsed is None:
+            elapsed = time.perf_counter() - started
+        if status is not None:
+            # Find the cells before locking: a call made under the lock can hand
+            # the GIL to a thread that then waits on the lock a whole switch interval
+            status_word = offset + STATUS_WORD[status // 100 % 10]
+            latency_word = offset + LATENCY + bisect.bisect_left(LATENCY_BUCKETS, elapsed)
+            size_word = None if size is None else offset + SIZE + bisect.bisect_left(SIZE_BUCKETS, size)
+        ints, floats = self._ints, self._floats
+        with self._lock:
+            ints[offset + IN_FLIGHT] -= 1
+            if status is None:
+                return
+            ints[status_word] += 1
+            ints[latency_word] += 1
+            floats[offset + LATENCY_SUM] += elapsed
+            if size_word is not None:
+                ints[size_word] += 1
+                floats[offset + SIZE_SUM] += size
+
+    def collect(self):
+        """Sum every slab: {route: (in_flight, statuses, latency, latency_sum, sizes, size_sum)}."""
+        ints, floats = self._ints, self._floats
+        live = [slab for slab in range(self.slabs) if ints[slab]]
+        alive = {slab for slab in live if _alive(ints[slab])}
+        totals = {}
+        for index, route in enumerate(self._route_names or [UNMATCHED]):
+            in_flight, sums = 0, [0] * ROUTE_WORDS
+            for slab in live:
+                offset = self.slabs + slab * self.slab_words + index * ROUTE_WORDS
+                if slab in alive:
+                    in_flight += ints[offset + IN_FLIGHT]
+                for word in range(STATUS, ROUTE_WORDS):
+                    if word in (LATENCY_SUM, SIZE_SUM):
+                        sums[word] += floats[offset + word]
+                    else:
+                        sums[word] += ints[offset + word]
+            if in_flight or any(sums):
+                totals[route] = (in_flight, sums[STATUS:LATENCY], sums[LATENCY:LATENCY_SUM],
+                                 sums[LATENCY_SUM], sums[SIZE:SIZE_SUM], sums[SIZE_SUM])
+        return totals
+
+    def workers(self):
+        return sum(1 for slab in range(self.slabs) if self._ints[slab] and _alive(self._ints[slab]))
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _histogram(lines, name, route, counts, total, bounds):
+    cumulative = 0
+    for bound, count in zip(bounds + ('+Inf',), counts):
+        cumulative += count
+        lines.append('%s_bucket{route="%s",le="%s"} %d' % (name, route, bound, cumulative))
+    lines.append('%s_sum{route="%s"} %s' % (name, route, _number(total)))
+    lines.append('%s_count{route="%s"} %d' % (name, route, cumulative))
+
+
+def render(registry):
+    """The registry in Prometheus text exposition format (version 0.0.4)."""
+    totals = sorted(registry.collect().items())
+    lines = [
+        '# HELP learnhub_http_requests_total Requests answered, by route and status class.',
+        '# TYPE learnhub_http_requests_total counter',
+    ]
+    for route, (_, statuses, *_) in totals:
+        for status_class, count in zip(STATUS_CLASSES, statuses):
+            if count:
+                lines.append('learnhub_http_requests_total{route="%s",code="%s"} %d' % (
+                    _label(route), status_class, count))
+    lines += [
+        '# HELP learnhub_http_requests_in_flight Requests being handled right now.',
+        '# TYPE learnhub_http_requests_in_flight gauge',
+    ]
+    for route, (in_flight, *_) in totals:
+        lines.append('learnhub_http_requests_in_flight{route="%s"} %d' % (_label(route), in_flight))
+    lines += [
+        '# HELP learnhub_http_request_duration_seconds Time to produce the response.',
+        '# TYPE learnhub_http_request_duration_seconds histogram',
+    ]
+    for route, (_, _, latency, latency_sum, _, _) in totals:
+        if any(latency):
+            _histogram(lines, 'learnhub_http_request_duration_seconds', _label(route), latency,
+                       latency_sum, LATENCY_BUCKETS)
+    lines += [
+        '# HELP learnhub_http_response_size_bytes Response body size (streamed bodies excluded).',
+        '# TYPE learnhub_http_response_size_bytes histogram',
+    ]
+    for route, (_, _, _, _, sizes, size_sum) in totals:
+        if any(sizes):
+            _histogram(lines, 'learnhub_http_response_size_bytes', _label(route), sizes, size_sum,
+                       SIZE_BUCKETS)
+    lines += [
+        '# HELP learnhub_workers Worker processes that have recorded requests and are alive.',
+        '# TYPE learnhub_workers gauge',
+        'learnhub_workers %d' % registry.workers(),
+    ]
+    return '\n'.join(lines) + '\n'
+
+
+def init_app(app):
+    """Record every request of a Flask app; register before other before_request hooks."""
+    registry = app.extensions['learnhub.metrics'] = Registry()
+    registry.app = app
+
+    def start_timer():
+        current = request._get_current_object()
+        rule = current.url_rule
+        current.environ['learnhub.metrics'] = registry.start(rule.rule if rule is not None else UNMATCHED)
+
+    def record(response):
+        token = request._get_current_object().environ.get('learnhub.metrics')
+        if token is not None:
+            if response.is_streamed:
+                # Still in flight until the body has been sent
+                elapsed = time.perf_counter() - token[1]
+                response.call_on_close(lambda: registry.finish(token, response.status_code, None, elapsed))
+            else:
+                # A list of bytes; cheaper than parsing Content-Length back
+                registry.finish(token, response.status_code, sum(map(len, response.response)))
+        return response
+
+    app.before_request_funcs.setdefault(None, []).insert(0, start_timer)
+    app.after_request(record)
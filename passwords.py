@@ -0,0 +1,182 @@
+"""Password hashing with scrypt, run in a bounded process pool.
+
+scrypt is memory-hard and CPU-bound, so it runs outside the request worker:
+each worker process owns a small ProcessPoolExecutor and admits at most
+MAX_PENDING hashes at a time. Beyond that hash() raises HasherBusy straight
+away (the API answers 503) instead of queueing behind work that would blow
+the latency budget anyway. A hash keeps its place until its job is done,
+also when the caller stopped waiting for it. If a pool process dies (e.g.
+OOM-killed) the pool is replaced and the hashes it held fail with
+HasherBusy.
+
+Every gunicorn worker has its own pool, so by default the pools add up to
+about one process per core across WEB_CONCURRENCY workers (at least one per
+worker); each process holds 128 * N * r bytes (16 MB by default) while
+hashing.
+
+Cost parameters come from the environment; `flask kdf-calibrate` suggests
+a LEARNHUB_SCRYPT_N for a target latency on the current machine.
+"""
+import base64
+import hashlib
+import hmac
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import TimeoutError as FuturesTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+SCRYPT_N = int(os.environ.get('LEARNHUB_SCRYPT_N', 2 ** 14))
+SCRYPT_R = int(os.environ.get('LEARNHUB_SCRYPT_R', 8))
+SCRYPT_P = int(os.environ.get('LEARNHUB_SCRYPT_P', 1))
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+# Same default as gunicorn.conf.py
+WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY') or (os.cpu_count() or 1) * 2 + 1)
+# Per worker process
+POOL_SIZE = int(os.environ.get('LEARNHUB_KDF_WORKERS', max(1, (os.cpu_count() or 1) // WEB_CONCURRENCY)))
+MAX_PENDING = int(os.environ.get('LEARNHUB_KDF_MAX_PENDING', POOL_SIZE * 4))
+HASH_TIMEOUT = 10.0
+
+
+class HasherBusy(Exception):
+    """Too many hashes in flight; the caller should shed load (503)."""
+
+
+def _b64(data):
+    return base64.b64encode(data).decode('ascii').rstrip('=')
+
+
+def _unb64(text):
+    return base64.b64decode(text + '=' * (-len(text) % 4))
+
+
+def _scrypt(password, salt, n, r, p):
+    return hashlib.scrypt(password, salt=salt, n=n, r=r, p=p, dklen=KEY_BYTES,
+                          maxmem=256 * n * r + 1024 * 1024)
+
+
+def hash_password(password, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P):
+    """Hash synchronously; returns 'scrypt$n$r$p$salt$key'."""
+    salt = os.urandom(SALT_BYTES)
+    key = _scrypt(password.encode('utf-8'), salt, n, r, p)
+    return 'scrypt$%d$%d$%d$%s$%s' % (n, r, p, _b64(salt), _b64(key))
+
+
+def verify_password(password, encoded):
+    try:
+        scheme, n, r, p, salt, key = encoded.split('$')
+    except ValueError:
+        return False
+    if scheme != 'scrypt':
+        return False
+    actual = _scrypt(password.encode('utf-8'), _unb64(salt), int(n), int(r), int(p))
+    return hmac.compare_digest(actual, _unb64(key))
+
+
+def calibrate(target_ms, r=SCRYPT_R, p=SCRYPT_P, samples=3):
+    """Largest power-of-two N whose median hash time fits target_ms."""
+    best = None
+    n = 2 ** 10
+    while n <= 2 ** 20:
+        timings = []
+        for _ in range(samples):
+            start = time.perf_counter()
+            _scrypt(b'calibration', b'0' * SALT_BYTES, n, r, p)
+            timings.append((time.perf_counter() - start) * 1000)
+        median = sorted(timings)[samples // 2]
+        if median > target_ms:
+            break
+        best = (n, median)
+        n *= 2
+    return best
+
+
+class PasswordHasher:
+    def __init__(self, pool_size=POOL_SIZE, max_pending=MAX_PENDING):
+        self.pool_size = pool_size
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._pid = None
+        self._pool = None
+        self.pending = 0
+
+    def _ensure_pool(self):
+        # Pools don't survive fork: each (gunicorn) worker creates its own
+        if self._pid == os.getpid():
+            return self._pool
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pool = self._new_pool()
+                # The parent's hashes don't count here
+                self.pending = 0
+                self._pid = os.getpid()
+            return self._pool
+
+    def _new_pool(self):
+        # Imported on the first hash: it pulls in most of multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        # forkserver: never fork a multi-threaded request worker
+        return ProcessPoolExecutor(self.pool_size, mp_context=multiprocessing.get_context('forkserver'))
+
+    def _replace_pool(self, broken):
+        with self._lock:
+            # Only the first thread to notice replaces it
+            if self._pool is broken and self._pid == os.getpid():
+                self._pool = self._new_pool()
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _admit(self, count, batch=False):
+        with self._lock:
+            # An idle pool always takes a batch, however large
+            if self.pending + count > self.max_pending and (not batch or self.pending):
+                raise HasherBusy('password hashing is saturated')
+            self.pending += count
+
+    def _release(self, future=None):
+        with self._lock:
+            self.pending -= 1
+
+    def _submit(self, pool, passwords):
+        """One future per password; each gives its place back when its job ends."""
+        futures = []
+        try:
+            for password in passwords:
+                future = pool.submit(hash_password, password)
+                futures.append(future)
+                future.add_done_callback(self._release)
+        except BrokenProcessPool:
+            for _ in range(len(passwords) - len(futures)):
+                self._release()
+            for future in futures:
+                future.cancel()
+            self._replace_pool(pool)
+            raise HasherBusy('password hashing pool restarted')
+        return futures
+
+    def _results(self, pool, futures, timeout):
+        deadline = time.monotonic() + timeout
+        try:
+            return [future.result(max(0, deadline - time.monotonic())) for future in futures]
+        except FuturesTimeout:
+            # Queued hashes are dropped; running ones keep their place until they finish
+            for future in futures:
+                future.cancel()
+            raise HasherBusy('password hashing timed out')
+        except BrokenProcessPool:
+            self._replace_pool(pool)
+            raise HasherBusy('password hashing pool restarted')
+
+    def hash(self, password, timeout=HASH_TIMEOUT):
+        pool = self._ensure_pool()
+        self._admit(1)
+        return self._results(pool, self._submit(pool, [password]), timeout)[0]
+
+    def hash_many(self, passwords, timeout=HASH_TIMEOUT):
+        """Hash a batch in parallel across the pool; admitted all at once or not at all."""
+        passwords = list(passwords)
+        pool = self._ensure_pool()
+        self._admit(len(passwords), batch=True)
+        return self._results(pool, self._submit(pool, passwords), timeout)
@@ -0,0 +1,227 @@
+"""Client for the payment gateway: pooled connections, timeouts, retries and
+a circuit breaker.
+
+Each worker process keeps up to POOL_SIZE idle keep-alive connections to
+the gateway (http.client, TLS for https URLs), so a charge normally reuses
+an open connection instead of paying for a new TCP + TLS handshake. Every
+attempt has a connect/read timeout; failed attempts (network errors,
+timeouts, 429 and 5xx) are retried up to MAX_ATTEMPTS with full-jitter
+exponential backoff, all within CALL_DEADLINE. A 409 means the gateway is
+still processing an earlier attempt with the same key; it is retried too,
+for as long as the deadline allows, without using up an attempt. Every attempt of one charge
+carries the same Idempotency-Key, so a retry can't charge twice. When the
+client sent an Idempotency-Key, the gateway's key is derived from it
+(gateway_key()), so a client retry that runs the charge again -- after a
+503, or after the worker that ran it died -- is also recognised by the
+gateway as the same charge.
+
+After FAILURE_THRESHOLD consecutive failed charges the breaker opens and
+charges fail immediately with GatewayUnavailable (503) for RESET_TIMEOUT
+seconds; then one trial charge is let through and its outcome closes or
+re-opens the breaker. Declines (402, or a card_error from any 4xx) are
+answers, not failures; any other 4xx (a bad API key, a wrong URL) means
+the gateway can't be used and counts against the breaker.
+
+The gateway is configured with LEARNHUB_PAYMENT_URL; without it charges go
+to the stand-in service. bench/gateway.py is a local stand-in gateway with
+latency and failure injection.
+"""
+import hashlib
+import http.client
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from urllib.parse import urlsplit
+
+PAYMENT_URL = os.environ.get('LEARNHUB_PAYMENT_URL')
+POOL_SIZE = int(os.environ.get('LEARNHUB_PAYMENT_POOL_SIZE', 8))
+CONNECT_TIMEOUT = 1.0
+READ_TIMEOUT = float(os.environ.get('LEARNHUB_PAYMENT_TIMEOUT', 2.0))
+CALL_DEADLINE = 5.0
+MAX_ATTEMPTS = 3
+BACKOFF_BASE = 0.05
+BACKOFF_CAP = 1.0
+FAILURE_THRESHOLD = 5
+RESET_TIMEOUT = 30.0
+
+CHARGE_PATH = '/v1/charges'
+RETRYABLE_STATUSES = frozenset((429, 500, 502, 503, 504))
+DECLINE_STATUSES = frozenset((402,))
+IN_PROGRESS = 409
+CARD_ERROR = 'card_error'
+
+
+class PaymentError(Exception):
+    pass
+
+
+class PaymentDeclined(PaymentError):
+    """The gateway answered and refused the charge (402)."""
+
+
+class GatewayUnavailable(PaymentError):
+    """The gateway is failing or the breaker is open (503)."""
+
+
+def gateway_key(key, item=None):
+    """The gateway Idempotency-Key for a client's key (and item of a batch)."""
+    if item is not None:
+        key = '%s\n%d' % (key, item)
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half-open'
+
+    def __init__(self, threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                # Let exactly one trial call through
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class ConnectionPool:
+    """LIFO stack of idle keep-alive connections, per process."""
+
+    def __init__(self, url, size=POOL_SIZE, connect_timeout=CONNECT_TIMEOUT):
+        parts = urlsplit(url)
+        self.connection_class = (http.client.HTTPSConnection if parts.scheme == 'https'
+                                 else http.client.HTTPConnection)
+        self.host = parts.hostname
+        self.port = parts.port
+        self.base_path = parts.path.rstrip('/')
+        self.size = size
+        self.connect_timeout = connect_timeout
+        self._lock = threading.Lock()
+        self._idle = []
+        self._pid = os.getpid()
+        self.created = 0
+
+    def acquire(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                # Sockets inherited across fork belong to the parent
+                self._idle, self._pid = [], os.getpid()
+            if self._idle:
+                return self._idle.pop()
+            self.created += 1
+        return self.connection_class(self.host, self.port, timeout=self.connect_timeout)
+
+    def release(self, conn):
+        with self._lock:
+            if self._pid == os.getpid() and len(self._idle) < self.size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+
+class PaymentGateway:
+    def __init__(self, url, pool_size=POOL_SIZE, read_timeout=READ_TIMEOUT, deadline=CALL_DEADLINE,
+                 max_attempts=MAX_ATTEMPTS, breaker=None):
+        self.pool = ConnectionPool(url, pool_size)
+        self.read_timeout = read_timeout
+        self.deadline = deadline
+        self.max_attempts = max_attempts
+        self.breaker = breaker or CircuitBreaker()
+
+    def _attempt(self, body, headers, timeout):
+        """One request; returns (status, decoded body). Raises OSError/HTTPException."""
+        conn = self.pool.acquire()
+        try:
+            if conn.sock is None:
+                conn.connect()
+            conn.sock.settimeout(timeout)
+            conn.request('POST', self.pool.base_path + CHARGE_PATH, body, headers)
+            response = conn.getresponse()
+            payload = response.read()
+        except BaseException:
+            conn.close()
+            raise
+        if response.will_close:
+            conn.close()
+        else:
+            self.pool.release(conn)
+        try:
+            return response.status, json.loads(payload or b'{}')
+        except ValueError:
+            return response.status, {}
+
+    def charge(self, payment, key=None):
+        """Charge payment (plan, payment_method); returns the gateway's receipt.
+
+        key is the gateway Idempotency-Key; a random one is used without it.
+        """
+        if not self.breaker.allow():
+            raise GatewayUnavailable('payment gateway circuit is open')
+        body = json.dumps(payment).encode('utf-8')
+        headers = {'Content-Type': 'application/json', 'Idempotency-Key': key or uuid.uuid4().hex}
+        deadline = time.monotonic() + self.deadline
+        error = None
+        attempts = tries = 0
+        while attempts < self.max_attempts:
+            if tries:
+                # Full jitter: sleep uniformly in [0, min(cap, base * 2**tries)]
+                delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** tries))
+                if time.monotonic() + delay >= deadline:
+                    break
+                time.sleep(delay)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            tries += 1
+            try:
+                status, receipt = self._attempt(body, headers, min(self.read_timeout, remaining))
+            except (OSError, http.client.HTTPException) as exc:
+                error = exc
+                attempts += 1
+                continue
+            if status == IN_PROGRESS:
+                # An earlier attempt with this key is still running; a new key
+                # would charge twice, so wait for it
+                error = 'gateway answered %d' % status
+                continue
+            if status in RETRYABLE_STATUSES:
+                error = 'gateway answered %d' % status
+                attempts += 1
+                continue
+            if status in DECLINE_STATUSES or (status >= 400 and receipt.get('type') == CARD_ERROR):
+                self.breaker.record_success()
+                raise PaymentDeclined(receipt.get('message') or 'payment declined (%d)' % status)
+            if status >= 400:
+                error = 'gateway refused the request (%d)' % status
+                break
+            self.breaker.record_success()
+            return receipt
+        self.breaker.record_failure()
+        raise GatewayUnavailable('payment gateway failed: %s' % (error or 'deadline exceeded'))
+
+
+def from_env():
+    return PaymentGateway(PAYMENT_URL) if PAYMENT_URL else None
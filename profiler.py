@@ -0,0 +1,166 @@
+"""On-demand sampling profiler for a live worker, in collapsed-stack format.
+
+GET /debug/profile?seconds=N takes a snapshot of every thread's stack
+(sys._current_frames()) each interval_ms (default 10) for N seconds and
+answers with one line per distinct stack, root first, and the number of
+samples it was seen in:
+
+    /api/courses/<slug>;Flask.wsgi_app (flask/app.py:1425);... 42
+
+flamegraph.pl, inferno or speedscope turn that into a flame graph. By
+default only threads serving a Flask request are sampled, each stack
+rooted at the request's URL rule (the route labels of /metrics, or
+<routing> before the URL is matched);
+?route=/api/courses/<slug> keeps a single route and ?all_threads=1 adds
+every other thread (the ASGI event loop, the pools) under its thread name.
+
+Nothing is installed until a profile is asked for: no hooks, no
+sys.setprofile, no signal timers, so leaving it in costs requests nothing.
+While a profile runs the sampler holds the GIL for under 1% of the time
+(the X-Profile-Overhead header) and the interpreter's thread switch
+interval is lowered to 0.2 ms, so that snapshots land inside request code
+rather than at the next socket call. A profile covers the worker that
+answered the request only, and a worker runs one profile at a time.
+Single-threaded workers (gunicorn's sync class, GUNICORN_THREADS=1)
+answer 409: the profile request would hold the only thread, and the
+arbiter kills a sync worker whose request outlasts its timeout. gthread
+and uvicorn workers report to the arbiter from their own loop, so a
+profile may run longer than that timeout there.
+
+The endpoint is off (404) unless LEARNHUB_PROFILE_TOKEN is set; requests
+then need "Authorization: Bearer <token>".
+"""
+import hmac
+import os
+import sys
+import threading
+import time
+
+from flask import Flask
+
+from metrics import UNMATCHED
+
+TOKEN = os.environ.get('LEARNHUB_PROFILE_TOKEN') or None
+MAX_SECONDS = int(os.environ.get('LEARNHUB_PROFILE_MAX_SECONDS', 60))
+SWITCH_INTERVAL = 0.0002
+# Root of samples taken before the URL was matched
+ROUTING = '<routing>'
+
+_WSGI_APP = Flask.wsgi_app.__code__
+_running = threading.Lock()
+
+
+class ProfilerBusy(Exception):
+    """A profile is already running in this worker (409)."""
+
+
+def authorized(header):
+    """Whether an Authorization header carries the profiling token."""
+    if TOKEN is None or not header:
+        return False
+    scheme, _, credentials = header.partition(' ')
+    return scheme.lower() == 'bearer' and hmac.compare_digest(credentials.strip().encode('utf-8'),
+                                                              TOKEN.encode('utf-8'))
+
+
+def _request_route(frame):
+    # wsgi_app's request context; routing sets url_rule or routing_exception
+    request = getattr(frame.f_locals.get('ctx'), 'request', None)
+    if request is None:
+        return ROUTING
+    if request.url_rule is not None:
+        return request.url_rule.rule
+    return UNMATCHED if request.routing_exception is not None else ROUTING
+
+
+def _short_path(filename, prefixes):
+    for prefix in prefixes:
+        if filename.startswith(prefix):
+            return filename[len(prefix):]
+    return filename
+
+
+class Profile:
+    def __init__(self, stacks, samples, elapsed, busy):
+        # (root, code objects from the outermost frame in) -> samples
+        self.stacks = stacks
+        self.samples = samples
+        self.elapsed = elapsed
+        self.busy = busy
+
+    def collapsed(self):
+        """One "root;frame;...;frame count" line per stack, most sampled first."""
+        # Longest first, so /srv/app/venv/lib/... is cut at site-packages
+        prefixes = sorted((os.path.join(path, '') for path in sys.path if path), key=len, reverse=True)
+        labels = {}
+        lines = []
+        for (root, codes), count in sorted(self.stacks.items(), key=lambda item: -item[1]):
+            names = [root]
+            for code in codes:
+                label = labels.get(code)
+                if label is None:
+                    label = labels[code] = '%s (%s:%d)' % (
+                        code.co_qualname, _short_path(code.co_filename, prefixes), code.co_firstlineno)
+                names.append(label)
+            lines.append('%s %d' % (';'.join(names), count))
+        return '\n'.join(lines) + '\n' if lines else ''
+
+
+def sample(seconds, interval, route=None, all_threads=False):
+    """Sample the other threads of this process for `seconds`; returns a Profile."""
+    if not _running.acquire(blocking=False):
+        raise ProfilerBusy('a profile is already running in this worker')
+    # The sampler only runs once the thread holding the GIL lets go of it.
+    # By default that happens after 5 ms of Python code, so a sub-ms request
+    # is usually caught at its next socket call instead; a short interval
+    # while profiling samples request threads where they actually are.
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(min(switch_interval, SWITCH_INTERVAL))
+    try:
+        me = threading.get_ident()
+        thread_names = {}
+        stacks = {}
+        samples, busy = 0, 0.0
+        started = next_at = time.perf_counter()
+        deadline = started + seconds
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                codes = []
+                root = None
+                while frame is not None:
+                    codes.append(frame.f_code)
+                    if frame.f_code is _WSGI_APP:
+                        # Everything below is the server's plumbing
+                        root = _request_route(frame)
+                        break
+                    frame = frame.f_back
+                if root is None:
+                    if not all_threads or route is not None:
+                        continue
+                    root = thread_names.get(ident)
+                    if root is None:
+                        thread_names.update((thread.ident, thread.name) for thread in threading.enumerate())
+                        root = thread_names.setdefault(ident, 'thread-%d' % ident)
+                elif route is not None and root != route:
+                    continue
+                codes.reverse()
+                key = root, tuple(codes)
+                stacks[key] = stacks.get(key, 0) + 1
+            samples += 1
+            busy += time.perf_counter() - now
+            next_at += interval
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # Fell behind (GIL contention); don't burst to catch up
+                next_at = time.perf_counter()
+        return Profile(stacks, samples, time.perf_counter() - started, busy)
+    finally:
+        sys.setswitchinterval(switch_interval)
+        _running.release()
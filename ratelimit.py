@@ -0,0 +1,140 @@
+"""Per-client, per-route token buckets shared by every worker process.
+
+The buckets live in an anonymous shared mmap created with the app
+(create_app), i.e. in the gunicorn master (preload_app), so every forked
+worker reads and writes the same table without Redis. The table is set-associative: a (route, client)
+pair hashes to one group of WAYS slots, which is all a lookup ever scans,
+and each group is guarded by one of LOCK_STRIPES process-shared locks.
+
+Slot layout (<Qddd, 32 bytes): key, tokens, last update, full-at. A bucket
+whose full-at has passed is indistinguishable from a fresh one, so its slot
+is free for reuse; when a group has no such slot the least recently
+updated bucket is evicted. 64k slots take 2 MB.
+
+Limits are "count/seconds" per route (burst = count) and can be overridden
+with the app's RATE_LIMITS (LEARNHUB_RATE_LIMITS), e.g.
+"/api/signup=100/60,/api/bulk/signup=off", or switched off entirely with
+"off".
+"""
+import hashlib
+import math
+import mmap
+import multiprocessing
+import struct
+import time
+
+import fastjson
+
+SLOT = struct.Struct('<Qddd')
+WAYS = 8
+SLOTS = 1 << 16
+LOCK_STRIPES = 64
+# Inherited by forked workers, never pickled: a fork-context lock has no
+# named semaphore left behind for the resource tracker
+_FORK = multiprocessing.get_context('fork')
+
+DEFAULT_LIMITS = {
+    '/api/signup': '10/60',
+    '/api/subscribe': '10/60',
+    '/api/newsletter': '20/60',
+    '/api/newsletter/unsubscribe': '20/60',
+    '/api/bulk/signup': '5/60',
+    '/api/bulk/newsletter': '5/60',
+    # Each batched operation also counts against its own route's bucket
+    '/api/batch': '10/60',
+}
+
+THROTTLED = {'status': 'error', 'message': 'Too many requests, please slow down'}
+fastjson.preencode(THROTTLED)
+
+
+class Limit:
+    __slots__ = ('burst', 'rate')
+
+    def __init__(self, count, seconds):
+        self.burst = float(count)
+        self.rate = count / seconds
+
+    @classmethod
+    def parse(cls, spec):
+        count, _, seconds = spec.partition('/')
+        return cls(int(count), float(seconds or 1))
+
+
+def parse_limits(spec, defaults=DEFAULT_LIMITS):
+    """Merge "route=count/seconds" overrides into the defaults; "off" drops a route."""
+    limits = dict(defaults)
+    if spec.strip() == 'off':
+        return {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        route, _, value = item.partition('=')
+        if value.strip() == 'off':
+            limits.pop(route.strip(), None)
+        else:
+            limits[route.strip()] = value.strip()
+    return {route: Limit.parse(value) for route, value in limits.items()}
+
+
+def bucket_key(route, client):
+    digest = hashlib.blake2b(('%s\0%s' % (route, client)).encode('utf-8'), digest_size=8).digest()
+    # 0 marks an empty slot
+    return int.from_bytes(digest, 'little') or 1
+
+
+class RateLimiter:
+    def __init__(self, limits, slots=SLOTS, stripes=LOCK_STRIPES):
+        self.limits = limits
+        self.groups = max(1, slots // WAYS)
+        if not limits:
+            # Switched off (RATE_LIMITS=off): acquire() never gets to the table
+            self._buf, self._locks = None, []
+            return
+        self._buf = mmap.mmap(-1, self.groups * WAYS * SLOT.size)
+        self._locks = [_FORK.Lock() for _ in range(stripes)]
+
+    def acquire(self, route, client, cost=1.0):
+        """Take cost tokens; returns 0 if allowed, else seconds until it would be."""
+        limit = self.limits.get(route)
+        if limit is None:
+            return 0.0
+        key = bucket_key(route, client)
+        group = key % self.groups
+        base = group * WAYS * SLOT.size
+        buf = self._buf
+        now = time.monotonic()
+        with self._locks[group % len(self._locks)]:
+            found = free = None
+            oldest, oldest_at = base, math.inf
+            for offset in range(base, base + WAYS * SLOT.size, SLOT.size):
+                slot_key, tokens, updated, full_at = SLOT.unpack_from(buf, offset)
+                if slot_key == key:
+                    found = offset
+                    break
+                if free is None and (slot_key == 0 or full_at <= now):
+                    free = offset
+                elif updated < oldest_at:
+                    oldest, oldest_at = offset, updated
+            if found is not None:
+                tokens = min(limit.burst, tokens + (now - updated) * limit.rate)
+            else:
+                found = free if free is not None else oldest
+                tokens = limit.burst
+            if tokens < cost:
+                SLOT.pack_into(buf, found, key, tokens, now, now + (limit.burst - tokens) / limit.rate)
+                return (cost - tokens) / limit.rate
+            tokens -= cost
+            SLOT.pack_into(buf, found, key, tokens, now, now + (limit.burst - tokens) / limit.rate)
+            return 0.0
+
+    def retry_after(self, route, client):
+        """Whole seconds for a Retry-After header, or None if the request may proceed."""
+        wait = self.acquire(route, client)
+        return max(1, math.ceil(wait)) if wait else None
+
+
+def admitter(limiter, client):
+    """admit(route) for batched operations: None, or a 429 (status, body)."""
+    def admit(route):
+        retry_after = limiter.retry_after(route, client)
+        return None if retry_after is None else (429, dict(THROTTLED, retry_after=retry_after))
+    return admit
@@ -0,0 +1,147 @@
+"""Declarative request schemas for the JSON API, compiled into validators.
+
+A Schema is built once at import from field declarations; each field is
+reduced to a (name, required, check) tuple whose check is a closure over
+its precomputed limits, so validating a request is one pass over a short
+tuple with no per-call introspection (bench/validation.py: 1-2.5 us for a
+valid body, under 1% of a request). Calling a schema returns (clean data,
+None) or (None, error body); clean data holds only declared fields.
+
+Bodies are capped before they are read: MAX_BODY_SIZE bytes for the JSON
+routes (LEARNHUB_MAX_JSON_BODY) and 16 times that for /api/batch, checked
+against Content-Length first.
+"""
+import os
+import re
+
+import fastjson
+
+MAX_BODY_SIZE = int(os.environ.get('LEARNHUB_MAX_JSON_BODY', 16 * 1024))
+MAX_BATCH_OPERATIONS = 100
+MAX_BATCH_BODY_SIZE = MAX_BODY_SIZE * 16
+
+EMAIL_PATTERN = re.compile(r'[^@\s]+@[^@\s]+\.[^@\s.]+')
+EXPERTISE = ('development', 'design', 'business', 'photography', 'music', 'other')
+PLANS = ('Starter', 'Professional', 'Business')
+PAYMENT_METHODS = ('credit', 'paypal')
+
+NOT_AN_OBJECT = {'status': 'error', 'message': 'Expected a JSON object'}
+INVALID_JSON = {'status': 'error', 'message': 'Invalid JSON body'}
+NOT_JSON = {'status': 'error', 'message': 'Expected application/json'}
+fastjson.preencode(NOT_AN_OBJECT, INVALID_JSON, NOT_JSON)
+
+
+def too_large(limit):
+    return {'status': 'error', 'message': 'Request body too large',
+            'errors': {'body': 'must be at most %d bytes' % limit}}
+
+
+class Field:
+    def __init__(self, required=True):
+        self.required = required
+
+    def compile(self):
+        """Return check(value) -> error message or None."""
+        raise NotImplementedError
+
+
+class Text(Field):
+    def __init__(self, min_length=1, max_length=200, **kwargs):
+        super().__init__(**kwargs)
+        self.min_length = min_length
+        self.max_length = max_length
+
+    def compile(self):
+        low, high = self.min_length, self.max_length
+        message = 'must be a string of %d-%d characters' % (low, high)
+
+        def check(value):
+            if type(value) is not str or not low <= len(value) <= high:
+                return message
+            return None
+        return check
+
+
+class Email(Field):
+    MAX_LENGTH = 254
+
+    def compile(self):
+        match, high = EMAIL_PATTERN.fullmatch, self.MAX_LENGTH
+
+        def check(value):
+            if type(value) is not str or len(value) > high or match(value) is None:
+                return 'must be a valid email address'
+            return None
+        return check
+
+
+class Choice(Field):
+    def __init__(self, choices, **kwargs):
+        super().__init__(**kwargs)
+        self.choices = tuple(choices)
+
+    def compile(self):
+        allowed = frozenset(self.choices)
+        message = 'must be one of: %s' % ', '.join(self.choices)
+
+        def check(value):
+            if type(value) is not str or value not in allowed:
+                return message
+            return None
+        return check
+
+
+class Schema:
+    def __init__(self, **fields):
+        self.fields = fields
+        self._compiled = tuple((name, field.required, field.compile()) for name, field in fields.items())
+
+    def __call__(self, data):
+        if type(data) is not dict:
+            return None, NOT_AN_OBJECT
+        clean, errors = {}, None
+        for name, required, check in self._compiled:
+            value = data.get(name)
+            if value is None or value == '':
+                if required:
+                    errors = errors or {}
+                    errors[name] = 'is required'
+                continue
+            problem = check(value)
+            if problem is None:
+                clean[name] = value
+            else:
+                errors = errors or {}
+                errors[name] = problem
+        if errors:
+            return None, error_body(errors)
+        return clean, None
+
+
+def error_body(errors):
+    message = 'Invalid request: %s' % '; '.join('%s %s' % item for item in errors.items())
+    return {'status': 'error', 'message': message, 'errors': errors}
+
+
+SIGNUP = Schema(
+    name=Text(max_length=100),
+    email=Email(),
+    password=Text(min_length=8, max_length=128),
+    expertise=Choice(EXPERTISE, required=False),
+)
+
+# Bulk-imported accounts have no password yet
+BULK_SIGNUP = Schema(
+    name=Text(max_length=100),
+    email=Email(),
+    expertise=Choice(EXPERTISE, required=False),
+)
+
+SUBSCRIBE = Schema(
+    plan=Choice(PLANS),
+    payment_method=Choice(PAYMENT_METHODS),
+)
+
+NEWSLETTER = Schema(
+    email=Email(),
+)
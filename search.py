@@ -0,0 +1,256 @@
+"""In-memory inverted index over the course catalog with BM25 ranking.
+
+Queries don't score every posting of their terms. Each term's postings are
+also kept ordered by their BM25 contribution (built on the term's first
+query after an index change), so a one-term query is a slice, and a query
+with several terms walks the lists best-first (Fagin's threshold algorithm)
+and stops once nothing further down can reach the results ranked so far.
+That ranking is exactly that of scoring everything. Terms that score most
+of the catalog almost alike (category words, "learn") would walk nearly all
+their postings, so a query scores MAX_SCORED courses at most and then keeps
+the best of those, whose scores are within a few percent of the exact
+ones (bench/search.py --check compares both). Matches are always counted
+exactly, by OR-ing per-term bitmasks.
+"""
+import heapq
+import math
+import re
+import threading
+from array import array
+from collections import Counter, OrderedDict
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+# Field weights are applied as term-frequency multipliers (BM25F-lite)
+FIELD_WEIGHTS = {
+    'title': 3,
+    'category': 2,
+    'instructor': 2,
+    'learn': 1,
+    'description': 1,
+}
+
+K1 = 1.2
+B = 0.75
+
+# Scored result lists kept per normalised query; dropped whenever the index changes
+RESULT_CACHE_SIZE = 1024
+# Results ranked per query up front, so paging through them stays cached
+RANK_DEPTH = 200
+# Postings taken from a list between checks of the stopping condition
+STEP = 16
+# Courses scored per multi-term query at most (or twice its depth): terms that
+# score most of the catalog alike could otherwise walk all of their postings
+MAX_SCORED = 2000
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+def course_terms(course):
+    terms = Counter()
+    for field, weight in FIELD_WEIGHTS.items():
+        value = course.get(field) or ''
+        if isinstance(value, (list, tuple)):
+            value = ' '.join(value)
+        for token in tokenize(value):
+            terms[token] += weight
+    return terms
+
+
+class SearchIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # term -> {slug: weighted term frequency}
+        self._postings = {}
+        # slug -> (document length, terms) so updates can undo old postings
+        self._docs = {}
+        self._lengths = {}
+        self._total_length = 0
+        # slug -> bit in the doc masks that count matches; kept across removals
+        self._ids = {}
+        self._results = OrderedDict()
+        # term -> TermImpacts, 16 bytes per posting; dropped whenever the index changes
+        self._terms = {}
+
+    def __len__(self):
+        return len(self._docs)
+
+    def add(self, course):
+        slug = course['slug']
+        terms = course_terms(course)
+        length = sum(terms.values())
+        with self._lock:
+            self._remove_locked(slug)
+            for term, tf in terms.items():
+                self._postings.setdefault(term, {})[slug] = tf
+            self._docs[slug] = (length, terms)
+            self._lengths[slug] = length
+            self._ids.setdefault(slug, len(self._ids))
+            self._total_length += length
+            self._results.clear()
+            self._terms.clear()
+
+    def remove(self, slug):
+        with self._lock:
+            self._remove_locked(slug)
+
+    def _remove_locked(self, slug):
+        doc = self._docs.pop(slug, None)
+        if doc is None:
+            return
+        length, terms = doc
+        del self._lengths[slug]
+        self._total_length -= length
+        self._results.clear()
+        self._terms.clear()
+        for term in terms:
+            posting = self._postings.get(term)
+            if posting is not None:
+                posting.pop(slug, None)
+                if not posting:
+                    del self._postings[term]
+
+    def on_catalog_change(self, event, course):
+        if event == 'remove':
+            self.remove(course['slug'])
+        else:
+            self.add(course)
+
+    def search(self, query, offset=0, limit=20):
+        """Return ([(slug, score), ...], total_matches) for one result page."""
+        key = ' '.join(sorted(set(tokenize(query))))
+        if not key:
+            return [], 0
+        with self._lock:
+            ranked = self._results.get(key)
+            if ranked is not None and len(ranked) >= min(offset + limit, ranked.total):
+                self._results.move_to_end(key)
+            else:
+                ranked = self._rank_locked(key.split(), offset + limit)
+                self._results[key] = ranked
+                if len(self._results) > RESULT_CACHE_SIZE:
+                    self._results.popitem(last=False)
+        return ranked[offset:offset + limit], ranked.total
+
+    def _term_locked(self, term, n, avg_length):
+        impacts = self._terms.get(term)
+        if impacts is not None:
+            return impacts
+        posting = self._postings.get(term)
+        if not posting:
+            return None
+        df = len(posting)
+        idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+        lengths = self._lengths
+        scores = {}
+        for slug, tf in posting.items():
+            norm = K1 * (1 - B + B * lengths[slug] / avg_length)
+            scores[slug] = idf * tf * (K1 + 1) / (tf + norm)
+        # Equal scores stay in posting order; _rank_locked settles ties at its cut
+        slugs = sorted(scores, key=scores.__getitem__, reverse=True)
+        impacts = self._terms[term] = TermImpacts(posting, idf, slugs, array('d', map(scores.__getitem__, slugs)))
+        # A mask is kept where it takes no more than 8 bytes per posting
+        if len(self._ids) <= 64 * df:
+            impacts.mask = self._mask_locked(posting)
+        return impacts
+
+    def _mask_locked(self, slugs):
+        """The courses as the bits of an int, for counting multi-term matches."""
+        ids = self._ids
+        bits = bytearray(len(ids) // 8 + 1)
+        for slug in slugs:
+            i = ids[slug]
+            bits[i >> 3] |= 1 << (i & 7)
+        return int.from_bytes(bits, 'little')
+
+    def _rank_locked(self, terms, depth):
+        n = len(self._docs)
+        if not n:
+            return RankedResults([], 0)
+        avg_length = self._total_length / n
+        depth = max(depth, RANK_DEPTH)
+        lists = [impacts for impacts in (self._term_locked(term, n, avg_length) for term in terms)
+                 if impacts is not None]
+        if not lists:
+            return RankedResults([], 0)
+        if len(lists) == 1:
+            impacts = lists[0]
+            scores = impacts.scores
+            cut = min(depth, len(scores))
+            # Courses tied with the last one kept compete on slug, as in a full sort
+            while cut < len(scores) and scores[cut] == scores[depth - 1]:
+                cut += 1
+            top = sorted(zip(impacts.slugs[:cut], scores[:cut]), key=lambda item: (item[1], item[0]), reverse=True)
+            return RankedResults(top[:depth], len(scores))
+
+        lengths = self._lengths
+        budget = max(MAX_SCORED, 2 * depth)
+        # Min-heap of the best (score, slug) so far; same order as sorting every match
+        top = []
+        seen = set()
+        positions = [0] * len(lists)
+        # Each list's next contribution: no unseen course can score more than their sum
+        frontier = [impacts.scores[0] for impacts in lists]
+        exact = True
+        while True:
+            bound = sum(frontier)
+            if len(top) == depth and top[0][0] > bound:
+                break
+            if len(seen) >= budget:
+                exact = False
+                break
+            # Take from the list with the most to give
+            i = max(range(len(lists)), key=frontier.__getitem__)
+            if not frontier[i]:
+                break
+            impacts = lists[i]
+            start = positions[i]
+            end = positions[i] = min(start + STEP, len(impacts.slugs))
+            frontier[i] = impacts.scores[end] if end < len(impacts.slugs) else 0.0
+            for slug in impacts.slugs[start:end]:
+                if slug in seen:
+                    continue
+                seen.add(slug)
+                norm = K1 * (1 - B + B * lengths[slug] / avg_length)
+                score = 0.0
+                for other in lists:
+                    tf = other.posting.get(slug)
+                    if tf:
+                        score += other.idf * tf * (K1 + 1) / (tf + norm)
+                if len(top) < depth:
+                    heapq.heappush(top, (score, slug))
+                elif (score, slug) > top[0]:
+                    heapq.heapreplace(top, (score, slug))
+        top.sort(reverse=True)
+        matches = 0
+        for impacts in lists:
+            matches |= impacts.mask if impacts.mask is not None else self._mask_locked(impacts.posting)
+        return RankedResults([(slug, score) for score, slug in top], matches.bit_count(), exact)
+
+
+class TermImpacts:
+    """A term's postings ordered by BM25 contribution, best first."""
+
+    def __init__(self, posting, idf, slugs, scores):
+        self.posting = posting
+        self.idf = idf
+        self.slugs = slugs
+        self.scores = scores
+        self.mask = None
+
+
+class RankedResults(list):
+    def __init__(self, items, total, exact=True):
+        super().__init__(items)
+        self.total = total
+        # False when MAX_SCORED cut the ranking short
+        self.exact = exact
+
+
+def build_index(courses):
+    index = SearchIndex()
+    for course in courses:
+        index.add(course)
+    return index
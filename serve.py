@@ -0,0 +1,59 @@
+"""Production entry point: run the app under gunicorn with gunicorn.conf.py.
+
+With --asgi the ASGI variant (asgi.py) is served by uvicorn workers instead.
+"""
+import argparse
+import os
+
+from gunicorn.app.base import Application
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gunicorn.conf.py')
+
+
+ASGI_WORKER_CLASS = 'uvicorn.workers.UvicornWorker'
+
+
+class LearnHubApplication(Application):
+    def __init__(self, overrides=None, asgi=False):
+        self.overrides = overrides or {}
+        self.asgi = asgi
+        super().__init__()
+
+    def load_config(self):
+        self.load_config_from_file(CONFIG_FILE)
+        for key, value in self.overrides.items():
+            if value is not None:
+                self.cfg.set(key, value)
+
+    def load(self):
+        if self.asgi:
+            from asgi import application
+            return application
+        from app import app
+        return app
+
+
+def run(bind=None, workers=None, threads=None, asgi=False):
+    if workers is not None:
+        # Read at import by modules that size per-worker resources (passwords)
+        os.environ['WEB_CONCURRENCY'] = str(workers)
+    overrides = {'bind': [bind] if bind else None, 'workers': workers, 'threads': threads}
+    if asgi:
+        overrides['worker_class'] = ASGI_WORKER_CLASS
+    elif threads is not None:
+        overrides['worker_class'] = 'gthread' if threads > 1 else 'sync'
+    LearnHubApplication(overrides, asgi=asgi).run()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve LearnHub with gunicorn')
+    parser.add_argument('--bind', help='address to listen on, e.g. 0.0.0.0:8000')
+    parser.add_argument('--workers', type=int, help='worker processes (default: 2 x cores + 1)')
+    parser.add_argument('--threads', type=int, help='threads per worker')
+    parser.add_argument('--asgi', action='store_true', help='serve asgi.py with uvicorn workers')
+    args = parser.parse_args(argv)
+    run(args.bind, args.workers, args.threads, args.asgi)
+
+
+if __name__ == '__main__':
+    main()
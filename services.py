@@ -0,0 +1,252 @@
+"""Backends used by the API handlers.
+
+The StandIn classes model backends that don't exist yet: each call just
+waits LEARNHUB_IO_LATENCY_MS (default 0) like a network round trip. The
+Services classes replace them with real implementations as they land. The
+sync and async flavours expose the same methods.
+"""
+import logging
+import os
+import threading
+import time
+
+from dedupe import DuplicateEmail, EmailIndex
+import payments
+from mailer import MailQueue
+from passwords import PasswordHasher
+from storage import SignupStore
+from subscriptions import SUBSCRIBE, NewsletterLog, fold
+
+IO_LATENCY = float(os.environ.get('LEARNHUB_IO_LATENCY_MS', 0)) / 1000.0
+# AsyncServices' thread pools, one per backend. Payments get as many
+# threads as the gateway client keeps pooled connections
+STORAGE_THREADS = int(os.environ.get('LEARNHUB_ASYNC_STORAGE_THREADS', 16))
+PAYMENT_THREADS = int(os.environ.get('LEARNHUB_ASYNC_PAYMENT_THREADS', payments.POOL_SIZE))
+
+log = logging.getLogger(__name__)
+
+
+class StandInServices:
+    def __init__(self, latency=IO_LATENCY):
+        self.latency = latency
+
+    def _call(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def save_signup(self, data):
+        self._call()
+
+    def charge(self, data, key=None):
+        self._call()
+
+    def add_subscriber(self, data):
+        self._call()
+
+
+class AsyncStandInServices:
+    def __init__(self, latency=IO_LATENCY):
+        self.latency = latency
+
+    async def _call(self):
+        if self.latency:
+            import asyncio
+            await asyncio.sleep(self.latency)
+
+    async def save_signup(self, data):
+        await self._call()
+
+    async def charge(self, data, key=None):
+        await self._call()
+
+    async def add_subscriber(self, data):
+        await self._call()
+
+
+class Services(StandInServices):
+    def __init__(self, signups=None, newsletter=None, hasher=None, gateway=None, mail=None,
+                 latency=IO_LATENCY):
+        super().__init__(latency)
+        self.signups = signups or SignupStore()
+        self.newsletter = newsletter or NewsletterLog()
+        self.hasher = hasher or PasswordHasher()
+        self.mail = mail or MailQueue()
+        # None (no LEARNHUB_PAYMENT_URL) keeps the stand-in charge
+        self.gateway = gateway or payments.from_env()
+        # Per process, so neither is the truth across workers: a signup the
+        # filter knows is a duplicate, one it doesn't is left to the store's
+        # unique index; the newsletter filter follows the shared log
+        self.signup_emails = EmailIndex()
+        self.newsletter_emails = EmailIndex()
+        self._newsletter_position = None
+        self._indexes_loaded = False
+        self._index_lock = threading.Lock()
+
+    def load_indexes(self):
+        """Fill the duplicate filters from storage (once; ideally before fork)."""
+        if self._indexes_loaded:
+            return
+        with self._index_lock:
+            if not self._indexes_loaded:
+                self.signup_emails.add_many(self.signups.iter_emails())
+                self._follow_newsletter_locked()
+                self._indexes_loaded = True
+
+    def _follow_newsletter(self):
+        with self._index_lock:
+            self._follow_newsletter_locked()
+
+    def _follow_newsletter_locked(self):
+        # Apply what every worker (this one included) appended since the last
+        # look, so subscribes and unsubscribes made elsewhere count here too
+        records, self._newsletter_position, restarted = self.newsletter.read_changes(self._newsletter_position)
+        if restarted:
+            state, _ = fold(records)
+            emails = EmailIndex()
+            emails.add_many(state)
+            self.newsletter_emails = emails
+            return
+        for op, email, _ in records:
+            if op == SUBSCRIBE:
+                self.newsletter_emails.claim(email)
+            else:
+                self.newsletter_emails.release(email)
+
+    def _send_mail(self, jobs):
+        # The signup or subscription is already stored: a queue failure costs
+        # the email, not the request
+        try:
+            self.mail.enqueue_many(jobs)
+        except Exception:
+            log.exception('could not queue %d email(s)', len(jobs))
+
+    def save_signup(self, data):
+        self.load_indexes()
+        if not self.signup_emails.claim(data['email']):
+            raise DuplicateEmail(data['email'])
+        try:
+            record = {k: v for k, v in data.items() if k != 'password'}
+            record['password_hash'] = self.hasher.hash(data['password'])
+            # Raises DuplicateEmail for an account made through another worker
+            self.signups.save(record)
+        except DuplicateEmail:
+            raise
+        except Exception:
+            self.signup_emails.release(data['email'])
+            raise
+        self._send_mail([('welcome', data['email'], {'name': data['name']})])
+
+    def save_signups(self, records, with_passwords=False, notify=False):
+        """Bulk variant; returns the records skipped as duplicates.
+
+        Imported accounts carry no password (any "password" field is dropped,
+        never stored) and get no welcome email; they set a password through
+        the normal reset flow. The batch API passes with_passwords=True and
+        notify=True to treat them like single signups.
+        """
+        self.load_indexes()
+        fresh, duplicates = [], []
+        for record in records:
+            (fresh if self.signup_emails.claim(record['email']) else duplicates).append(record)
+        try:
+            rows = [{k: v for k, v in record.items() if k != 'password'} for record in fresh]
+            if with_passwords and fresh:
+                hashes = self.hasher.hash_many([record['password'] for record in fresh])
+                for row, password_hash in zip(rows, hashes):
+                    row['password_hash'] = password_hash
+            taken = {id(row) for row in self.signups.save_many(rows)}
+        except Exception:
+            for record in fresh:
+                self.signup_emails.release(record['email'])
+            raise
+        # Accounts made through other workers since this one's filter was filled
+        created = []
+        for record, row in zip(fresh, rows):
+            (duplicates if id(row) in taken else created).append(record)
+        if notify and created:
+            self._send_mail([('welcome', record['email'], {'name': record['name']}) for record in created])
+        return duplicates
+
+    def charge(self, data, key=None):
+        """key is the gateway Idempotency-Key (see payments.gateway_key)."""
+        if self.gateway is None:
+            return super().charge(data, key)
+        return self.gateway.charge({'plan': data['plan'], 'payment_method': data['payment_method']}, key)
+
+    def add_subscriber(self, data):
+        # Idempotent: an address already on the list is not written again
+        self.load_indexes()
+        self._follow_newsletter()
+        if self.newsletter_emails.claim(data['email']):
+            try:
+                self.newsletter.subscribe(data['email'])
+            except Exception:
+                self.newsletter_emails.release(data['email'])
+                raise
+            self._send_mail([('newsletter', data['email'], {})])
+
+    def add_subscribers(self, records, notify=False):
+        """Bulk variant; returns the records skipped as already subscribed."""
+        self.load_indexes()
+        self._follow_newsletter()
+        fresh, duplicates = [], []
+        for record in records:
+            (fresh if self.newsletter_emails.claim(record['email']) else duplicates).append(record)
+        try:
+            self.newsletter.subscribe_many([record['email'] for record in fresh])
+        except Exception:
+            for record in fresh:
+                self.newsletter_emails.release(record['email'])
+            raise
+        if notify and fresh:
+            self._send_mail([('newsletter', record['email'], {}) for record in fresh])
+        return duplicates
+
+    def remove_subscriber(self, data):
+        self.newsletter.unsubscribe(data['email'])
+        self.newsletter_emails.release(data['email'])
+
+
+class AsyncServices(AsyncStandInServices):
+    """Async facade over a Services instance (sharing its stores and filters).
+
+    Storage writes and charges run on separate bounded thread pools, so a
+    slow gateway (up to payments.CALL_DEADLINE per charge) can only hold
+    PAYMENT_THREADS threads, never the ones signups are waiting for.
+    """
+
+    def __init__(self, services, latency=IO_LATENCY, storage_threads=STORAGE_THREADS,
+                 payment_threads=PAYMENT_THREADS):
+        # Imported here: only the ASGI app needs it
+        from concurrent.futures import ThreadPoolExecutor
+        super().__init__(latency)
+        self.services = services
+        self.storage_executor = ThreadPoolExecutor(storage_threads, thread_name_prefix='storage')
+        self.payment_executor = ThreadPoolExecutor(payment_threads, thread_name_prefix='payments')
+
+    # The stores block until their group commit lands; keep that off the loop
+    async def _run(self, executor, method, *args):
+        # Imported here: only the ASGI app needs asyncio, and it costs the
+        # WSGI workers' startup ~15 ms
+        import asyncio
+        return await asyncio.get_running_loop().run_in_executor(executor, method, *args)
+
+    async def save_signup(self, data):
+        await self._run(self.storage_executor, self.services.save_signup, data)
+
+    async def charge(self, data, key=None):
+        if self.services.gateway is None:
+            return await super().charge(data, key)
+        return await self._run(self.payment_executor, self.services.charge, data, key)
+
+    async def add_subscriber(self, data):
+        await self._run(self.storage_executor, self.services.add_subscriber, data)
+
+    async def remove_subscriber(self, data):
+        await self._run(self.storage_executor, self.services.remove_subscriber, data)
+
+    async def save_signups(self, records, with_passwords=False, notify=False):
+        return await self._run(self.storage_executor, self.services.save_signups, records, with_passwords, notify)
+
+    async def add_subscribers(self, records, notify=False):
+        return await self._run(self.storage_executor, self.services.add_subscribers, records, notify)
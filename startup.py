@@ -0,0 +1,245 @@
+"""Startup timing: module imports, app construction, lazy subsystems, first request.
+
+Entry points (gunicorn.conf.py, bench/startup.py) call time_imports()
+before they import the app; from then until the process is ready every
+module loaded by an import statement is timed (self time excludes the
+modules it imported, as in python -X importtime). Importing the app alone
+(tests, scripts) leaves builtins.__import__ alone. Steps wrapped in
+phase() are timed, and subsystems an app builds on first use through
+@lazy record when and how long they took, during startup or later. The
+first request each process serves is recorded too.
+
+Times are milliseconds since the process started (from /proc on Linux,
+elsewhere since this module was imported). A gunicorn worker keeps the
+master's clock, so its first request counts from the master's start; the
+report also says when the worker was forked.
+
+ready() ends the startup: it stops the import timer and, when the app has
+a STARTUP_BUDGET_MS, logs a warning with the slowest imports and phases if
+startup took longer. GET /debug/startup (with the /debug/profile token)
+returns report() for the worker that answers; bench/startup.py measures
+cold starts in fresh processes and fails when they exceed a budget.
+"""
+import builtins
+import contextlib
+import functools
+import importlib.util
+import logging
+import os
+import sys
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+_imported = time.perf_counter()
+
+
+def _process_age():
+    """Seconds since this process started, or None without /proc."""
+    try:
+        with open('/proc/self/stat') as f:
+            # Fields after the parenthesised command name; starttime is field 22
+            start_ticks = int(f.read().rpartition(')')[2].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    return max(0.0, uptime - start_ticks / os.sysconf('SC_CLK_TCK'))
+
+
+_age = _process_age()
+_origin = _imported - (_age or 0.0)
+
+# module -> [self seconds, total seconds]
+_imports = {}
+# Time spent in nested imports, one entry per import in progress
+_import_stack = []
+_import_total = 0.0
+_import_thread = threading.get_ident()
+_original_import = builtins.__import__
+
+_phases = []
+_lazy = []
+_budget_ms = None
+_ready = None
+_forked = None
+_first_request = None
+_lock = threading.Lock()
+
+
+def _ms(moment):
+    return None if moment is None else round((moment - _origin) * 1000, 1)
+
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    global _import_total
+    if (not level and not fromlist and name in sys.modules) or threading.get_ident() != _import_thread:
+        return _original_import(name, globals, locals, fromlist, level)
+    module = name
+    if level:
+        try:
+            module = importlib.util.resolve_name('.' * level + name, (globals or {}).get('__package__'))
+        except (ImportError, ValueError):
+            pass
+    if fromlist and module in sys.modules:
+        # `from package import submodule`: only the submodules can be new
+        module = '%s.%s' % (module, ','.join(fromlist))
+    loaded = len(sys.modules)
+    _import_stack.append(0.0)
+    start = time.perf_counter()
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        elapsed = time.perf_counter() - start
+        nested = _import_stack.pop()
+        if _import_stack:
+            _import_stack[-1] += elapsed
+        else:
+            _import_total += elapsed
+        if len(sys.modules) != loaded:
+            entry = _imports.setdefault(module, [0.0, 0.0])
+            entry[0] += elapsed - nested
+            entry[1] += elapsed
+
+
+def time_imports():
+    """Time every import from now until ready(); call before importing the app."""
+    global _import_thread
+    with _lock:
+        if _ready is None and builtins.__import__ is _original_import:
+            _import_thread = threading.get_ident()
+            builtins.__import__ = _timed_import
+
+
+def _stop_import_timer():
+    if builtins.__import__ is _timed_import:
+        builtins.__import__ = _original_import
+
+
+def _after_fork():
+    global _forked, _first_request, _lock
+    _forked = time.perf_counter()
+    _first_request = None
+    _lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+@contextlib.contextmanager
+def phase(name):
+    """Time a startup step."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _phases.append((name, start, time.perf_counter() - start))
+
+
+def lazy(name):
+    """Decorator for a subsystem getter build(app): build it on an app's first call, once
+    per app, keep it in app.extensions and time that. get() defaults to current_app."""
+    def decorate(build):
+        key = 'learnhub.' + build.__name__.replace('get_', '', 1)
+        lock = threading.Lock()
+
+        @functools.wraps(build)
+        def get(app=None):
+            if app is None:
+                from flask import current_app
+                app = current_app._get_current_object()
+            try:
+                return app.extensions[key]
+            except KeyError:
+                pass
+            with lock:
+                if key not in app.extensions:
+                    start = time.perf_counter()
+                    app.extensions[key] = build(app)
+                    _lazy.append((name, start, time.perf_counter() - start, os.getpid()))
+            return app.extensions[key]
+        return get
+    return decorate
+
+
+def ready(app=None):
+    """Mark this process ready to serve: stop timing imports and check the budget."""
+    global _ready, _budget_ms
+    with _lock:
+        if _ready is not None:
+            return
+        _ready = time.perf_counter()
+    _stop_import_timer()
+    if app is not None:
+        _budget_ms = app.config.get('STARTUP_BUDGET_MS')
+    took = _ms(_ready)
+    if _budget_ms is not None and took > _budget_ms:
+        log.warning('startup took %.0f ms, over its %.0f ms budget\n%s', took, _budget_ms,
+                    format_report(report(top=5)))
+    else:
+        log.info('ready in %.0f ms', took)
+
+
+def init_app(app):
+    """Record the first request app serves in each process, then get out of its way."""
+    wsgi_app = app.wsgi_app
+
+    def first_request(environ, start_response):
+        global _first_request
+        app.wsgi_app = wsgi_app
+        # Servers that never called ready() (flask run, tests) are ready now
+        ready(app)
+        started = time.perf_counter()
+        try:
+            return wsgi_app(environ, start_response)
+        finally:
+            if _first_request is None:
+                _first_request = (environ.get('PATH_INFO'), started, time.perf_counter())
+
+    app.wsgi_app = first_request
+
+
+def report(top=15):
+    """This process's startup as a dict of milliseconds."""
+    slowest = sorted(_imports.items(), key=lambda item: -item[1][0])[:top]
+    first = None
+    if _first_request is not None:
+        path, started, finished = _first_request
+        first = {
+            'path': path,
+            'at_ms': _ms(finished),
+            'ms': round((finished - started) * 1000, 1),
+            'since_fork_ms': None if _forked is None else round((finished - _forked) * 1000, 1),
+        }
+    return {
+        'pid': os.getpid(),
+        'clock': 'process start' if _age is not None else 'startup import',
+        'boot_ms': _ms(_imported),
+        'imports_ms': round(_import_total * 1000, 1),
+        'imports': [{'module': name, 'self_ms': round(own * 1000, 1), 'total_ms': round(total * 1000, 1)}
+                    for name, (own, total) in slowest],
+        'phases': [{'name': name, 'at_ms': _ms(start), 'ms': round(seconds * 1000, 1)}
+                   for name, start, seconds in _phases],
+        'lazy': [{'name': name, 'at_ms': _ms(start), 'ms': round(seconds * 1000, 1), 'pid': pid}
+                 for name, start, seconds, pid in _lazy],
+        'ready_ms': _ms(_ready),
+        'budget_ms': _budget_ms,
+        'forked_ms': _ms(_forked),
+        'first_request': first,
+    }
+
+
+def format_report(data):
+    lines = ['ready at %s ms (since %s); interpreter and server boot %s ms, imports %s ms' % (
+        data['ready_ms'], data['clock'], data['boot_ms'], data['imports_ms'])]
+    lines += ['  import %-40s %7.1f ms self %7.1f ms total' % (item['module'], item['self_ms'], item['total_ms'])
+              for item in data['imports']]
+    lines += ['  phase  %-40s %7.1f ms at %s ms' % (item['name'], item['ms'], item['at_ms'])
+              for item in data['phases']]
+    lines += ['  lazy   %-40s %7.1f ms at %s ms' % (item['name'], item['ms'], item['at_ms'])
+              for item in data['lazy']]
+    first = data['first_request']
+    if first is not None:
+        lines.append('  first request %s served at %s ms, took %s ms' % (first['path'], first['at_ms'], first['ms']))
+    return '\n'.join(lines)
@@ -0,0 +1,229 @@
+"""Signup persistence: SQLite in WAL mode behind a group-commit writer thread.
+
+Request threads enqueue a record and wait; a single writer per process
+drains the queue and commits up to BATCH_SIZE records per transaction (or
+whatever arrived within MAX_DELAY), then wakes every waiter in the batch
+once its transaction is durable. One fsync is shared by the whole batch.
+"""
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from dedupe import DuplicateEmail, normalize_email
+
+VAR_DIR = os.environ.get('LEARNHUB_VAR_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'var'))
+DB_PATH = os.environ.get('LEARNHUB_DB', os.path.join(VAR_DIR, 'learnhub.db'))
+
+BATCH_SIZE = 128
+MAX_DELAY = 0.005
+QUEUE_SIZE = 10000
+SAVE_TIMEOUT = 5.0
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS signups (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL,
+    expertise TEXT,
+    password_hash TEXT,
+    created_at REAL NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS signups_email ON signups (email);
+'''
+
+
+class StorageError(Exception):
+    pass
+
+
+class StorageBusy(StorageError):
+    """The write queue is full; the caller should shed load (503)."""
+
+
+def connect(path):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    conn = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+    # FULL makes every commit durable; batching keeps that to one fsync per batch
+    conn.execute('PRAGMA synchronous=FULL')
+    return conn
+
+
+class _Pending:
+    __slots__ = ('items', 'done', 'error', 'results')
+
+    def __init__(self, items):
+        self.items = items
+        self.done = threading.Event()
+        self.error = None
+        self.results = None
+
+
+class GroupCommitWriter:
+    """Bounded queue + per-process writer thread committing in batches.
+
+    Subclasses implement _open() (per-process handle, opened in the writer
+    thread's process) and _write_batch(handle, items), which must only
+    return once the batch is durable. _write_batch may return one result per
+    item, handed back by submit() and submit_many().
+    """
+
+    thread_name = 'group-commit-writer'
+
+    def __init__(self, batch_size=BATCH_SIZE, max_delay=MAX_DELAY, queue_size=QUEUE_SIZE):
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+
+    def _ensure_writer(self):
+        # Threads don't survive fork: each (gunicorn) worker starts its own writer
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            handle = self._open()
+            self._queue = queue.Queue(self.queue_size)
+            thread = threading.Thread(target=self._run, args=(handle, self._queue),
+                                      name=self.thread_name, daemon=True)
+            thread.start()
+            self._pid = os.getpid()
+
+    def submit(self, item, timeout=SAVE_TIMEOUT):
+        """Queue one item; returns its result once the batch holding it is durable."""
+        self._ensure_writer()
+        pending = _Pending([item])
+        try:
+            self._queue.put_nowait(pending)
+        except queue.Full:
+            raise StorageBusy('%s queue is full' % self.thread_name)
+        results = self._wait(pending, timeout)
+        return None if results is None else results[0]
+
+    def submit_many(self, items, timeout=SAVE_TIMEOUT):
+        """Queue a bulk batch, waiting for queue space instead of failing fast."""
+        self._ensure_writer()
+        pending = _Pending(list(items))
+        try:
+            self._queue.put(pending, timeout=timeout)
+        except queue.Full:
+            raise StorageBusy('%s queue is full' % self.thread_name)
+        return self._wait(pending, timeout)
+
+    def _wait(self, pending, timeout):
+        if not pending.done.wait(timeout):
+            raise StorageError('timed out waiting for %s commit' % self.thread_name)
+        if pending.error is not None:
+            raise StorageError(str(pending.error))
+        return pending.results
+
+    def _run(self, handle, pending_queue):
+        while True:
+            batch = [pending_queue.get()]
+            size = len(batch[0].items)
+            deadline = time.monotonic() + self.max_delay
+            while size < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    pending = (pending_queue.get(timeout=remaining) if remaining > 0
+                               else pending_queue.get_nowait())
+                except queue.Empty:
+                    break
+                batch.append(pending)
+                size += len(pending.items)
+            error = results = None
+            try:
+                results = self._write_batch(handle, [item for pending in batch for item in pending.items])
+            except Exception as exc:
+                error = exc
+            offset = 0
+            for pending in batch:
+                pending.error = error
+                if results is not None:
+                    pending.results = results[offset:offset + len(pending.items)]
+                offset += len(pending.items)
+                pending.done.set()
+
+    def _open(self):
+        raise NotImplementedError
+
+    def _write_batch(self, handle, items):
+        raise NotImplementedError
+
+
+class SignupStore(GroupCommitWriter):
+    thread_name = 'signup-writer'
+
+    def __init__(self, path=DB_PATH, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+
+    @staticmethod
+    def _row(record):
+        return (record['name'], normalize_email(record['email']), record.get('expertise'),
+                record.get('password_hash'), time.time())
+
+    def save(self, record, timeout=SAVE_TIMEOUT):
+        """Persist one signup; returns once the batch holding it is committed.
+
+        Raises DuplicateEmail when the email already has an account.
+        """
+        if not self.submit(self._row(record), timeout):
+            raise DuplicateEmail(record['email'])
+
+    def save_many(self, records, timeout=SAVE_TIMEOUT):
+        """Persist signups; returns the records whose email already had an account."""
+        inserted = self.submit_many([self._row(record) for record in records], timeout)
+        return [record for record, ok in zip(records, inserted) if not ok]
+
+    def count(self):
+        conn = self._open()
+        try:
+            return conn.execute('SELECT COUNT(*) FROM signups').fetchone()[0]
+        finally:
+            conn.close()
+
+    def iter_emails(self):
+        conn = self._open()
+        try:
+            for (email,) in conn.execute('SELECT email FROM signups'):
+                yield email
+        finally:
+            conn.close()
+
+    def _open(self):
+        conn = connect(self.path)
+        conn.executescript(SCHEMA)
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(signups)')}
+        if 'password_hash' not in columns:
+            conn.execute('ALTER TABLE signups ADD COLUMN password_hash TEXT')
+        return conn
+
+    def _write_batch(self, conn, rows):
+        """Insert rows in one transaction; True for each row inserted, False for a taken email."""
+        inserted = []
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for row in rows:
+                try:
+                    conn.execute('INSERT INTO signups (name, email, expertise, password_hash, created_at) '
+                                 'VALUES (?, ?, ?, ?, ?)', row)
+                except sqlite3.IntegrityError as exc:
+                    # The duplicate filters are per worker: the unique index has the final say.
+                    # A failed statement is undone on its own; the transaction goes on.
+                    if exc.sqlite_errorname != 'SQLITE_CONSTRAINT_UNIQUE':
+                        raise
+                    inserted.append(False)
+                else:
+                    inserted.append(True)
+            conn.execute('COMMIT')
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        return inserted
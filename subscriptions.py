@@ -0,0 +1,230 @@
+"""Newsletter subscriptions as an append-only, length-prefixed log.
+
+Record layout: >I payload length, >I crc32(payload), payload, where payload
+is one op byte (S = subscribe, U = unsubscribe) followed by the UTF-8 email.
+Appends go through the group-commit writer (one write + fsync per batch).
+Appenders hold a shared flock while writing; the compactor takes it
+exclusively only to fold in the tail and swap the rewritten file in place.
+"""
+import fcntl
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+from dedupe import normalize_email
+from storage import VAR_DIR, GroupCommitWriter, SAVE_TIMEOUT
+
+LOG_PATH = os.environ.get('LEARNHUB_NEWSLETTER_LOG', os.path.join(VAR_DIR, 'newsletter.log'))
+
+HEADER = struct.Struct('>II')
+SUBSCRIBE = b'S'
+UNSUBSCRIBE = b'U'
+
+# Compact once the log has grown this much past its last compacted size
+COMPACT_MIN_BYTES = 1024 * 1024
+COMPACT_GROWTH = 2.0
+COMPACT_INTERVAL = 60.0
+
+
+def encode_record(op, email):
+    payload = op + email.encode('utf-8')
+    return HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def iter_records(buf, start=0):
+    """Yield (op, email, end offset); stops at the first torn or corrupt record."""
+    offset, size = start, len(buf)
+    while offset + HEADER.size <= size:
+        length, crc = HEADER.unpack_from(buf, offset)
+        end = offset + HEADER.size + length
+        if end > size:
+            return
+        payload = bytes(buf[offset + HEADER.size:end])
+        if zlib.crc32(payload) != crc or not payload:
+            return
+        yield payload[:1], payload[1:].decode('utf-8'), end
+        offset = end
+
+
+def fold(records, state=None):
+    """Apply records in order; returns ({email: True}, bytes consumed)."""
+    state = {} if state is None else state
+    end = 0
+    for op, email, end in records:
+        if op == SUBSCRIBE:
+            state[email] = True
+        else:
+            state.pop(email, None)
+    return state, end
+
+
+class NewsletterLog(GroupCommitWriter):
+    thread_name = 'newsletter-writer'
+
+    def __init__(self, path=LOG_PATH, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self._compactor_pid = None
+
+    def subscribe(self, email, timeout=SAVE_TIMEOUT):
+        self.submit(encode_record(SUBSCRIBE, normalize_email(email)), timeout)
+
+    def unsubscribe(self, email, timeout=SAVE_TIMEOUT):
+        self.submit(encode_record(UNSUBSCRIBE, normalize_email(email)), timeout)
+
+    def subscribe_many(self, emails, timeout=SAVE_TIMEOUT):
+        self.submit_many([encode_record(SUBSCRIBE, normalize_email(email)) for email in emails], timeout)
+
+    def _open_fd(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        return os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def _open(self):
+        self._start_compactor()
+        return {'fd': self._open_fd()}
+
+    def _write_batch(self, handle, records):
+        data = b''.join(records)
+        fd = handle['fd']
+        fcntl.flock(fd, fcntl.LOCK_SH)
+        try:
+            # The compactor may have swapped in a new file since our last batch
+            try:
+                current = os.stat(self.path).st_ino
+            except FileNotFoundError:
+                current = None
+            if current != os.fstat(fd).st_ino:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+                fd = handle['fd'] = self._open_fd()
+                fcntl.flock(fd, fcntl.LOCK_SH)
+            os.write(fd, data)
+            os.fsync(fd)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def export(self):
+        """Return the sorted list of currently subscribed emails (mmap read)."""
+        try:
+            with open(self.path, 'rb') as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return []
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                    state, _ = fold(iter_records(buf))
+        except FileNotFoundError:
+            return []
+        return sorted(state)
+
+    def read_changes(self, position=None):
+        """Records appended since position: ([(op, email, end), ...], new position, restarted).
+
+        position comes from the previous call (None reads from the start).
+        Once compaction has swapped in a new file, the whole new file is
+        returned with restarted=True; it holds the complete state on its own.
+        A record still being written is left for the next call.
+        """
+        inode, offset = position or (None, 0)
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return [], position, False
+        restarted = stat.st_ino != inode
+        if not restarted and stat.st_size <= offset:
+            # Nothing new: the common case, for the cost of a stat()
+            return [], position, False
+        try:
+            with open(self.path, 'rb') as f:
+                inode = os.fstat(f.fileno()).st_ino
+                if inode != stat.st_ino:
+                    # Swapped between the stat() and the open()
+                    restarted = True
+                if restarted:
+                    offset = 0
+                if os.fstat(f.fileno()).st_size <= offset:
+                    return [], (inode, offset), restarted
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                    records = list(iter_records(buf, offset))
+        except FileNotFoundError:
+            return [], position, False
+        return records, (inode, records[-1][2] if records else offset), restarted
+
+    def _start_compactor(self):
+        if self._compactor_pid == os.getpid():
+            return
+        self._compactor_pid = os.getpid()
+        thread = threading.Thread(target=self._compact_loop, name='newsletter-compactor', daemon=True)
+        thread.start()
+
+    def _compact_loop(self):
+        while True:
+            time.sleep(COMPACT_INTERVAL)
+            try:
+                self.maybe_compact()
+            except OSError:
+                pass
+
+    def _last_compacted_size(self):
+        # Recorded in the lock file so every worker sees the same baseline
+        try:
+            with open(self.path + '.compact.lock', 'rb') as f:
+                return int(f.read() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def maybe_compact(self):
+        try:
+            size = os.stat(self.path).st_size
+        except FileNotFoundError:
+            return False
+        if size < max(COMPACT_MIN_BYTES, self._last_compacted_size() * COMPACT_GROWTH):
+            return False
+        return self.compact()
+
+    def compact(self):
+        """Rewrite the log as one subscribe record per live email.
+
+        Only one process compacts at a time (non-blocking lock file); the
+        rest of the workers keep appending until the final swap.
+        """
+        lock_fd = os.open(self.path + '.compact.lock', os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            try:
+                fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            with open(self.path, 'rb') as f:
+                fd = f.fileno()
+                # Fold a snapshot without blocking appenders...
+                if os.fstat(fd).st_size:
+                    with mmap.mmap(fd, 0, access=mmap.ACCESS_READ) as buf:
+                        state, consumed = fold(iter_records(buf))
+                else:
+                    state, consumed = {}, 0
+                # ...then block them only to fold the tail and swap files
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                try:
+                    f.seek(consumed)
+                    tail = f.read()
+                    state, _ = fold(iter_records(tail), state)
+                    tmp_path = self.path + '.compact'
+                    with open(tmp_path, 'wb') as out:
+                        out.write(b''.join(encode_record(SUBSCRIBE, email) for email in state))
+                        out.flush()
+                        os.fsync(out.fileno())
+                    os.replace(tmp_path, self.path)
+                    dir_fd = os.open(os.path.dirname(self.path) or '.', os.O_RDONLY)
+                    try:
+                        os.fsync(dir_fd)
+                    finally:
+                        os.close(dir_fd)
+                    compacted = str(os.stat(self.path).st_size).encode('ascii')
+                    os.ftruncate(lock_fd, 0)
+                    os.pwrite(lock_fd, compacted, 0)
+                finally:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+            return True
+        finally:
+            os.close(lock_fd)
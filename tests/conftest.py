@@ -0,0 +1,54 @@
+import importlib.util
+import os
+
+import pytest
+
+# Cheap password hashes; passwords reads its cost parameters at import
+os.environ.setdefault('LEARNHUB_SCRYPT_N', '1024')
+
+from app import create_app, get_services  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_bench(name):
+    """A bench/ script as a module (bench/ isn't a package, and on sys.path it
+    would shadow top-level modules such as dedupe)."""
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, 'bench', name + '.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    """create_app('testing') on this test's temporary VAR_DIR; settings override the profile."""
+    def make(**settings):
+        settings.setdefault('VAR_DIR', str(tmp_path))
+        return create_app('testing', **settings)
+    return make
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def services(app):
+    return get_services(app)
+
+
+@pytest.fixture(scope='session')
+def stand_in_gateway():
+    return load_bench('gateway')
+
+
+@pytest.fixture(scope='session')
+def smtp_sink():
+    return load_bench('smtp_sink')
@@ -0,0 +1,30 @@
+import gc
+import weakref
+
+import app as app_module
+from app import get_search_index
+from catalog import Catalog
+
+COURSE = {'slug': 'python-101', 'title': 'Python 101', 'category': 'development', 'instructor': 'Ada', 'price': 10}
+
+
+def test_search_index_follows_the_catalog(make_app, monkeypatch):
+    catalog = Catalog()
+    monkeypatch.setattr(app_module, 'catalog', catalog)
+    index = get_search_index(make_app())
+    catalog.upsert(COURSE)
+    assert [slug for slug, _ in index.search('python', 0, 10)[0]] == ['python-101']
+
+
+def test_discarded_app_is_collected(make_app, monkeypatch):
+    catalog = Catalog()
+    monkeypatch.setattr(app_module, 'catalog', catalog)
+    app = make_app(METRICS=True)
+    app.test_client().get('/api/courses')
+    refs = [weakref.ref(app), weakref.ref(get_search_index(app)), weakref.ref(app.extensions['learnhub.metrics'])]
+    del app
+    gc.collect()
+    # Neither the global catalog's subscription nor an at-fork hook keeps it
+    assert [ref() for ref in refs] == [None, None, None]
+    catalog.upsert(COURSE)
+    assert catalog._listeners == []
@@ -0,0 +1,81 @@
+import io
+import json
+
+import bulk
+import schemas
+from storage import StorageError
+
+
+def ndjson(*lines):
+    return b''.join((line if isinstance(line, bytes) else json.dumps(line).encode('utf-8')) + b'\n'
+                    for line in lines)
+
+
+def run(body, write_many, batch_size=bulk.BATCH_SIZE):
+    results = list(bulk.import_ndjson(io.BytesIO(body), schemas.NEWSLETTER, write_many, batch_size))
+    return results[:-1], results[-1]['summary']
+
+
+def test_per_line_results_and_summary():
+    written = []
+    body = ndjson({'email': 'ann@example.com'}, b'', b'{not json', {'email': 'nope'}, {'email': 'bob@example.com'})
+    results, summary = run(body, lambda batch: written.extend(batch))
+    assert results == [
+        {'line': 3, 'ok': False, 'error': 'invalid JSON'},
+        {'line': 4, 'ok': False, 'error': 'Invalid request: email must be a valid email address'},
+        {'line': 1, 'ok': True},
+        {'line': 5, 'ok': True},
+    ]
+    # Blank lines don't count
+    assert summary == {'lines': 4, 'imported': 2, 'duplicates': 0, 'rejected': 2, 'failed': 0}
+    assert written == [{'email': 'ann@example.com'}, {'email': 'bob@example.com'}]
+
+
+def test_writes_in_batches():
+    batches = []
+    results, summary = run(ndjson(*({'email': 'u%d@example.com' % n} for n in range(5))),
+                           lambda batch: batches.append(len(batch)), batch_size=2)
+    assert batches == [2, 2, 1]
+    assert summary['imported'] == 5
+
+
+def test_duplicates_reported_by_the_writer():
+    results, summary = run(ndjson({'email': 'ann@example.com'}, {'email': 'bob@example.com'}),
+                           lambda batch: [record for record in batch if record['email'] == 'ann@example.com'])
+    assert results == [{'line': 1, 'ok': False, 'error': 'duplicate email'}, {'line': 2, 'ok': True}]
+    assert (summary['imported'], summary['duplicates']) == (1, 1)
+
+
+def test_failed_batch():
+    def write_many(batch):
+        raise StorageError('database is locked')
+    results, summary = run(ndjson({'email': 'ann@example.com'}), write_many)
+    assert results == [{'line': 1, 'ok': False, 'error': 'database is locked'}]
+    assert summary['failed'] == 1
+
+
+def test_overlong_line_is_skipped():
+    body = b'{"email": "' + b'a' * bulk.MAX_LINE + b'@example.com"}\n' + ndjson({'email': 'ann@example.com'})
+    results, summary = run(body, lambda batch: None)
+    assert results == [{'line': 1, 'ok': False, 'error': 'line too long'}, {'line': 2, 'ok': True}]
+    assert summary['rejected'] == 1
+
+
+def test_bulk_signup_endpoint(client, services):
+    body = ndjson({'name': 'Ann', 'email': 'ann@example.com'}, {'name': 'Ann', 'email': 'ANN@example.com'},
+                  {'name': 'Bob'})
+    response = client.post('/api/bulk/signup', data=body, content_type='application/x-ndjson')
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.data.splitlines()]
+    assert lines[-1]['summary'] == {'lines': 3, 'imported': 1, 'duplicates': 1, 'rejected': 1, 'failed': 0}
+    assert services.signups.count() == 1
+
+
+def test_bulk_newsletter_endpoint(client, services):
+    services.add_subscriber({'email': 'bob@example.com'})
+    body = ndjson({'email': 'ann@example.com'}, {'email': 'ann@example.com'}, {'email': 'bob@example.com'})
+    response = client.post('/api/bulk/newsletter', data=body, content_type='application/x-ndjson')
+    lines = [json.loads(line) for line in response.data.splitlines()]
+    assert lines[:-1] == [{'line': 1, 'ok': True}, {'line': 2, 'ok': False, 'error': 'duplicate email'},
+                          {'line': 3, 'ok': False, 'error': 'duplicate email'}]
+    assert lines[-1]['summary'] == {'lines': 3, 'imported': 1, 'duplicates': 2, 'rejected': 0, 'failed': 0}
@@ -0,0 +1,41 @@
+import app as app_module
+from catalog import Catalog
+
+COURSES = [
+    {'slug': 'python-101', 'title': 'Python 101', 'category': 'development', 'instructor': 'Ada', 'price': 10},
+    {'slug': 'color-theory', 'title': 'Color Theory', 'category': 'design', 'instructor': 'Grace', 'price': 20},
+]
+
+
+def test_digest_follows_the_content():
+    catalog = Catalog(COURSES)
+    assert catalog.digest == Catalog(COURSES).digest
+    assert catalog.digest != Catalog(COURSES[::-1]).digest
+    digest = catalog.digest
+    catalog.upsert(COURSES[0])
+    assert catalog.digest == digest
+    catalog.upsert(dict(COURSES[0], price=12))
+    assert catalog.digest != digest
+    catalog.upsert(COURSES[0])
+    assert catalog.digest == digest
+    catalog.remove('python-101')
+    assert catalog.digest == Catalog(COURSES[1:]).digest
+
+
+def etags(client):
+    return [client.get(path).headers['ETag']
+            for path in ('/api/courses', '/api/courses/python-101', '/api/search?q=python')]
+
+
+def test_etags_differ_between_catalogs(make_app, monkeypatch):
+    monkeypatch.setattr(app_module, 'catalog', Catalog(COURSES))
+    first = etags(make_app().test_client())
+    monkeypatch.setattr(app_module, 'catalog', Catalog([dict(COURSES[0], price=12)] + COURSES[1:]))
+    second = etags(make_app().test_client())
+    # Both catalogs are at version 0
+    assert all(a != b for a, b in zip(first, second))
+
+
+def test_unchanged_catalog_revalidates(client):
+    etag = client.get('/api/courses').headers['ETag']
+    assert client.get('/api/courses', headers={'If-None-Match': etag}).status_code == 304
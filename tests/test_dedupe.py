@@ -0,0 +1,116 @@
+from app import get_services
+from dedupe import BloomFilter, EmailIndex, email_key
+from subscriptions import SUBSCRIBE
+
+SIGNUP = {'name': 'Ada', 'email': 'ada@example.com', 'password': 'correct horse', 'expertise': 'development'}
+
+
+def test_duplicate_signup_through_another_worker(make_app):
+    # Two apps on one VAR_DIR stand in for two gunicorn workers
+    first, second = make_app(), make_app()
+    assert first.test_client().post('/api/signup', json=SIGNUP).status_code == 200
+    response = second.test_client().post('/api/signup', json=dict(SIGNUP, email='ADA@example.com'))
+    assert response.status_code == 409
+    assert response.get_json()['message'] == 'An account with this email already exists'
+    # Only the account that was created gets a welcome email
+    assert get_services(first).mail.stats()['queued'] == 1
+
+
+def test_bulk_duplicates_through_another_worker(make_app):
+    first, second = make_app(), make_app()
+    assert first.test_client().post('/api/signup', json=SIGNUP).status_code == 200
+    duplicates = get_services(second).save_signups(
+        [{'name': 'Ada', 'email': 'ada@example.com'}, {'name': 'Bob', 'email': 'bob@example.com'}], notify=True)
+    assert [record['email'] for record in duplicates] == ['ada@example.com']
+    assert get_services(second).mail.stats()['queued'] == 2
+
+
+def test_resubscribe_after_unsubscribe_elsewhere(make_app):
+    first, second = make_app().test_client(), make_app().test_client()
+    assert first.post('/api/newsletter', json={'email': 'ann@example.com'}).status_code == 200
+    assert second.post('/api/newsletter/unsubscribe', json={'email': 'ann@example.com'}).status_code == 200
+    # The first worker's filter still remembers the address; the log says it's gone
+    assert first.post('/api/newsletter', json={'email': 'ann@example.com'}).status_code == 200
+    assert get_services(first.application).newsletter.export() == ['ann@example.com']
+
+
+def test_filter_follows_the_log_across_compaction(make_app):
+    first, second = make_app(), make_app()
+    client, other = first.test_client(), second.test_client()
+    for email in ('ann@example.com', 'bob@example.com'):
+        client.post('/api/newsletter', json={'email': email})
+    client.post('/api/newsletter/unsubscribe', json={'email': 'bob@example.com'})
+    # The second worker is following the log from here on
+    other.post('/api/newsletter', json={'email': 'cy@example.com'})
+    newsletter = get_services(first).newsletter
+    size = newsletter.read_changes()[1][1]
+    assert newsletter.compact()
+    records, position, _ = newsletter.read_changes()
+    assert sorted((op, email) for op, email, _ in records) == [(SUBSCRIBE, 'ann@example.com'), (SUBSCRIBE, 'cy@example.com')]
+    assert position[1] < size
+    # It picks up the compacted log: ann is known, bob is free again
+    assert other.post('/api/newsletter', json={'email': 'ann@example.com'}).status_code == 200
+    assert other.post('/api/newsletter', json={'email': 'bob@example.com'}).status_code == 200
+    records, _, _ = newsletter.read_changes()
+    assert [email for _, email, _ in records] == ['ann@example.com', 'cy@example.com', 'bob@example.com']
+
+
+def test_claim_and_release():
+    index = EmailIndex()
+    assert index.claim('Ann@Example.com ')
+    assert not index.claim('ann@example.com')
+    assert 'ANN@example.com' in index and len(index) == 1
+    index.release('ann@example.com')
+    assert 'ann@example.com' not in index and len(index) == 0
+    # Releasing an unknown address changes nothing
+    index.release('bob@example.com')
+    assert len(index) == 0
+    assert index.claim('ann@example.com')
+
+
+def test_merge_keeps_claims_and_releases():
+    index = EmailIndex()
+    emails = ['user%d@example.com' % n for n in range(3000)]
+    for email in emails:
+        assert index.claim(email)
+    # More than 1024 recent keys were merged into the sorted array
+    assert len(index._sorted) >= 1024
+    for email in emails[:500]:
+        index.release(email)
+    index._merge()
+    assert len(index._sorted) == len(index) == 2500
+    assert not index._recent and not index._removed
+    assert all(email not in index for email in emails[:500])
+    assert all(email in index for email in emails[500:])
+    assert index.claim(emails[0]) and not index.claim(emails[-1])
+
+
+def test_bloom_grows_past_its_capacity():
+    index = EmailIndex(capacity=100)
+    emails = ['user%d@example.com' % n for n in range(1000)]
+    index.add_many(emails[:50])
+    for email in emails[50:]:
+        index.claim(email)
+    assert index._bloom.capacity >= 1000
+    assert all(email in index for email in emails)
+    # The rebuilt filter still says "definitely new" for most new addresses
+    misses = sum(email_key('new%d@example.com' % n) in index._bloom for n in range(1000))
+    assert misses < 100
+
+
+def test_rebuilt_bloom_forgets_released_keys():
+    index = EmailIndex(capacity=10)
+    index.add_many(['user%d@example.com' % n for n in range(10)])
+    index.release('user0@example.com')
+    index._rebuild_bloom(100)
+    assert index._bloom.capacity == 100
+    assert 'user0@example.com' not in index and 'user1@example.com' in index
+
+
+def test_bloom_false_positives_are_confirmed():
+    # A filter this small says "maybe" to nearly everything
+    index = EmailIndex(capacity=1)
+    index._bloom = BloomFilter(1, error_rate=0.9)
+    index._bloom.bits[:] = b'\xff' * len(index._bloom.bits)
+    assert 'ann@example.com' not in index
+    assert index.claim('ann@example.com') and not index.claim('ann@example.com')
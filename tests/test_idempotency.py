@@ -0,0 +1,115 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import idempotency
+from payments import GatewayUnavailable
+from services import AsyncServices
+
+SUBSCRIBE = {'plan': 'Starter', 'payment_method': 'credit'}
+
+
+class Gateway:
+    """Records charges; fails the first `failures` of them."""
+
+    def __init__(self, failures=0, delay=0.0):
+        self.failures = failures
+        self.delay = delay
+        self.keys = []
+
+    def charge(self, payment, key=None):
+        time.sleep(self.delay)
+        self.keys.append(key)
+        if len(self.keys) <= self.failures:
+            raise GatewayUnavailable('gateway answered 503')
+        return {'id': 'ch_%d' % len(self.keys)}
+
+
+@pytest.fixture
+def gateway(services):
+    services.gateway = Gateway()
+    return services.gateway
+
+
+def subscribe(client, key, body=SUBSCRIBE):
+    return client.post('/api/subscribe', json=body, headers={'Idempotency-Key': key})
+
+
+def test_replay_returns_the_stored_response(client, gateway):
+    first = subscribe(client, 'order-1')
+    second = subscribe(client, 'order-1')
+    assert first.status_code == second.status_code == 200
+    assert second.get_json() == first.get_json()
+    assert second.headers['Idempotent-Replayed'] == 'true'
+    assert 'Idempotent-Replayed' not in first.headers
+    assert len(gateway.keys) == 1
+
+
+def test_key_reused_for_another_body(client, gateway):
+    assert subscribe(client, 'order-1').status_code == 200
+    response = subscribe(client, 'order-1', dict(SUBSCRIBE, plan='Business'))
+    assert response.status_code == 422
+    assert len(gateway.keys) == 1
+
+
+def test_invalid_key(client, gateway):
+    assert subscribe(client, 'x' * 256).status_code == 400
+    assert gateway.keys == []
+
+
+def test_5xx_releases_the_key(client, gateway):
+    gateway.failures = 1
+    first = subscribe(client, 'order-1')
+    assert first.status_code == 503
+    assert first.headers['Retry-After'] == '1'
+    retry = subscribe(client, 'order-1')
+    assert retry.status_code == 200
+    assert 'Idempotent-Replayed' not in retry.headers
+    assert len(gateway.keys) == 2
+
+
+def test_concurrent_retry_waits_for_the_first(app, gateway):
+    gateway.delay = 0.2
+    responses = []
+
+    def post():
+        responses.append(subscribe(app.test_client(), 'order-1'))
+    threads = [threading.Thread(target=post) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert [response.status_code for response in responses] == [200] * 3
+    assert sum('Idempotent-Replayed' in response.headers for response in responses) == 2
+    assert len(gateway.keys) == 1
+
+
+def test_async_retries_wait_on_the_loop(tmp_path):
+    cache = idempotency.IdempotencyCache(str(tmp_path / 'idempotency.db'))
+    fp = idempotency.fingerprint(SUBSCRIBE)
+    assert cache.claim('order-1', fp) is None
+    threading.Timer(0.2, cache.complete, args=('order-1', 200, {'status': 'success'})).start()
+
+    async def retries():
+        return await asyncio.gather(*[cache.claim_async('order-1', fp) for _ in range(20)])
+    # Twenty waiters, four threads: nobody holds a thread while waiting
+    assert asyncio.run(retries()) == [(200, {'status': 'success'})] * 20
+    assert len(cache._async_executor()._threads) <= idempotency.ASYNC_THREADS
+
+
+def test_slow_charges_dont_hold_up_storage(services, gateway):
+    gateway.delay = 0.3
+    async_services = AsyncServices(services, payment_threads=1)
+
+    async def run():
+        start = time.monotonic()
+        charges = asyncio.gather(*[async_services.charge(SUBSCRIBE) for _ in range(2)])
+        await async_services.add_subscriber({'email': 'ada@example.com'})
+        stored = time.monotonic() - start
+        await charges
+        return stored, time.monotonic() - start
+    stored, charged = asyncio.run(run())
+    # One payment thread: the charges queue behind each other, the write doesn't
+    assert stored < 0.25 and charged >= 0.6
@@ -0,0 +1,151 @@
+import socket
+import threading
+import time
+
+import pytest
+
+import mailer
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = mailer.MailQueue(str(tmp_path / 'mail.db'))
+    queue.enqueue_many([('welcome', 'user%d@example.com' % n, {'name': 'User %d' % n}) for n in range(3)])
+    return queue
+
+
+@pytest.fixture
+def sink_worker(smtp_sink, queue):
+    """worker(**sink options): a MailWorker on a fresh sink, and the sink."""
+    def make(**options):
+        sink = smtp_sink.Sink(**options)
+        return mailer.MailWorker(queue, '127.0.0.1', smtp_sink.start(sink)), sink
+    return make
+
+
+def send(worker, queue):
+    conn = queue._open()
+    try:
+        result = worker.send_batch(queue.claim(conn))
+        queue.finish(conn, *result)
+    finally:
+        conn.close()
+    return result
+
+
+def attempts(queue):
+    conn = queue._open()
+    try:
+        return [row[0] for row in conn.execute('SELECT attempts FROM mail_jobs ORDER BY id')]
+    finally:
+        conn.close()
+
+
+def test_sends_over_one_connection(sink_worker, queue):
+    worker, sink = sink_worker()
+    sent, retry, dead, deferred = send(worker, queue)
+    assert (len(sent), retry, dead, deferred) == (3, [], [], [])
+    assert sink.messages == 3 and worker.connections == 1
+    assert queue.stats()['queued'] == 0
+
+
+def test_greeting_421_defers_the_batch(sink_worker, queue):
+    worker, _ = sink_worker(greeting='421 too busy')
+    sent, retry, dead, deferred = send(worker, queue)
+    assert (sent, retry, dead) == ([], [], [])
+    assert len(deferred) == 3 and '421' in deferred[0][1]
+    assert worker._smtp is None
+    # Due again at once, and the attempt doesn't count
+    stats = queue.stats()
+    assert (stats['queued'], stats['due'], stats['dead'], stats['total_deferred']) == (3, 3, 0, 3)
+    assert attempts(queue) == [0, 0, 0]
+
+
+def test_outage_does_not_use_up_attempts(sink_worker, queue):
+    worker, _ = sink_worker(greeting='421 too busy')
+    for _ in range(mailer.MAX_ATTEMPTS + 1):
+        send(worker, queue)
+    assert queue.stats()['dead'] == 0
+    assert attempts(queue) == [0, 0, 0]
+
+
+def test_login_535_retries_the_batch(sink_worker, queue, monkeypatch):
+    monkeypatch.setattr(mailer, 'SMTP_USER', 'learnhub')
+    monkeypatch.setattr(mailer, 'SMTP_PASSWORD', 'wrong')
+    worker, sink = sink_worker(auth_reply='535 bad credentials')
+    sent, retry, dead, deferred = send(worker, queue)
+    assert (sent, retry, dead) == ([], [], [])
+    assert len(deferred) == 3 and '535' in deferred[0][1]
+    assert sink.messages == 0 and queue.stats()['dead'] == 0
+    assert attempts(queue) == [0, 0, 0]
+
+
+def test_idle_timeout_reconnects(sink_worker, queue):
+    worker, sink = sink_worker(idle_timeout=0.05)
+    assert len(send(worker, queue)[0]) == 3
+    time.sleep(0.1)
+    queue.enqueue_many([('welcome', 'later@example.com', {'name': 'Later'})])
+    # The sink answered 421 and hung up; the job goes out on a new connection
+    sent, retry, dead, deferred = send(worker, queue)
+    assert (len(sent), retry, dead, deferred) == (1, [], [], [])
+    assert sink.messages == 4 and worker.connections == 2
+
+
+def test_dropped_connection_reconnects(sink_worker, queue):
+    worker, sink = sink_worker()
+    # As if the server had gone away while the connection sat in the pool
+    worker._connection().sock.shutdown(socket.SHUT_RDWR)
+    sent, retry, dead, deferred = send(worker, queue)
+    assert (len(sent), retry, dead, deferred) == (3, [], [], [])
+    assert worker.connections == 2
+
+
+def test_rejected_recipient_is_dead(sink_worker, queue):
+    worker, _ = sink_worker(reject_rate=1.0)
+    sent, retry, dead, deferred = send(worker, queue)
+    assert (sent, retry) == ([], [])
+    assert len(dead) == 3 and '550' in dead[0][2]
+    assert queue.stats()['dead'] == 3
+
+
+def test_temporary_failure_is_retried(sink_worker, queue):
+    worker, _ = sink_worker(tempfail_rate=1.0)
+    sent, retry, dead, deferred = send(worker, queue)
+    assert (sent, dead) == ([], [])
+    assert len(retry) == 3 and '451' in retry[0][2]
+    # Still connected: a 451 is about the message, not the session
+    assert worker.connections == 1 and worker._smtp is not None
+
+
+def test_out_of_attempts_is_dead(queue):
+    conn = queue._open()
+    try:
+        jobs = queue.claim(conn)
+        queue.finish(conn, [], [(job[0], mailer.MAX_ATTEMPTS, 'try again') for job in jobs], [])
+    finally:
+        conn.close()
+    assert queue.stats()['dead'] == 3
+
+
+def test_worker_backs_off_a_refused_connection(sink_worker, queue, monkeypatch):
+    monkeypatch.setattr(mailer, 'SESSION_BACKOFF_BASE', 0.1)
+    worker, sink = sink_worker(greeting='421 too busy')
+    stop, errors = threading.Event(), []
+
+    def run():
+        try:
+            worker.run(stop)
+        except BaseException as exc:
+            errors.append(exc)
+    thread = threading.Thread(target=run)
+    thread.start()
+    deadline = time.monotonic() + 5
+    while sink.connections < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.2)
+    stop.set()
+    thread.join(5)
+    assert not thread.is_alive() and errors == []
+    # 0.05-0.1s, then 0.1-0.2s, ...: a handful of tries, not one per poll
+    assert 2 <= sink.connections <= 4
+    assert queue.stats()['dead'] == 0 and attempts(queue) == [0, 0, 0]
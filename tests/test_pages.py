@@ -0,0 +1,48 @@
+import gzip
+
+import app as app_module
+import assets
+
+
+def test_landing_page_revalidates_with_etag(client):
+    first = client.get('/')
+    assert first.status_code == 200
+    assert first.headers['Cache-Control'] == 'no-cache'
+    etag = first.headers['ETag']
+    assert client.get('/').headers['ETag'] == etag
+    revalidated = client.get('/', headers={'If-None-Match': etag})
+    assert revalidated.status_code == 304
+    assert revalidated.data == b''
+
+
+def test_template_change_renders_a_new_page(client, monkeypatch):
+    etag = client.get('/').headers['ETag']
+    monkeypatch.setattr(app_module, 'HTML_TEMPLATE', app_module.HTML_TEMPLATE.replace('LearnHub', 'LearnHub!'))
+    response = client.get('/', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_encoding_negotiation(client):
+    plain = client.get('/', headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in plain.headers
+    assert 'Accept-Encoding' in plain.headers['Vary']
+    gzipped = client.get('/', headers={'Accept-Encoding': 'gzip'})
+    assert gzipped.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(gzipped.data) == plain.data
+    # Highest q-value wins; ties go to the smaller encoding
+    assert client.get('/', headers={'Accept-Encoding': 'gzip;q=1.0, br;q=0.5'}).headers['Content-Encoding'] == 'gzip'
+    if assets.brotli is not None:
+        best = client.get('/', headers={'Accept-Encoding': 'gzip, deflate, br'})
+        assert best.headers['Content-Encoding'] == 'br'
+        assert assets.brotli.decompress(best.data) == plain.data
+    assert 'Content-Encoding' not in client.get('/', headers={'Accept-Encoding': 'gzip;q=0'}).headers
+
+
+def test_each_encoding_has_its_own_etag(client):
+    plain = client.get('/').headers['ETag']
+    gzipped = client.get('/', headers={'Accept-Encoding': 'gzip'}).headers['ETag']
+    assert gzipped != plain
+    assert client.get('/', headers={'Accept-Encoding': 'gzip', 'If-None-Match': gzipped}).status_code == 304
+    # The identity validator doesn't match the gzip representation
+    assert client.get('/', headers={'Accept-Encoding': 'gzip', 'If-None-Match': plain}).status_code == 200
@@ -0,0 +1,143 @@
+import threading
+import time
+
+import pytest
+
+from payments import CircuitBreaker, GatewayUnavailable, PaymentDeclined, PaymentGateway, gateway_key
+
+PAYMENT = {'plan': 'Starter', 'payment_method': 'credit'}
+RESET = 0.05
+
+
+@pytest.fixture
+def server(stand_in_gateway):
+    server = stand_in_gateway.start(stand_in_gateway.Faults())
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def gateway(server):
+    return PaymentGateway(server.url, max_attempts=1, breaker=CircuitBreaker(threshold=2, reset_timeout=RESET))
+
+
+def test_breaker_opens_after_consecutive_failures(server, gateway):
+    server.faults.update(error_rate=1.0)
+    for _ in range(2):
+        with pytest.raises(GatewayUnavailable, match='failed'):
+            gateway.charge(PAYMENT)
+    assert gateway.breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(GatewayUnavailable, match='circuit is open'):
+        gateway.charge(PAYMENT)
+    # Refused without a request to the gateway
+    assert server.requests == 2
+
+
+def test_half_open_trial_closes_the_breaker(server, gateway):
+    server.faults.update(error_rate=1.0)
+    for _ in range(2):
+        with pytest.raises(GatewayUnavailable):
+            gateway.charge(PAYMENT)
+    server.faults.update(error_rate=0.0)
+    time.sleep(RESET)
+    assert gateway.charge(PAYMENT)['status'] == 'succeeded'
+    assert gateway.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_failed_half_open_trial_reopens_the_breaker(server, gateway):
+    server.faults.update(error_rate=1.0)
+    for _ in range(2):
+        with pytest.raises(GatewayUnavailable):
+            gateway.charge(PAYMENT)
+    time.sleep(RESET)
+    with pytest.raises(GatewayUnavailable, match='failed'):
+        gateway.charge(PAYMENT)
+    assert gateway.breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(GatewayUnavailable, match='circuit is open'):
+        gateway.charge(PAYMENT)
+
+
+def test_half_open_lets_one_trial_through():
+    breaker = CircuitBreaker(threshold=1, reset_timeout=RESET)
+    breaker.record_failure()
+    assert not breaker.allow()
+    time.sleep(RESET)
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+
+
+def test_declines_are_not_failures(server, gateway):
+    server.faults.update(decline_rate=1.0)
+    for _ in range(3):
+        with pytest.raises(PaymentDeclined):
+            gateway.charge(PAYMENT)
+    assert gateway.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_rejected_requests_are_failures(server, gateway):
+    server.faults.update(unauthorized_rate=1.0)
+    for _ in range(2):
+        with pytest.raises(GatewayUnavailable, match=r'refused the request \(401\)'):
+            gateway.charge(PAYMENT)
+    assert gateway.breaker.state == CircuitBreaker.OPEN
+    # Not retried: the next attempt would be refused the same way
+    assert server.requests == 2
+
+
+def test_in_progress_is_retried_with_the_same_key(server):
+    gateway = PaymentGateway(server.url, max_attempts=1)
+    server.faults.update(conflict_rate=1.0)
+    timer = threading.Timer(0.2, server.faults.update, kwargs={'conflict_rate': 0.0})
+    timer.start()
+    receipt = gateway.charge(PAYMENT, gateway_key('order-1'))
+    timer.join()
+    assert server.requests > 1
+    assert list(server.receipts) == [gateway_key('order-1')]
+    assert receipt == server.receipts[gateway_key('order-1')]
+
+
+def test_in_progress_until_the_deadline(server):
+    gateway = PaymentGateway(server.url, deadline=0.2)
+    server.faults.update(conflict_rate=1.0)
+    with pytest.raises(GatewayUnavailable, match='409'):
+        gateway.charge(PAYMENT)
+    assert server.receipts == {}
+
+
+def test_in_progress_is_not_a_decline(server, client, services):
+    services.gateway = PaymentGateway(server.url, deadline=0.2)
+    server.faults.update(conflict_rate=1.0)
+    headers = {'Idempotency-Key': 'order-1'}
+    assert client.post('/api/subscribe', json=PAYMENT, headers=headers).status_code == 503
+    server.faults.update(conflict_rate=0.0)
+    # The key was released, not stored as a final answer
+    response = client.post('/api/subscribe', json=PAYMENT, headers=headers)
+    assert response.status_code == 200 and 'Idempotent-Replayed' not in response.headers
+
+
+def test_same_key_is_the_same_charge(gateway):
+    key = gateway_key('order-1')
+    assert gateway.charge(PAYMENT, key)['id'] == gateway.charge(PAYMENT, key)['id']
+    assert gateway.charge(PAYMENT)['id'] != gateway.charge(PAYMENT)['id']
+    assert gateway_key('order-1', 0) != gateway_key('order-1', 1) != key
+
+
+def test_client_retry_is_the_same_gateway_charge(server, gateway, client, services):
+    services.gateway = gateway
+    server.faults.update(error_rate=1.0)
+    headers = {'Idempotency-Key': 'order-1'}
+    assert client.post('/api/subscribe', json=PAYMENT, headers=headers).status_code == 503
+    server.faults.update(error_rate=0.0)
+    assert client.post('/api/subscribe', json=PAYMENT, headers=headers).status_code == 200
+    assert server.requests == 2
+    assert list(server.receipts) == [gateway_key('order-1')]
+
+
+def test_batch_items_get_their_own_gateway_keys(server, gateway, client, services):
+    services.gateway = gateway
+    response = client.post('/api/batch', json=[{'type': 'subscribe', 'data': PAYMENT}] * 2,
+                           headers={'Idempotency-Key': 'order-2'})
+    assert [item['code'] for item in response.get_json()['results']] == [200, 200]
+    assert set(server.receipts) == {gateway_key('order-2', 0), gateway_key('order-2', 1)}
@@ -0,0 +1,26 @@
+import pytest
+
+import profiler
+
+AUTH = {'Authorization': 'Bearer secret'}
+
+
+@pytest.fixture(autouse=True)
+def token(monkeypatch):
+    monkeypatch.setattr(profiler, 'TOKEN', 'secret')
+
+
+def test_needs_the_token(client):
+    assert client.get('/debug/profile?seconds=1').status_code == 401
+
+
+def test_single_threaded_worker_is_refused(client):
+    # The test client, like gunicorn's sync worker, says wsgi.multithread=False
+    assert client.get('/debug/profile?seconds=1', headers=AUTH).status_code == 409
+
+
+def test_profile(client):
+    response = client.get('/debug/profile?seconds=1&all_threads=1', headers=AUTH,
+                          environ_overrides={'wsgi.multithread': True})
+    assert response.status_code == 200
+    assert int(response.headers['X-Profile-Samples']) > 0
@@ -0,0 +1,69 @@
+import os
+import time
+
+import ratelimit
+
+
+def test_throttled_with_retry_after(make_app):
+    client = make_app(RATE_LIMITS='/api/newsletter=2/60').test_client()
+    for n in range(2):
+        assert client.post('/api/newsletter', json={'email': 'n%d@example.com' % n}).status_code == 200
+    response = client.post('/api/newsletter', json={'email': 'n2@example.com'})
+    assert response.status_code == 429
+    assert 1 <= int(response.headers['Retry-After']) <= 30
+    # Other routes have their own buckets
+    assert client.post('/api/newsletter/unsubscribe', json={'email': 'n0@example.com'}).status_code == 200
+
+
+def test_batched_operations_count_against_their_route(make_app):
+    client = make_app(RATE_LIMITS='/api/newsletter=1/60').test_client()
+    operations = [{'type': 'newsletter', 'data': {'email': 'n%d@example.com' % n}} for n in range(2)]
+    response = client.post('/api/batch', json=operations)
+    assert response.status_code == 200
+    first, second = response.get_json()['results']
+    assert first['code'] == 200
+    assert second['code'] == 429 and second['body']['retry_after'] >= 1
+
+
+def test_apps_do_not_share_buckets(make_app):
+    first = make_app(RATE_LIMITS='/api/newsletter=1/60').test_client()
+    second = make_app(RATE_LIMITS='/api/newsletter=1/60').test_client()
+    assert first.post('/api/newsletter', json={'email': 'a@example.com'}).status_code == 200
+    assert second.post('/api/newsletter', json={'email': 'b@example.com'}).status_code == 200
+
+
+def test_parse_limits():
+    limits = ratelimit.parse_limits('/api/signup=100/60, /api/bulk/signup=off, /api/extra=5')
+    assert limits['/api/signup'].burst == 100 and limits['/api/signup'].rate == 100 / 60
+    assert '/api/bulk/signup' not in limits
+    assert limits['/api/extra'].rate == 5
+    assert limits.keys() - {'/api/signup', '/api/extra'} == ratelimit.DEFAULT_LIMITS.keys() - {
+        '/api/signup', '/api/bulk/signup'}
+    assert ratelimit.parse_limits('off') == {}
+
+
+def test_bucket_refills():
+    limiter = ratelimit.RateLimiter(ratelimit.parse_limits('', {'/r': '2/1'}))
+    assert limiter.acquire('/r', 'a') == limiter.acquire('/r', 'a') == 0
+    wait = limiter.acquire('/r', 'a')
+    assert 0 < wait <= 0.5
+    # Other clients and unlimited routes are unaffected
+    assert limiter.acquire('/r', 'b') == 0 and limiter.acquire('/other', 'a') == 0
+    time.sleep(wait)
+    assert limiter.acquire('/r', 'a') == 0
+
+
+def test_buckets_are_shared_with_forked_workers():
+    limiter = ratelimit.RateLimiter(ratelimit.parse_limits('', {'/r': '1/60'}))
+    pid = os.fork()
+    if pid == 0:
+        os._exit(0 if limiter.acquire('/r', 'a') == 0 else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert limiter.retry_after('/r', 'a') == 60
+
+
+def test_switched_off_allocates_nothing():
+    limiter = ratelimit.RateLimiter(ratelimit.parse_limits('off'))
+    assert limiter._locks == [] and limiter._buf is None
+    assert limiter.retry_after('/api/signup', '127.0.0.1') is None
@@ -0,0 +1,74 @@
+import io
+import json
+
+import schemas
+
+
+def test_clean_data_holds_only_declared_fields():
+    data, error = schemas.SIGNUP({'name': 'Ada', 'email': 'ada@example.com', 'password': 'correct horse',
+                                  'is_admin': True})
+    assert error is None
+    assert data == {'name': 'Ada', 'email': 'ada@example.com', 'password': 'correct horse'}
+
+
+def test_every_problem_is_reported():
+    data, error = schemas.SIGNUP({'name': '', 'email': 'nope', 'password': 'short', 'expertise': 'cooking'})
+    assert data is None
+    assert error['errors'] == {
+        'name': 'is required',
+        'email': 'must be a valid email address',
+        'password': 'must be a string of 8-128 characters',
+        'expertise': 'must be one of: %s' % ', '.join(schemas.EXPERTISE),
+    }
+    assert error['message'].startswith('Invalid request: name is required; email must be')
+
+
+def test_types_are_checked():
+    assert schemas.NEWSLETTER({'email': ['ada@example.com']})[1]['errors'] == {
+        'email': 'must be a valid email address'}
+    assert schemas.SUBSCRIBE({'plan': 1, 'payment_method': 'credit'})[1]['errors'] == {
+        'plan': 'must be one of: %s' % ', '.join(schemas.PLANS)}
+    assert schemas.NEWSLETTER(['ada@example.com']) == (None, schemas.NOT_AN_OBJECT)
+
+
+def test_email_length_is_capped():
+    email = 'a' * 250 + '@example.com'
+    assert schemas.NEWSLETTER({'email': email})[1] is not None
+
+
+def test_invalid_body_is_400(client):
+    response = client.post('/api/newsletter', json={'email': 'nope'})
+    assert response.status_code == 400
+    assert response.get_json()['errors'] == {'email': 'must be a valid email address'}
+    response = client.post('/api/newsletter', data=b'{"email": ', content_type='application/json')
+    assert (response.status_code, response.get_json()) == (400, schemas.INVALID_JSON)
+
+
+def test_body_must_be_json(client):
+    response = client.post('/api/newsletter', data='email=ada@example.com',
+                           content_type='application/x-www-form-urlencoded')
+    assert (response.status_code, response.get_json()) == (415, schemas.NOT_JSON)
+
+
+def test_oversized_body_is_refused_before_reading(client):
+    body = json.dumps({'email': 'ada@example.com', 'padding': 'x' * schemas.MAX_BODY_SIZE})
+    response = client.post('/api/newsletter', data=body, content_type='application/json')
+    assert response.status_code == 413
+    assert response.headers['Connection'] == 'close'
+    assert response.get_json() == schemas.too_large(schemas.MAX_BODY_SIZE)
+
+
+def test_oversized_chunked_body(client):
+    body = json.dumps({'email': 'ada@example.com', 'padding': 'x' * schemas.MAX_BODY_SIZE}).encode('utf-8')
+    response = client.post('/api/newsletter', input_stream=io.BytesIO(body), content_type='application/json',
+                           headers={'Transfer-Encoding': 'chunked'},
+                           environ_overrides={'wsgi.input_terminated': True})
+    assert response.status_code == 413
+
+
+def test_batch_has_a_larger_limit(client):
+    operations = [{'type': 'newsletter', 'data': {'email': 'user%d@example.com' % n, 'note': 'x' * 200}}
+                  for n in range(100)]
+    body = json.dumps(operations)
+    assert schemas.MAX_BODY_SIZE < len(body) < schemas.MAX_BATCH_BODY_SIZE
+    assert client.post('/api/batch', data=body, content_type='application/json').status_code == 200
@@ -0,0 +1,163 @@
+import sqlite3
+import threading
+
+import pytest
+
+from dedupe import DuplicateEmail
+from storage import GroupCommitWriter, SignupStore, StorageBusy, StorageError
+
+
+class Recorder(GroupCommitWriter):
+    """Commits to a list; result per item is the item doubled."""
+
+    thread_name = 'recorder'
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.batches = []
+        self.gate = threading.Event()
+        self.gate.set()
+        self.writing = threading.Event()
+        self.fail = None
+
+    def _open(self):
+        return self.batches
+
+    def _write_batch(self, batches, items):
+        self.writing.set()
+        self.gate.wait()
+        if self.fail is not None:
+            raise self.fail
+        batches.append(items)
+        return [item * 2 for item in items]
+
+
+def run_threads(target, count):
+    threads = [threading.Thread(target=target, args=(n,)) for n in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+
+def test_concurrent_submits_share_batches():
+    writer = Recorder(batch_size=64, max_delay=0.05)
+    results = {}
+    run_threads(lambda n: results.__setitem__(n, writer.submit(n)), 40)
+    # Each caller gets its own item's result, however the items were batched
+    assert results == {n: n * 2 for n in range(40)}
+    assert sorted(item for batch in writer.batches for item in batch) == list(range(40))
+    assert len(writer.batches) < 40
+
+
+def test_batch_size_caps_a_batch():
+    writer = Recorder(batch_size=4, max_delay=0.05)
+    writer.gate.clear()
+    first = threading.Thread(target=writer.submit, args=(-1,))
+    first.start()
+    writer.writing.wait(5)
+    # Queued while the writer is busy, then committed at most 4 at a time
+    threads = [threading.Thread(target=writer.submit, args=(n,)) for n in range(10)]
+    for thread in threads:
+        thread.start()
+    while writer._queue.qsize() < 10:
+        first.join(0.01)
+    writer.gate.set()
+    for thread in threads + [first]:
+        thread.join(5)
+    assert [len(batch) for batch in writer.batches] == [1, 4, 4, 2]
+
+
+def test_submit_many_results_in_order():
+    writer = Recorder()
+    assert writer.submit_many([1, 2, 3]) == [2, 4, 6]
+    assert writer.batches == [[1, 2, 3]]
+
+
+def test_write_error_reaches_every_caller_in_the_batch():
+    writer = Recorder(max_delay=0.05)
+    writer.fail = sqlite3.OperationalError('disk I/O error')
+    errors = []
+
+    def submit(n):
+        try:
+            writer.submit(n)
+        except StorageError as exc:
+            errors.append(str(exc))
+    run_threads(submit, 5)
+    assert errors == ['disk I/O error'] * 5
+    # The writer thread survives a failed batch
+    writer.fail = None
+    assert writer.submit(7) == 14
+
+
+def test_full_queue_sheds_load():
+    writer = Recorder(queue_size=1)
+    writer.gate.clear()
+    threads = [threading.Thread(target=writer.submit, args=(n,)) for n in range(2)]
+    threads[0].start()
+    writer.writing.wait(5)
+    threads[1].start()
+    while writer._queue.qsize() < 1:
+        threads[1].join(0.01)
+    with pytest.raises(StorageBusy):
+        writer.submit(2)
+    writer.gate.set()
+    for thread in threads:
+        thread.join(5)
+    assert writer.batches == [[0], [1]]
+
+
+def test_commit_timeout():
+    writer = Recorder()
+    writer.gate.clear()
+    with pytest.raises(StorageError, match='timed out'):
+        writer.submit(1, timeout=0.05)
+    writer.gate.set()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SignupStore(str(tmp_path / 'learnhub.db'))
+
+
+def signup(email, name='Ada'):
+    return {'name': name, 'email': email, 'expertise': 'design', 'password_hash': 'scrypt$x'}
+
+
+def test_saved_signups_are_durable(store, tmp_path):
+    run_threads(lambda n: store.save(signup('user%d@example.com' % n)), 20)
+    reopened = SignupStore(str(tmp_path / 'learnhub.db'))
+    assert reopened.count() == 20
+    assert sorted(reopened.iter_emails()) == sorted('user%d@example.com' % n for n in range(20))
+
+
+def test_emails_are_stored_normalised(store):
+    store.save(signup('  Ada@Example.COM '))
+    assert list(store.iter_emails()) == ['ada@example.com']
+
+
+def test_duplicate_email_is_refused(store):
+    store.save(signup('ada@example.com'))
+    with pytest.raises(DuplicateEmail):
+        store.save(signup('ADA@example.com', name='Other'))
+    assert store.count() == 1
+
+
+def test_save_many_returns_the_duplicates(store):
+    store.save(signup('ada@example.com'))
+    records = [signup('ada@example.com'), signup('bob@example.com'), signup('Bob@example.com')]
+    # Taken before the batch, and taken earlier in the same batch
+    assert store.save_many(records) == [records[0], records[2]]
+    assert store.count() == 2
+
+
+def test_adds_the_password_column_to_an_old_table(tmp_path):
+    path = str(tmp_path / 'learnhub.db')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE signups (id INTEGER PRIMARY KEY, name TEXT NOT NULL, email TEXT NOT NULL, '
+                 'expertise TEXT, created_at REAL NOT NULL)')
+    conn.close()
+    store = SignupStore(path)
+    store.save(signup('ada@example.com'))
+    assert store.count() == 1
@@ -0,0 +1,93 @@
+import fcntl
+import os
+
+import pytest
+
+from subscriptions import SUBSCRIBE, UNSUBSCRIBE, NewsletterLog, encode_record, fold, iter_records
+
+
+@pytest.fixture
+def log(tmp_path):
+    return NewsletterLog(str(tmp_path / 'newsletter.log'))
+
+
+def test_export_folds_the_log(log):
+    log.subscribe_many(['ann@example.com', 'Bob@Example.com'])
+    log.subscribe('cy@example.com')
+    log.unsubscribe('BOB@example.com')
+    assert log.export() == ['ann@example.com', 'cy@example.com']
+
+
+def test_resubscribe_after_unsubscribe(log):
+    log.subscribe('ann@example.com')
+    log.unsubscribe('ann@example.com')
+    log.subscribe('ann@example.com')
+    assert log.export() == ['ann@example.com']
+
+
+def test_torn_tail_is_ignored(log):
+    log.subscribe('ann@example.com')
+    with open(log.path, 'ab') as f:
+        f.write(encode_record(SUBSCRIBE, 'bob@example.com')[:-3])
+    assert log.export() == ['ann@example.com']
+
+
+def test_corrupt_record_stops_the_read():
+    good, bad = encode_record(SUBSCRIBE, 'ann@example.com'), bytearray(encode_record(SUBSCRIBE, 'bob@example.com'))
+    bad[-1] ^= 1
+    records = list(iter_records(good + bytes(bad) + encode_record(UNSUBSCRIBE, 'ann@example.com')))
+    assert [(op, email) for op, email, _ in records] == [(SUBSCRIBE, 'ann@example.com')]
+    assert fold(records) == ({'ann@example.com': True}, len(good))
+
+
+def test_compaction_folds_unsubscribes(log):
+    emails = ['user%d@example.com' % n for n in range(50)]
+    log.subscribe_many(emails)
+    for email in emails[:40]:
+        log.unsubscribe(email)
+    size = os.path.getsize(log.path)
+    assert log.compact()
+    assert os.path.getsize(log.path) < size
+    with open(log.path, 'rb') as f:
+        records = list(iter_records(f.read()))
+    assert {op for op, _, _ in records} == {SUBSCRIBE}
+    assert sorted(email for _, email, _ in records) == emails[40:]
+    # Appends after the swap go to the compacted file
+    log.unsubscribe(emails[40])
+    log.subscribe('new@example.com')
+    assert log.export() == sorted(emails[41:] + ['new@example.com'])
+
+
+def test_one_compactor_at_a_time(log):
+    log.subscribe('ann@example.com')
+    other = NewsletterLog(log.path)
+    lock_fd = os.open(log.path + '.compact.lock', os.O_RDWR | os.O_CREAT)
+    try:
+        fcntl.flock(lock_fd, fcntl.LOCK_EX)
+        assert not other.compact()
+    finally:
+        os.close(lock_fd)
+    assert other.compact()
+
+
+def test_read_changes_restarts_after_compaction(log):
+    log.subscribe('ann@example.com')
+    log.subscribe('bob@example.com')
+    records, position, restarted = log.read_changes()
+    assert len(records) == 2 and restarted
+    assert log.read_changes(position) == ([], position, False)
+    log.unsubscribe('bob@example.com')
+    records, position, restarted = log.read_changes(position)
+    assert [(op, email) for op, email, _ in records] == [(UNSUBSCRIBE, 'bob@example.com')] and not restarted
+    log.compact()
+    records, position, restarted = log.read_changes(position)
+    assert restarted
+    assert [(op, email) for op, email, _ in records] == [(SUBSCRIBE, 'ann@example.com')]
+
+
+def test_batch_newsletter_duplicates_are_subscribed(client, services):
+    operations = [{'type': 'newsletter', 'data': {'email': 'ann@example.com'}}] * 2
+    response = client.post('/api/batch', json=operations)
+    # As with /api/newsletter, being on the list already is a success
+    assert [item['code'] for item in response.get_json()['results']] == [200, 200]
+    assert services.newsletter.export() == ['ann@example.com']